@@ -0,0 +1,50 @@
+"""
+XOR codec throughput over realistic packet sizes.
+
+    python -m benchmarks.bench_codec
+"""
+
+import os
+import timeit
+
+from wcps_auth import codec
+from wcps_auth.codec import XorCodec
+
+# Rough wire sizes: launcher reply, login request, a server list with
+# 31 servers, and a full read of coalesced packets
+SIZES = {
+    "launcher": 32,
+    "login": 64,
+    "server_list_31": 1200,
+    "read_chunk": 16384,
+    "large": 1 << 20,
+}
+
+
+def per_byte(data, key):
+    return bytes(b ^ key for b in data)
+
+
+def main():
+    implementations = {
+        "per_byte": lambda data: per_byte(data, 0xC3),
+        "translate": XorCodec(0xC3, use_numpy=False).decode,
+    }
+    if codec.numpy is not None:
+        implementations["numpy"] = lambda data: codec.numpy.bitwise_xor(
+            codec.numpy.frombuffer(data, dtype=codec.numpy.uint8), 0xC3
+        ).tobytes()
+
+    print(f"{'payload':<16}{'bytes':>9}" + "".join(f"{n:>14}" for n in implementations))
+    for name, size in SIZES.items():
+        data = os.urandom(size)
+        number = max(1, 2000000 // size)
+        row = f"{name:<16}{size:>9}"
+        for implementation in implementations.values():
+            elapsed = timeit.timeit(lambda: implementation(data), number=number)
+            row += f"{size * number / elapsed / 1e6:>10.1f}MB/s"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Microbenchmarks for the per-packet hot paths: session bookkeeping, building
+the ServerList packet, handler lookup, decoding of inbound buffers and their
+validation against the handler schemas.
+
+    python -m benchmarks.bench_hot_paths
+    python -m benchmarks.bench_hot_paths --json results.json
+
+The JSON output records the commit and Python version next to each result so
+runs can be compared across commits.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import timeit
+
+from wcps_core.constants import ErrorCodes, ServerTypes
+
+from wcps_auth.codec import get_codec
+from wcps_auth.handlers.handler_factory import HANDLER_MAP, get_handler_for_packet
+from wcps_auth.packets.in_packet import parse_packets
+from wcps_auth.packets.packet_factory import PacketFactory
+from wcps_auth.packets.packet_list import ClientXorKeys, PacketList
+from wcps_auth.sessions import SessionManager
+
+SESSION_COUNTS = (1000, 10000, 32000)
+SERVER_COUNTS = (0, 1, 8, 16, 31)
+
+
+class MockUser:
+    __slots__ = ("username", "displayname", "session_id", "rights")
+
+    def __init__(self, username):
+        self.username = username
+        self.displayname = username
+        self.session_id = 0
+        self.rights = 1
+
+
+class MockServer:
+    def __init__(self, server_id):
+        self.id = str(server_id)
+        self.name = f"server{server_id}"
+        self.address = "127.0.0.1"
+        self.port = 5340 + server_id
+        self.current_players = server_id * 10
+        self.server_type = ServerTypes.ENTIRE
+
+
+def fresh_session_manager() -> SessionManager:
+    SessionManager._instance = None
+    return SessionManager()
+
+
+def result(operations: int, seconds: float) -> dict:
+    return {
+        "operations": operations,
+        "seconds": seconds,
+        "per_s": operations / seconds,
+        "us_per_op": seconds / operations * 1e6,
+    }
+
+
+async def timed(coroutine_function, calls) -> dict:
+    start = time.perf_counter()
+    for args in calls:
+        await coroutine_function(*args)
+    return result(len(calls), time.perf_counter() - start)
+
+
+async def bench_sessions(size: int) -> dict:
+    manager = fresh_session_manager()
+    users = [MockUser(f"user{i}") for i in range(size)]
+    server = MockServer(1)
+    server_session = await manager.authorize_server(server)
+
+    results = {
+        "authorize_user": await timed(manager.authorize_user, [(u,) for u in users])
+    }
+    session_ids = [await manager.get_user_session_id(u.username) for u in users]
+    results["get_user_by_session_id"] = await timed(
+        manager.get_user_by_session_id, [(s,) for s in session_ids]
+    )
+    results["check_and_activate_user_session"] = await timed(
+        manager.check_and_activate_user_session,
+        [(u.username, s, server_session) for u, s in zip(users, session_ids)],
+    )
+    results["unauthorize_user"] = await timed(
+        manager.unauthorize_user, [(u.username,) for u in users]
+    )
+    return results
+
+
+async def bench_unauthorize_server(size: int) -> dict:
+    manager = fresh_session_manager()
+    server = MockServer(1)
+    server_session = await manager.authorize_server(server)
+    for i in range(size):
+        session_id = await manager.authorize_user(MockUser(f"user{i}"))
+        await manager.activate_user_session(session_id, server_session)
+
+    start = time.perf_counter()
+    await manager.unauthorize_server(server.id)
+    return result(1, time.perf_counter() - start)
+
+
+async def bench_server_list(server_count: int) -> dict:
+    manager = fresh_session_manager()
+    for i in range(1, server_count + 1):
+        await manager.authorize_server(MockServer(i))
+    user = MockUser("user123")
+    user.session_id = await manager.authorize_user(user)
+
+    def build():
+        return PacketFactory.create_packet(
+            PacketList.SERVER_LIST, ErrorCodes.SUCCESS, u=user
+        ).build()
+
+    def build_after_change():
+        # A status report invalidates the cached server section
+        manager.mark_servers_changed()
+        return build()
+
+    number = 5000
+    return {
+        "cached": result(number, timeit.timeit(build, number=number)),
+        "rebuilt": result(number, timeit.timeit(build_after_change, number=number)),
+    }
+
+
+def bench_handler_lookup() -> dict:
+    packet_ids = [
+        PacketList.LAUNCHER,
+        PacketList.SERVER_LIST,
+        PacketList.SETNICKNAME,
+        PacketList.INTERNALGAMEAUTHENTICATION,
+        PacketList.INTERNALGAMESTATUS,
+        PacketList.INTERNALPLAYERAUTHENTICATION,
+    ]
+
+    def lookup():
+        for packet_id in packet_ids:
+            get_handler_for_packet(packet_id)
+
+    number = 50000
+    elapsed = timeit.timeit(lookup, number=number)
+    return result(number * len(packet_ids), elapsed)
+
+
+def encode(text: str) -> bytes:
+    return get_codec(ClientXorKeys.RECEIVE).encode(text.encode("utf-8"))
+
+
+# Typical reads: a single client request, and a game server batching
+# status reports and player authentications into one read
+BUFFERS = {
+    "launcher": encode("1147189 4112 \n"),
+    "server_list": encode("1147189 4352 0 0 user123 secret \n"),
+    "internal_batch_16": encode(
+        "".join(
+            f"1147189 {PacketList.INTERNALPLAYERAUTHENTICATION} 1 {i} user{i} 1 \n"
+            for i in range(16)
+        )
+    ),
+}
+
+
+def bench_decode() -> dict:
+    codec = get_codec(ClientXorKeys.RECEIVE)
+    results = {}
+    for name, data in BUFFERS.items():
+        number = 20000
+        elapsed = timeit.timeit(
+            lambda: parse_packets(codec.decode(data), None), number=number
+        )
+        results[name] = result(number, elapsed)
+        results[name]["bytes"] = len(data)
+    return results
+
+
+def bench_validate() -> dict:
+    codec = get_codec(ClientXorKeys.RECEIVE)
+
+    def validate(data):
+        for packet in parse_packets(codec.decode(data), None):
+            packet.request = HANDLER_MAP[packet.packet_id].schema.decode(packet.blocks)
+
+    results = {}
+    for name, data in BUFFERS.items():
+        number = 20000
+        elapsed = timeit.timeit(lambda: validate(data), number=number)
+        results[name] = result(number, elapsed)
+        results[name]["bytes"] = len(data)
+    return results
+
+
+async def run_all() -> dict:
+    results = {
+        "sessions": {},
+        "unauthorize_server": {},
+        "server_list_build": {},
+    }
+    for size in SESSION_COUNTS:
+        results["sessions"][str(size)] = await bench_sessions(size)
+        results["unauthorize_server"][str(size)] = await bench_unauthorize_server(
+            size
+        )
+    for server_count in SERVER_COUNTS:
+        results["server_list_build"][str(server_count)] = await bench_server_list(
+            server_count
+        )
+    results["handler_lookup"] = bench_handler_lookup()
+    results["decode"] = bench_decode()
+    results["decode_and_validate"] = bench_validate()
+    SessionManager._instance = None
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, prefix: str = "") -> None:
+    for name, value in results.items():
+        if "per_s" in value:
+            print(
+                f"{prefix + name:<60}{value['per_s']:>14.0f}/s"
+                f"{value['us_per_op']:>12.2f}us"
+            )
+        else:
+            print_results(value, f"{prefix}{name}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--json", metavar="PATH", help="write results as JSON ('-' for stdout)"
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all())
+    if args.json is None:
+        print_results(results)
+        return
+
+    report = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
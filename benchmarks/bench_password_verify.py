@@ -0,0 +1,89 @@
+"""
+Event loop latency while hundreds of logins verify their password at once.
+
+A probe task sleeps 1 ms in a loop and records how late it wakes up. With
+the KDF run inline the loop stalls for the whole burst; through
+PasswordVerifier the probe latency should stay flat.
+
+    python -m benchmarks.bench_password_verify --logins 300
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import statistics
+import time
+
+from wcps_auth.passwords import (
+    Pbkdf2Hasher,
+    PasswordVerifier,
+    Sha256Hasher,
+    _check_and_rehash,
+)
+
+PROBE_INTERVAL = 0.001
+
+
+async def probe(lateness: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lateness.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run(mode: str, logins: int, workers: int, iterations: int) -> dict:
+    hasher = Pbkdf2Hasher(iterations)
+    stored = hasher.hash("password", "salt")
+    verifier = PasswordVerifier(
+        [Sha256Hasher(), hasher],
+        hasher,
+        concurrent.futures.ThreadPoolExecutor(workers),
+        max_pending=logins,
+    )
+
+    async def login():
+        if mode == "inline":
+            result = _check_and_rehash(hasher, hasher, "password", "salt", stored)
+        else:
+            result = await verifier.verify("password", "salt", stored)
+        assert result.valid
+
+    lateness = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lateness, stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    verifier.executor.shutdown()
+
+    lateness.sort()
+    return {
+        "logins_per_s": logins / elapsed,
+        "probe_p50_ms": statistics.median(lateness) * 1000,
+        "probe_max_ms": lateness[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for mode in ("inline", "pool"):
+        result = asyncio.run(run(mode, args.logins, args.workers, args.iterations))
+        print(
+            f"{mode:<8} logins/s={result['logins_per_s']:.0f} "
+            f"loop p50={result['probe_p50_ms']:.2f}ms "
+            f"max={result['probe_max_ms']:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
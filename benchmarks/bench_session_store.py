@@ -0,0 +1,107 @@
+"""
+Compares the slot table session store against the previous dict-of-dicts
+store at 1k, 10k and 32k sessions.
+
+    python -m benchmarks.bench_session_store
+"""
+
+import time
+import tracemalloc
+
+from wcps_auth.session_table import MAX_USER_SESSIONS, SessionTable
+
+SIZES = (1000, 10000, 32000)
+
+
+class MockUser:
+    __slots__ = ("username",)
+
+    def __init__(self, username):
+        self.username = username
+
+
+class DictSessionStore:
+    # The store SessionManager used before the slot table: one dict per
+    # session plus a session_id index and a rolling ID counter
+    def __init__(self):
+        self._user_sessions = {}
+        self._sessions_by_id = {}
+        self._counter = 0
+
+    def add(self, user):
+        for _ in range(MAX_USER_SESSIONS):
+            self._counter += 1
+            if self._counter > MAX_USER_SESSIONS - 1:
+                self._counter = 0
+            if self._counter not in self._sessions_by_id:
+                break
+        session = {
+            "user": user,
+            "session_id": self._counter,
+            "is_activated": False,
+            "game_server": None,
+        }
+        self._user_sessions[user.username] = session
+        self._sessions_by_id[self._counter] = session
+        return session
+
+    def get(self, session_id):
+        return self._sessions_by_id.get(session_id)
+
+    def remove(self, username):
+        session = self._user_sessions.pop(username)
+        del self._sessions_by_id[session["session_id"]]
+
+
+def _session_id(session):
+    if isinstance(session, dict):
+        return session["session_id"]
+    return session.session_id
+
+
+def run_store(store_factory, size):
+    users = [MockUser(f"user{i}") for i in range(size)]
+
+    tracemalloc.start()
+    store = store_factory()
+    start = time.perf_counter()
+    session_ids = [_session_id(store.add(user)) for user in users]
+    add_time = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for session_id in session_ids:
+        store.get(session_id)
+    get_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user in users:
+        store.remove(user.username)
+    remove_time = time.perf_counter() - start
+
+    return {
+        "memory_kib": memory / 1024,
+        "add_per_s": size / add_time,
+        "get_per_s": size / get_time,
+        "remove_per_s": size / remove_time,
+    }
+
+
+def main():
+    stores = (("dict", DictSessionStore), ("slot_table", SessionTable))
+    header = f"{'store':<12}{'sessions':>10}{'KiB':>12}{'add/s':>14}{'get/s':>14}{'remove/s':>14}"
+    print(header)
+    print("-" * len(header))
+    for size in SIZES:
+        for name, factory in stores:
+            result = run_store(factory, size)
+            print(
+                f"{name:<12}{size:>10}{result['memory_kib']:>12.0f}"
+                f"{result['add_per_s']:>14.0f}{result['get_per_s']:>14.0f}"
+                f"{result['remove_per_s']:>14.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Login throughput of each network layer and event loop under the same load.
+
+Every combination of --layers and --loops is run as in bench_workers: the
+server is started with the memory backend in a single process, then several
+wcps-auth-bench processes log in the seeded accounts at once. uvloop runs
+are skipped when it is not installed.
+
+    python -m benchmarks.bench_transports --clients 8000
+    python -m benchmarks.bench_transports --loops asyncio --json results.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from wcps_core.constants import Ports
+
+from benchmarks.bench_workers import run_load, server_environment, wait_for_port
+
+
+def run_transport(args, layer: str, loop: str) -> dict:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "wcps_auth.cli",
+            "--network-layer",
+            layer,
+            "--event-loop",
+            loop,
+        ],
+        env=server_environment(args.clients),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.host, Ports.AUTH_CLIENT)
+        time.sleep(1)
+        return run_load(args, args.load_processes)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--layers", nargs="+", default=["streams", "protocol"], metavar="LAYER"
+    )
+    parser.add_argument(
+        "--loops", nargs="+", default=["asyncio", "uvloop"], metavar="LOOP"
+    )
+    parser.add_argument("--clients", type=int, default=8000, help="logins per run")
+    parser.add_argument("--load-processes", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=100, help="per process")
+    parser.add_argument(
+        "--json", metavar="PATH", help="write results as JSON ('-' for stdout)"
+    )
+    args = parser.parse_args()
+
+    loops = args.loops
+    if "uvloop" in loops and importlib.util.find_spec("uvloop") is None:
+        print("uvloop is not installed, skipping it", file=sys.stderr)
+        loops = [loop for loop in loops if loop != "uvloop"]
+
+    results = {}
+    for loop in loops:
+        for layer in args.layers:
+            results[f"{layer}/{loop}"] = run_transport(args, layer, loop)
+
+    if args.json is not None:
+        report = {"cpus": os.cpu_count(), "results": results}
+        if args.json == "-":
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.json, "w") as output:
+                json.dump(report, output, indent=2)
+        return
+
+    baseline = next(iter(results.values()))["logins_per_s"]
+    print(
+        f"{'layer/loop':>18}{'logins/s':>12}{'speedup':>10}{'p50 ms':>10}{'p99 ms':>10}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:>18}{result['logins_per_s']:>12.0f}"
+            f"{result['logins_per_s'] / baseline:>10.2f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
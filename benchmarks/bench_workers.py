@@ -0,0 +1,151 @@
+"""
+Login throughput as the number of client workers grows.
+
+For each worker count the server is started with the memory backend, then
+several wcps-auth-bench processes log in disjoint ranges of the seeded
+accounts at once; a single load process would saturate its own core before
+several workers. Run on a machine with at least as many cores as workers
+plus load processes, and with AUTH_CLIENT and INTERNAL free.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 8000
+    python -m benchmarks.bench_workers --json results.json
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from wcps_core.constants import Ports
+
+
+def server_environment(clients: int) -> dict:
+    env = dict(os.environ)
+    env.update(
+        STORAGE_BACKEND="memory",
+        MEMORY_SEED_USERS=str(clients),
+        MEMORY_SEED_SERVERS="0",
+        MAX_CLIENT_CONNECTIONS="100000",
+        MAX_CONNECTIONS_PER_IP="100000",
+        ACCEPT_RATE_PER_IP="100000",
+        ACCEPT_BURST_PER_IP="100000",
+        METRICS_ENABLED="false",
+        LOG_LEVEL="WARNING",
+    )
+    return env
+
+
+def wait_for_port(host: str, port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not listen on {host}:{port}")
+
+
+def run_load(args, load_processes: int) -> dict:
+    per_process = args.clients // load_processes
+    loads = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "wcps_auth.loadgen",
+                "--host",
+                args.host,
+                "--clients",
+                str(per_process),
+                "--first-client",
+                str(i * per_process),
+                "--concurrency",
+                str(args.concurrency),
+                "--servers",
+                "0",
+                "--json",
+            ],
+            stdout=subprocess.PIPE,
+        )
+        for i in range(load_processes)
+    ]
+    summaries = [json.loads(load.communicate()[0]) for load in loads]
+
+    logins = sum(
+        s["operations"].get("login_total", {}).get("count", 0) for s in summaries
+    )
+    elapsed = max(s["elapsed_s"] for s in summaries)
+    latencies = [s["operations"]["login_total"] for s in summaries if s["operations"]]
+    return {
+        "logins": logins,
+        "elapsed_s": elapsed,
+        "logins_per_s": logins / elapsed,
+        "p50_ms": max((l["p50_ms"] for l in latencies), default=None),
+        "p99_ms": max((l["p99_ms"] for l in latencies), default=None),
+        "errors": sum(sum(s["errors"].values()) for s in summaries),
+    }
+
+
+def run_workers(args, workers: int) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "wcps_auth.cli", "--workers", str(workers)],
+        env=server_environment(args.clients),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.host, Ports.AUTH_CLIENT)
+        # Let every worker bind before measuring
+        time.sleep(1 + 0.25 * workers)
+        return run_load(args, args.load_processes)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8000, help="logins per run")
+    parser.add_argument("--load-processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=100, help="per process")
+    parser.add_argument(
+        "--json", metavar="PATH", help="write results as JSON ('-' for stdout)"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for workers in args.workers:
+        results[str(workers)] = run_workers(args, workers)
+
+    if args.json is not None:
+        report = {"cpus": os.cpu_count(), "results": results}
+        if args.json == "-":
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.json, "w") as output:
+                json.dump(report, output, indent=2)
+        return
+
+    baseline = results[str(args.workers[0])]["logins_per_s"]
+    print(f"{'workers':>8}{'logins/s':>12}{'speedup':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for workers, result in results.items():
+        print(
+            f"{workers:>8}{result['logins_per_s']:>12.0f}"
+            f"{result['logins_per_s'] / baseline:>10.2f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
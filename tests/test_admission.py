@@ -0,0 +1,79 @@
+import unittest
+
+from wcps_auth.admission import AdmissionController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_global_cap(self):
+        admission = AdmissionController(max_connections=2)
+        self.assertTrue(admission.admit("10.0.0.1"))
+        self.assertTrue(admission.admit("10.0.0.2"))
+        self.assertFalse(admission.admit("10.0.0.3"))
+        self.assertEqual(admission.rejected["max_connections"], 1)
+
+        admission.release("10.0.0.1")
+        self.assertTrue(admission.admit("10.0.0.3"))
+
+    def test_per_ip_cap(self):
+        admission = AdmissionController(max_per_ip=1)
+        self.assertTrue(admission.admit("10.0.0.1"))
+        self.assertFalse(admission.admit("10.0.0.1"))
+        self.assertTrue(admission.admit("10.0.0.2"))
+        self.assertEqual(admission.rejected["max_per_ip"], 1)
+        self.assertEqual(admission.active, 2)
+
+    def test_accept_rate(self):
+        clock = FakeClock()
+        admission = AdmissionController(accept_rate=1.0, accept_burst=2, clock=clock)
+        for _ in range(2):
+            self.assertTrue(admission.admit("10.0.0.1"))
+            admission.release("10.0.0.1")
+        self.assertFalse(admission.admit("10.0.0.1"))
+        self.assertEqual(admission.rejected["accept_rate"], 1)
+        # Other IPs have their own bucket
+        self.assertTrue(admission.admit("10.0.0.2"))
+
+        clock.now = 1.0
+        self.assertTrue(admission.admit("10.0.0.1"))
+
+    def test_release_is_idempotent(self):
+        admission = AdmissionController()
+        admission.admit("10.0.0.1")
+        admission.release("10.0.0.1")
+        admission.release("10.0.0.1")
+        self.assertEqual(admission.active, 0)
+
+    def test_idle_buckets_expire(self):
+        clock = FakeClock()
+        admission = AdmissionController(accept_rate=1.0, accept_burst=1, clock=clock)
+        admission.admit("10.0.0.1")
+        admission.admit("10.0.0.2")
+        clock.now = 0.5
+        admission.admit("10.0.0.1")
+        clock.now = 1.2
+        admission.admit("10.0.0.3")
+        # 10.0.0.1 was seen again since, and has not refilled yet
+        self.assertEqual(list(admission._buckets), ["10.0.0.1", "10.0.0.3"])
+
+    def test_tracked_ips_are_bounded(self):
+        clock = FakeClock()
+        admission = AdmissionController(accept_rate=1.0, accept_burst=1, clock=clock)
+        admission.MAX_TRACKED_IPS = 2
+        admission.admit("10.0.0.1")
+        admission.admit("10.0.0.2")
+        self.assertFalse(admission.admit("10.0.0.1"))
+        admission.admit("10.0.0.3")
+        # The least recently seen is evicted, not the most recent
+        self.assertEqual(list(admission._buckets), ["10.0.0.1", "10.0.0.3"])
+
+if __name__ == "__main__":
+    unittest.main()
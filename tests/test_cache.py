@@ -0,0 +1,64 @@
+import unittest
+
+from wcps_auth.cache import MISSING, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_size=2, ttl=10, negative_ttl=2, clock=self.clock)
+
+    def test_hit_and_miss(self):
+        self.assertIs(self.cache.get("user123"), MISSING)
+        self.cache.put("user123", {"username": "user123"})
+        self.assertEqual(self.cache.get("user123"), {"username": "user123"})
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_ttl_expiry(self):
+        self.cache.put("user123", {"username": "user123"})
+        self.clock.now = 10
+        self.assertIs(self.cache.get("user123"), MISSING)
+        self.assertEqual(self.cache.expirations, 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_negative_entries(self):
+        self.cache.put("nobody", None)
+        self.assertIsNone(self.cache.get("nobody"))
+        self.clock.now = 2
+        self.assertIs(self.cache.get("nobody"), MISSING)
+
+    def test_lru_eviction(self):
+        self.cache.put("a", 1)
+        self.cache.put("b", 2)
+        self.cache.get("a")
+        self.cache.put("c", 3)
+        self.assertIs(self.cache.get("b"), MISSING)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.get("c"), 3)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_invalidate(self):
+        self.cache.put("user123", {"displayname": "old"})
+        self.cache.invalidate("user123")
+        self.assertIs(self.cache.get("user123"), MISSING)
+        # Invalidating an absent key is a no-op
+        self.cache.invalidate("user123")
+
+    def test_disabled(self):
+        cache = TTLCache(max_size=0, ttl=10)
+        cache.put("user123", 1)
+        self.assertIs(cache.get("user123"), MISSING)
+
+
+if __name__ == "__main__":
+    unittest.main()
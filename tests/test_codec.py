@@ -0,0 +1,175 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from wcps_core.packets import OutPacket, PacketBuffer
+
+from wcps_auth import codec
+from wcps_auth.codec import XorCodec, get_codec
+from wcps_auth.packets import out_packet
+from wcps_auth.packets.in_packet import parse_packets
+from wcps_auth.packets.out_packet import OutgoingPacket
+
+# Packets as they travel on the wire, with the text they decode to and what
+# is parsed from it. Client requests are XORed with 0xC3, replies to the
+# client with 0x96
+WIRE_PACKETS = [
+    (
+        0xC3,
+        "f2f2f7f4f2fbfae3f7f2f2f1e3c9",
+        b"1147189 4112 \n",
+        [(0x1010, [])],
+    ),
+    (
+        0xC3,
+        "f2f2f7f4f2fbfae3f7f0f6f1e3f3e3f3e3b6b0a6b1f2f1f0e3b0a6a0b1a6b7e3c9"
+        "f2f2f7f4f2faf3e3f7f0f6f0e3ada6b4deada2aea6e3c9",
+        b"1147189 4352 0 0 user123 secret \n1147190 4353 new\x1dname \n",
+        [(0x1100, ["0", "0", "user123", "secret"]), (0x1101, ["new name"])],
+    ),
+    (
+        0x96,
+        "a7a4a5a2a3b6a2a5a3a4b6a1a4a6a6a6b69c",
+        b"12345 4352 72000 \n",
+        [(0x1100, ["72000"])],
+    ),
+    (
+        0x96,
+        "a7a4a5a2a3b6a2a7a7a4b6a6b6a6b6a6b6a6b6a6b6a6b6a6b69c",
+        b"12345 4112 0 0 0 0 0 0 0 \n",
+        [(0x1010, ["0"] * 7)],
+    ),
+]
+
+
+def reference_xor(data, key: int) -> bytes:
+    # The per byte loop the codec replaces
+    return bytes(b ^ key for b in data)
+
+
+class TestXorCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.payloads = [
+            b"",
+            b"1 4112 \n",
+            b"1234 4352 0 0 user123 password \n",
+            bytes(range(256)),
+            os.urandom(4096),
+        ]
+
+    def test_equivalence_all_keys(self):
+        for key in range(256):
+            xor_codec = XorCodec(key)
+            for payload in self.payloads:
+                self.assertEqual(xor_codec.decode(payload), reference_xor(payload, key))
+
+    def test_round_trip(self):
+        xor_codec = XorCodec(0xC3)
+        for payload in self.payloads:
+            self.assertEqual(xor_codec.decode(xor_codec.encode(payload)), payload)
+
+    def test_buffer_types(self):
+        xor_codec = XorCodec(0x96)
+        payload = os.urandom(512)
+        expected = reference_xor(payload, 0x96)
+        self.assertEqual(bytes(xor_codec.decode(bytearray(payload))), expected)
+        self.assertEqual(xor_codec.decode(memoryview(payload)), expected)
+
+    @unittest.skipUnless(codec.numpy, "NumPy not installed")
+    def test_numpy_path(self):
+        payload = os.urandom(codec.NUMPY_THRESHOLD + 17)
+        self.assertEqual(
+            XorCodec(0xC3).decode(payload), reference_xor(payload, 0xC3)
+        )
+        self.assertEqual(
+            XorCodec(0xC3, use_numpy=False).decode(payload),
+            reference_xor(payload, 0xC3),
+        )
+
+    def test_shared_codecs(self):
+        self.assertIs(get_codec(0xC3), get_codec(0xC3))
+        self.assertIsNot(get_codec(0xC3), get_codec(0x96))
+
+
+class TestParsePackets(unittest.TestCase):
+
+    def test_parse(self):
+        packets = parse_packets(
+            b"1234 4352 0 0 user123 password \n5678 4353 new\x1dname \n", None
+        )
+        self.assertEqual(len(packets), 2)
+        self.assertEqual(packets[0].ticks, 1234)
+        self.assertEqual(packets[0].packet_id, 4352)
+        self.assertEqual(packets[0].blocks, ["0", "0", "user123", "password"])
+        self.assertEqual(packets[1].blocks, ["new name"])
+
+    def test_no_blocks(self):
+        (packet,) = parse_packets(b"1 4112 \n", None)
+        self.assertEqual(packet.packet_id, 4112)
+        self.assertEqual(packet.blocks, [])
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            parse_packets(b"garbage\n", None)
+        with self.assertRaises(ValueError):
+            parse_packets(b"1 notanid 0 \n", None)
+
+    def test_outgoing_packet_round_trip(self):
+        packet = OutgoingPacket(0x1100)
+        packet.append(0)
+        packet.append("new name")
+        packet.fill(-1, 2)
+        (decoded,) = parse_packets(XorCodec(0x96).decode(packet.encode(0x96)), None)
+        self.assertEqual(decoded.packet_id, 0x1100)
+        self.assertEqual(decoded.blocks, ["0", "new name", "-1", "-1"])
+
+        (decoded,) = parse_packets(OutgoingPacket(0x1010).build(), None)
+        self.assertEqual(decoded.blocks, [])
+
+    def test_wcps_core_round_trip(self):
+        packet = OutPacket(packet_id=0x1100, xor_key=0xC3)
+        packet.append(0)
+        packet.append("user123")
+        packet.append(72000)
+        (decoded,) = parse_packets(XorCodec(0xC3).decode(packet.build()), None)
+        self.assertEqual(decoded.packet_id, 0x1100)
+        self.assertEqual(decoded.blocks, ["0", "user123", "72000"])
+
+
+class TestWirePackets(unittest.TestCase):
+
+    def test_decode(self):
+        for key, wire, text, packets in WIRE_PACKETS:
+            with self.subTest(text=text):
+                decoded = XorCodec(key).decode(bytes.fromhex(wire))
+                self.assertEqual(decoded, text)
+                parsed = parse_packets(decoded, None)
+                self.assertEqual([(p.packet_id, p.blocks) for p in parsed], packets)
+
+    def test_encode(self):
+        error = OutgoingPacket(0x1100)
+        error.append(72000)
+        launcher = OutgoingPacket(0x1010)
+        launcher.fill(0, 7)
+        with patch.object(out_packet, "ticks", return_value=12345):
+            self.assertEqual(error.encode(0x96), bytes.fromhex(WIRE_PACKETS[2][1]))
+            self.assertEqual(
+                launcher.encode(0x96), bytes.fromhex(WIRE_PACKETS[3][1])
+            )
+
+    def test_matches_wcps_core(self):
+        # The inbound decoding parse_packets replaced
+        for key, wire, text, packets in WIRE_PACKETS:
+            with self.subTest(text=text):
+                buffer = PacketBuffer(
+                    buffer=bytes.fromhex(wire), receptor=None, xor_key=key
+                )
+                self.assertEqual(
+                    [(p.packet_id, list(p.blocks)) for p in buffer.packet_stack],
+                    packets,
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from wcps_auth import database, metrics
+from wcps_auth.storage.memory import MemoryStorage
+
+
+class CaseInsensitiveStorage(MemoryStorage):
+    """Matches usernames like MySQL's default collation does"""
+
+    async def fetch_user_details(self, username: str) -> dict:
+        for stored in self._users:
+            if stored.casefold() == username.casefold():
+                return await super().fetch_user_details(stored)
+        return None
+
+
+class TestUserCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(setattr, database, "storage", database.storage)
+        database.user_cache.clear()
+        self.addCleanup(database.user_cache.clear)
+
+        self.storage = CaseInsensitiveStorage()
+        self.wait(self.storage.add_user("user123", "hash", "salt"))
+        self.wait(database.open_storage(self.storage))
+
+    def tearDown(self):
+        self.loop.close()
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_repeat_login_is_cached(self):
+        self.wait(database.get_user_details("user123"))
+        hits = database.user_cache.hits
+        self.wait(database.get_user_details("user123"))
+        self.assertEqual(database.user_cache.hits, hits + 1)
+
+    def test_other_spelling_sees_updates(self):
+        this_user = self.wait(database.get_user_details("User123"))
+        self.assertEqual(this_user["username"], "user123")
+        self.assertEqual(self.wait(database.get_user_details("User123")), this_user)
+
+        # Updates invalidate the stored username, not what was typed
+        self.assertTrue(self.wait(database.claim_displayname("user123", "nick1")))
+        self.wait(database.update_password("user123", "new hash", "new salt"))
+        this_user = self.wait(database.get_user_details("User123"))
+        self.assertEqual(this_user["displayname"], "nick1")
+        self.assertEqual(this_user["password"], "new hash")
+
+    def test_password_hash_longer_than_the_column(self):
+        self.storage.password_max_length = 64
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(
+                self.wait(database.update_password("user123", "a" * 65, "new salt"))
+            )
+        this_user = self.wait(self.storage.fetch_user_details("user123"))
+        self.assertEqual(this_user["password"], "hash")
+
+        self.assertTrue(
+            self.wait(database.update_password("user123", "a" * 64, "new salt"))
+        )
+
+    def test_cache_counters_are_exported(self):
+        text = metrics.registry.render()
+        for sample in (
+            'wcps_user_cache_lookups_total{result="hit"}',
+            'wcps_user_cache_lookups_total{result="miss"}',
+            'wcps_user_cache_removals_total{reason="evicted"}',
+            'wcps_user_cache_removals_total{reason="expired"}',
+        ):
+            self.assertIn(sample, text)
+
+    def test_unknown_user(self):
+        self.assertIsNone(self.wait(database.get_user_details("nobody")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+
+from wcps_auth.dispatch import DispatchQueueFull, PacketDispatcher
+
+
+class MockPacket:
+    def __init__(self, packet_id):
+        self.packet_id = packet_id
+
+
+class RecordingHandler:
+    def __init__(self, log, delay=0.0):
+        self.log = log
+        self.delay = delay
+
+    async def handle(self, packet):
+        self.log.append(("start", packet.packet_id))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", packet.packet_id))
+
+
+class TestPacketDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_dispatcher(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_in_order(self):
+        log = []
+
+        async def scenario():
+            dispatcher = PacketDispatcher(max_in_flight=1, max_queued=8)
+            # The first handler is slower, but must still finish first
+            dispatcher.submit(RecordingHandler(log, delay=0.02), MockPacket(1))
+            dispatcher.submit(RecordingHandler(log), MockPacket(2))
+            dispatcher.submit(RecordingHandler(log), MockPacket(3))
+            await asyncio.sleep(0.05)
+
+        self.run_dispatcher(scenario())
+        self.assertEqual(
+            log,
+            [
+                ("start", 1),
+                ("end", 1),
+                ("start", 2),
+                ("end", 2),
+                ("start", 3),
+                ("end", 3),
+            ],
+        )
+
+    def test_overflow(self):
+        async def scenario():
+            dispatcher = PacketDispatcher(max_in_flight=1, max_queued=2)
+            handler = RecordingHandler([], delay=0.01)
+            dispatcher.submit(handler, MockPacket(1))
+            dispatcher.submit(handler, MockPacket(2))
+            with self.assertRaises(DispatchQueueFull):
+                dispatcher.submit(handler, MockPacket(3))
+            self.assertEqual(len(dispatcher), 2)
+            self.assertEqual(dispatcher.max_depth, 2)
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(dispatcher), 0)
+
+        self.run_dispatcher(scenario())
+
+    def test_max_in_flight(self):
+        async def scenario():
+            dispatcher = PacketDispatcher(max_in_flight=2, max_queued=8)
+            handler = RecordingHandler([], delay=0.01)
+            for packet_id in range(4):
+                dispatcher.submit(handler, MockPacket(packet_id))
+            await asyncio.sleep(0)
+            self.assertEqual(dispatcher.in_flight, 2)
+            await asyncio.sleep(0.05)
+            self.assertEqual(dispatcher.in_flight, 0)
+
+        self.run_dispatcher(scenario())
+
+    def test_clear(self):
+        log = []
+
+        async def scenario():
+            dispatcher = PacketDispatcher(max_in_flight=1, max_queued=8)
+            handler = RecordingHandler(log, delay=0.01)
+            for packet_id in range(3):
+                dispatcher.submit(handler, MockPacket(packet_id))
+            await asyncio.sleep(0)
+            dispatcher.clear()
+            await asyncio.sleep(0.05)
+
+        self.run_dispatcher(scenario())
+        # Only the running handler completes
+        self.assertEqual(log, [("start", 0), ("end", 0)])
+
+    def test_handler_errors_do_not_stop_the_queue(self):
+        log = []
+
+        class FailingHandler:
+            async def handle(self, packet):
+                raise RuntimeError("boom")
+
+        async def scenario():
+            dispatcher = PacketDispatcher(max_in_flight=1, max_queued=8)
+            dispatcher.submit(FailingHandler(), MockPacket(1))
+            dispatcher.submit(RecordingHandler(log), MockPacket(2))
+            await asyncio.sleep(0.01)
+
+        with self.assertLogs(level="ERROR"):
+            self.run_dispatcher(scenario())
+        self.assertEqual(log, [("start", 2), ("end", 2)])
+
+    def test_submit_as_the_worker_finishes(self):
+        log = []
+
+        async def scenario():
+            dispatcher = PacketDispatcher(max_in_flight=1, max_queued=8)
+            loop = asyncio.get_running_loop()
+
+            class ImmediateHandler:
+                async def handle(self, packet):
+                    # Runs after the worker returns, but before any callback
+                    # the finished task schedules
+                    loop.call_soon(
+                        dispatcher.submit, RecordingHandler(log), MockPacket(2)
+                    )
+
+            dispatcher.submit(ImmediateHandler(), MockPacket(1))
+            await asyncio.sleep(0.01)
+
+        self.run_dispatcher(scenario())
+        self.assertEqual(log, [("start", 2), ("end", 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
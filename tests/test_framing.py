@@ -0,0 +1,62 @@
+import unittest
+
+from wcps_auth.framing import FrameTooLarge, PacketFramer
+
+XOR_KEY = 0xC3
+
+
+def encode(text: str) -> bytes:
+    return bytes(b ^ XOR_KEY for b in text.encode("utf-8"))
+
+
+class TestPacketFramer(unittest.TestCase):
+
+    def setUp(self):
+        self.framer = PacketFramer(XOR_KEY, max_frame_size=64)
+
+    def test_whole_packet(self):
+        packet = encode("1 4112 \n")
+        self.assertEqual(self.framer.feed(packet), packet)
+        self.assertEqual(len(self.framer), 0)
+
+    def test_split_packet(self):
+        packet = encode("1 4352 0 0 user123 password \n")
+        self.assertIsNone(self.framer.feed(packet[:5]))
+        self.assertIsNone(self.framer.feed(packet[5:-1]))
+        self.assertEqual(len(self.framer), len(packet) - 1)
+        self.assertEqual(self.framer.feed(packet[-1:]), packet)
+
+    def test_coalesced_packets(self):
+        first = encode("1 4112 \n")
+        second = encode("2 4352 0 0 user123 password \n")
+        third = encode("3 4353 nickname \n")
+
+        self.assertEqual(self.framer.feed(first + second + third[:4]), first + second)
+        self.assertEqual(self.framer.feed(third[4:]), third)
+
+    def test_byte_by_byte(self):
+        packets = encode("1 4112 \n") + encode("2 4353 nickname \n")
+        received = b""
+        for i in range(len(packets)):
+            frames = self.framer.feed(packets[i : i + 1])
+            if frames:
+                received += frames
+        self.assertEqual(received, packets)
+        self.assertEqual(len(self.framer), 0)
+
+    def test_partial_packet_too_large(self):
+        with self.assertRaises(FrameTooLarge):
+            self.framer.feed(encode("x" * 65))
+
+    def test_complete_packet_too_large(self):
+        with self.assertRaises(FrameTooLarge):
+            self.framer.feed(encode("1 4112 " + "x" * 64 + "\n"))
+
+    def test_many_packets_within_limit(self):
+        # The limit applies per packet, not per read
+        packets = encode("1 4112 \n") * 20
+        self.assertEqual(self.framer.feed(packets), packets)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,352 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from wcps_core.constants import ErrorCodes
+
+from wcps_auth.codec import get_codec
+from wcps_auth.error_codes import ServerListError
+from wcps_auth.handlers import handler_factory, nickname, server_list
+from wcps_auth.loadgen import build_packet
+from wcps_auth.log import packet_dumps
+from wcps_auth.networking import GameServer, User
+from wcps_auth.packets.in_packet import parse_packets
+from wcps_auth.packets.packet_list import ClientXorKeys, PacketList
+from wcps_auth.session_store import SessionStoreError
+from wcps_auth.sessions import SessionManager
+
+
+class MockTransport:
+    def get_write_buffer_size(self):
+        return 0
+
+
+class MockWriter:
+    transport = MockTransport()
+
+    def __init__(self):
+        self.written = bytearray()
+        self.closed = False
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 5000)
+
+    def write(self, data):
+        self.written += data
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    async def drain(self):
+        pass
+
+
+class TestDispatchTable(unittest.TestCase):
+
+    def test_one_handler_per_packet_id(self):
+        first = handler_factory.get_handler_for_packet(PacketList.SERVER_LIST)
+        second = handler_factory.get_handler_for_packet(PacketList.SERVER_LIST)
+        self.assertIs(first, second)
+
+    def test_listeners_only_dispatch_their_packets(self):
+        client = handler_factory.CLIENT_DISPATCH
+        internal = handler_factory.INTERNAL_DISPATCH
+        get_handler = handler_factory.get_handler_for_packet
+        for packet_id in handler_factory.INTERNAL_HANDLERS:
+            self.assertIsNone(get_handler(packet_id, client))
+            self.assertIsNotNone(get_handler(packet_id, internal))
+        for packet_id in handler_factory.CLIENT_HANDLERS:
+            self.assertIsNone(get_handler(packet_id, internal))
+            self.assertIsNotNone(get_handler(packet_id, client))
+
+    def test_unknown_packet_ids(self):
+        for packet_id in (-1, 0, 1 << 20):
+            self.assertIsNone(handler_factory.get_handler_for_packet(packet_id))
+
+
+class TestSetNickName(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def set_nickname(self, new_nickname: str, claimed: bool = True):
+        # Feeds a SETNICKNAME packet to an authorized user. Returns the error
+        # code it was answered with and the mocked storage claim
+        claim = AsyncMock(return_value=claimed)
+
+        async def scenario():
+            writer = MockWriter()
+            user = User(None, writer)
+            user.authorized = True
+            user.username = "user123"
+            packet = build_packet(
+                PacketList.SETNICKNAME, (new_nickname,), ClientXorKeys.RECEIVE
+            )
+            self.assertTrue(user.feed(packet))
+            await asyncio.sleep(0.01)
+            replies = parse_packets(
+                get_codec(ClientXorKeys.SEND).decode(bytes(writer.written)), None
+            )
+            # replies[0] is the Connection greeting
+            return int(replies[-1].blocks[0])
+
+        with patch.object(nickname, "claim_displayname", claim):
+            with self.assertNoLogs(level="ERROR"):
+                error_code = self.loop.run_until_complete(scenario())
+        return error_code, claim
+
+    def test_invalid_names_never_reach_storage(self):
+        for new_nickname, expected in (
+            ("abc", ServerListError.ILLEGAL_NICKNAME),
+            ("nick!name", ServerListError.ILLEGAL_NICKNAME),
+            ("a" * 17, ServerListError.NICKNAME_TOO_LONG),
+        ):
+            with self.subTest(new_nickname=new_nickname):
+                error_code, claim = self.set_nickname(new_nickname)
+                self.assertEqual(error_code, expected)
+                claim.assert_not_awaited()
+
+    def test_taken_name(self):
+        error_code, claim = self.set_nickname("nickname1", claimed=False)
+        self.assertEqual(error_code, ServerListError.NICKNAME_TAKEN)
+        claim.assert_awaited_once_with(
+            username="user123", new_displayname="nickname1"
+        )
+
+
+class TestLogin(unittest.TestCase):
+
+    def test_session_store_failure(self):
+        this_user = {
+            "username": "user123",
+            "displayname": "nick",
+            "password": "hash",
+            "salt": "salt",
+            "rights": 1,
+        }
+
+        async def scenario():
+            writer = MockWriter()
+            user = User(None, writer)
+            packet = build_packet(
+                PacketList.SERVER_LIST,
+                ("0", "0", "user123", "secret"),
+                ClientXorKeys.RECEIVE,
+            )
+            self.assertTrue(user.feed(packet))
+            await asyncio.sleep(0.01)
+            replies = parse_packets(
+                get_codec(ClientXorKeys.SEND).decode(bytes(writer.written)), None
+            )
+            self.assertEqual(
+                int(replies[-1].blocks[0]), ServerListError.ILLEGAL_EXCEPTION
+            )
+            self.assertTrue(writer.closed)
+            # The account's login lock is released
+            self.assertEqual(len(server_list.login_locks), 0)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        failure = SessionStoreError("replace_user_session timed out after 5.0s")
+        with patch.object(
+            server_list, "get_user_details", AsyncMock(return_value=this_user)
+        ), patch.object(
+            server_list, "verify_password", AsyncMock(return_value=True)
+        ), patch.object(
+            User, "authorize", AsyncMock(side_effect=failure)
+        ), self.assertLogs(level="ERROR"):
+            loop.run_until_complete(scenario())
+
+
+class TestLoginDumps(unittest.TestCase):
+
+    def test_password_is_not_dumped(self):
+        packet_dumps.configure(1, 4)
+        self.addCleanup(packet_dumps.configure, 0, 0)
+        login = handler_factory.get_handler_for_packet(PacketList.SERVER_LIST)
+
+        async def scenario():
+            user = User(None, MockWriter())
+            packet = build_packet(
+                PacketList.SERVER_LIST,
+                ("0", "0", "user123", "secret"),
+                ClientXorKeys.RECEIVE,
+            )
+            self.assertTrue(user.feed(packet))
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with patch.object(login, "process", AsyncMock()):
+            loop.run_until_complete(scenario())
+        inbound = [entry[3] for entry in packet_dumps.ring if entry[1] == "in"]
+        self.assertEqual(len(inbound), 1)
+        self.assertIn(b"user123", inbound[0])
+        self.assertNotIn(b"secret", inbound[0])
+
+
+class TestRejectedPackets(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def feed_invalid(self, entity_class, authorized, packet_id, blocks, before=()):
+        # Feeds a packet that fails its schema, in one read after the packets
+        # in before. Returns whether the connection stays open and the packets
+        # answered. The invalid packet never reaches its handler's process()
+        async def scenario():
+            writer = MockWriter()
+            entity = entity_class(None, writer)
+            entity.authorized = authorized
+            data = b"".join(
+                build_packet(*packet, entity.xor_key_receive)
+                for packet in (*before, (packet_id, blocks))
+            )
+            handler = entity.get_handler_for_packet(packet_id)
+            with patch.object(handler, "process", AsyncMock()) as process:
+                with self.assertLogs(level="WARNING"):
+                    self.assertTrue(entity.feed(data))
+                    await asyncio.sleep(0.01)
+            process.assert_not_awaited()
+            replies = parse_packets(
+                get_codec(entity.xor_key_send).decode(bytes(writer.written)), None
+            )
+            # Without the Connection greeting
+            return not writer.closed, [(p.packet_id, p.blocks) for p in replies[1:]]
+
+        return self.loop.run_until_complete(scenario())
+
+    def test_invalid_login_disconnects(self):
+        kept_open, replies = self.feed_invalid(
+            User, False, PacketList.SERVER_LIST, ("0", "0", "a!", "secret")
+        )
+        self.assertFalse(kept_open)
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(replies[0][0], PacketList.SERVER_LIST)
+        self.assertEqual(int(replies[0][1][0]), ServerListError.ENTER_ID_ERROR)
+
+    def test_invalid_nickname_keeps_the_user(self):
+        kept_open, replies = self.feed_invalid(
+            User, True, PacketList.SETNICKNAME, ("abc",)
+        )
+        self.assertTrue(kept_open)
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(int(replies[0][1][0]), ServerListError.ILLEGAL_NICKNAME)
+
+    def test_rejection_waits_for_earlier_packets(self):
+        kept_open, replies = self.feed_invalid(
+            User,
+            False,
+            PacketList.SERVER_LIST,
+            ("0", "0", "a!", "secret"),
+            before=[(PacketList.LAUNCHER, ())],
+        )
+        self.assertFalse(kept_open)
+        self.assertEqual(
+            [packet_id for packet_id, _ in replies],
+            [PacketList.LAUNCHER, PacketList.SERVER_LIST],
+        )
+        self.assertEqual(int(replies[1][1][0]), ServerListError.ENTER_ID_ERROR)
+
+    def test_invalid_nickname_after_login_in_the_same_read(self):
+        async def login(user, request):
+            await asyncio.sleep(0)
+            user.authorized = True
+
+        login_handler = handler_factory.get_handler_for_packet(PacketList.SERVER_LIST)
+        with patch.object(login_handler, "process", login):
+            kept_open, replies = self.feed_invalid(
+                User,
+                False,
+                PacketList.SETNICKNAME,
+                ("abc",),
+                before=[(PacketList.SERVER_LIST, ("0", "0", "user123", "secret"))],
+            )
+        self.assertTrue(kept_open)
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(int(replies[0][1][0]), ServerListError.ILLEGAL_NICKNAME)
+
+    def test_invalid_nickname_before_login_is_ignored(self):
+        kept_open, replies = self.feed_invalid(
+            User, False, PacketList.SETNICKNAME, ("abc",)
+        )
+        self.assertTrue(kept_open)
+        self.assertEqual(replies, [])
+
+    def test_invalid_player_report_is_refused(self):
+        kept_open, replies = self.feed_invalid(
+            GameServer,
+            True,
+            PacketList.INTERNALPLAYERAUTHENTICATION,
+            ("0", "abc", "user123", "1"),
+        )
+        self.assertTrue(kept_open)
+        self.assertEqual(
+            replies,
+            [
+                (
+                    PacketList.INTERNALPLAYERAUTHENTICATION,
+                    [str(ErrorCodes.INVALID_SESSION_MATCH), "user123", "abc", "1"],
+                )
+            ],
+        )
+
+    def test_invalid_packets_from_unauthorized_servers_disconnect(self):
+        for packet_id, blocks in (
+            (PacketList.INTERNALPLAYERAUTHENTICATION, ("0", "abc", "user123", "1")),
+            (PacketList.INTERNALGAMESTATUS, ("0", "0", "1", "-1", "0")),
+        ):
+            with self.subTest(packet_id=packet_id):
+                kept_open, replies = self.feed_invalid(
+                    GameServer, False, packet_id, blocks
+                )
+                self.assertFalse(kept_open)
+                self.assertEqual(replies, [])
+
+    def test_failed_game_server_auth_is_ignored(self):
+        # Only a packet reporting SUCCESS is read, whatever else it holds
+        kept_open, replies = self.feed_invalid(
+            GameServer,
+            False,
+            PacketList.INTERNALGAMEAUTHENTICATION,
+            (str(ErrorCodes.END_CONNECTION), "1"),
+        )
+        self.assertTrue(kept_open)
+        self.assertEqual(replies, [])
+
+    def test_full_auth_server_refuses_before_validation(self):
+        # An invalid server name
+        auth = (str(int(ErrorCodes.SUCCESS)), "1", "a!", "127.0.0.1", 5340, 0, 0, 10)
+        with patch.object(
+            SessionManager, "get_all_authorized_servers", return_value=[None] * 31
+        ):
+            kept_open, replies = self.feed_invalid(
+                GameServer, False, PacketList.INTERNALGAMEAUTHENTICATION, auth
+            )
+        self.assertTrue(kept_open)
+        self.assertEqual(replies[0][1][0], str(int(ErrorCodes.SERVER_LIMIT_REACHED)))
+
+        kept_open, replies = self.feed_invalid(
+            GameServer, False, PacketList.INTERNALGAMEAUTHENTICATION, auth
+        )
+        self.assertFalse(kept_open)
+        self.assertEqual(replies[0][1][0], str(int(ErrorCodes.SERVER_ERROR_OTHER)))
+
+    def test_invalid_status_report_is_dropped(self):
+        kept_open, replies = self.feed_invalid(
+            GameServer, True, PacketList.INTERNALGAMESTATUS, ("0", "0", "1", "-1", "0")
+        )
+        self.assertTrue(kept_open)
+        self.assertEqual(replies, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import logging
+import queue
+import unittest
+
+from wcps_auth.codec import XorCodec
+from wcps_auth.log import LocalQueueHandler, PacketDumps
+
+
+class TestPacketDumps(unittest.TestCase):
+
+    def test_disabled_by_default(self):
+        self.assertFalse(PacketDumps().enabled)
+
+    def test_samples_one_in_n(self):
+        dumps = PacketDumps(sample_every=3, ring_size=10)
+        for i in range(9):
+            dumps.record("in", ("127.0.0.1", 5000), f"packet{i}".encode())
+        self.assertEqual(
+            [entry[3] for entry in dumps.ring], [b"packet2", b"packet5", b"packet8"]
+        )
+
+    def test_ring_keeps_the_latest(self):
+        dumps = PacketDumps(sample_every=1, ring_size=2)
+        for i in range(5):
+            dumps.record("in", None, f"packet{i}".encode())
+        self.assertEqual([entry[3] for entry in dumps.ring], [b"packet3", b"packet4"])
+        self.assertIn("in None b'packet4'", dumps.format())
+
+    def test_encoded_buffers_are_decoded(self):
+        codec = XorCodec(0x96)
+        dumps = PacketDumps(sample_every=1, ring_size=1)
+        dumps.record("out", None, codec.encode(b"1 4112 \n"), codec)
+        self.assertEqual(dumps.ring[0][3], b"1 4112 \n")
+
+    def test_redacted_blocks(self):
+        dumps = PacketDumps(sample_every=1, ring_size=2)
+        dumps.redact(4352, 3)
+        dumps.record("in", None, b"1 4112 \n1 4352 0 0 user123 secret \n")
+        self.assertEqual(dumps.ring[0][3], b"1 4112 \n1 4352 0 0 user123  \n")
+        # Only inbound packets, a reply with the same ID keeps its blocks
+        dumps.record("out", None, b"1 4352 0 0 1 2 \n")
+        self.assertEqual(dumps.ring[1][3], b"1 4352 0 0 1 2 \n")
+
+    def test_log_channel(self):
+        dumps = PacketDumps(sample_every=1, ring_size=0, log=True)
+        with self.assertLogs("wcps_auth.packets", level="INFO") as logs:
+            dumps.record("in", None, b"1 4112 \n")
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(len(dumps.ring), 0)
+
+
+class TestLocalQueueHandler(unittest.TestCase):
+
+    def test_formatting_is_left_to_the_listener(self):
+        records = queue.SimpleQueue()
+        logger = logging.getLogger("wcps_auth.test_log")
+        logger.propagate = False
+        handler = LocalQueueHandler(records)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        logger.warning("Dropping connection: %s", "frame too large")
+        record = records.get_nowait()
+        self.assertEqual(record.msg, "Dropping connection: %s")
+        self.assertEqual(record.args, ("frame too large",))
+        self.assertEqual(record.getMessage(), "Dropping connection: frame too large")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import unittest
+
+from wcps_auth.metrics import MetricsRegistry, serve_metrics, timed
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        packets = self.registry.counter("packets_total", "Packets", ("listener",))
+        packets.labels("client").inc()
+        packets.labels("client").inc(2)
+        packets.labels("internal").inc()
+
+        text = self.registry.render()
+        self.assertIn("# TYPE packets_total counter", text)
+        self.assertIn('packets_total{listener="client"} 3', text)
+        self.assertIn('packets_total{listener="internal"} 1', text)
+
+    def test_registering_twice_returns_the_same_metric(self):
+        first = self.registry.counter("packets_total", "Packets")
+        self.assertIs(first, self.registry.counter("packets_total", "Packets"))
+
+    def test_wrong_label_count(self):
+        packets = self.registry.counter("packets_total", "Packets", ("listener",))
+        with self.assertRaises(ValueError):
+            packets.labels("client", "extra")
+
+    def test_histogram_buckets_are_cumulative(self):
+        seconds = self.registry.histogram(
+            "handler_seconds", "Handler time", ("handler",), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.1, 0.5, 2.0):
+            seconds.labels("Launcher").observe(value)
+
+        text = self.registry.render()
+        self.assertIn('handler_seconds_bucket{handler="Launcher",le="0.1"} 2', text)
+        self.assertIn('handler_seconds_bucket{handler="Launcher",le="1.0"} 3', text)
+        self.assertIn('handler_seconds_bucket{handler="Launcher",le="+Inf"} 4', text)
+        self.assertIn('handler_seconds_count{handler="Launcher"} 4', text)
+        self.assertIn('handler_seconds_sum{handler="Launcher"} 2.65', text)
+
+    def test_callback(self):
+        sessions = {"user": 3}
+        self.registry.callback(
+            "sessions", "Sessions", ("kind",), lambda: [(("user",), sessions["user"])]
+        )
+        self.assertIn('sessions{kind="user"} 3', self.registry.render())
+        sessions["user"] = 4
+        self.assertIn('sessions{kind="user"} 4', self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        names = self.registry.counter("names_total", "Names", ("name",))
+        names.labels('a"b\\c').inc()
+        self.assertIn(r'names_total{name="a\"b\\c"} 1', self.registry.render())
+
+    def test_timed(self):
+        seconds = self.registry.histogram("db_seconds", "DB", ("function",))
+        errors = self.registry.counter("db_errors_total", "DB", ("function",))
+
+        @timed(seconds, errors)
+        async def fetch_user(fail):
+            if fail:
+                raise ValueError("no database")
+            return "user123"
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(fetch_user(False)), "user123")
+            with self.assertRaises(ValueError):
+                loop.run_until_complete(fetch_user(True))
+        finally:
+            loop.close()
+
+        self.assertEqual(seconds.labels("fetch_user").count, 2)
+        self.assertEqual(errors.labels("fetch_user").value, 1)
+
+
+class TestMetricsServer(unittest.TestCase):
+
+    def request(self, request_line):
+        async def scenario():
+            server = await asyncio.start_server(serve_metrics, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request_line + b"Host: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(scenario())
+        finally:
+            loop.close()
+
+    def test_get_metrics(self):
+        response = self.request(b"GET /metrics HTTP/1.1\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK"))
+        self.assertIn(b"# TYPE wcps_handler_seconds histogram", response)
+
+    def test_unknown_path(self):
+        response = self.request(b"GET / HTTP/1.1\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 404"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from wcps_auth import entities
+from wcps_auth.codec import get_codec
+from wcps_auth.entities import BaseNetworkEntity
+
+SEND_KEY = 0x96
+
+
+class MockTransport:
+    def get_write_buffer_size(self):
+        return 0
+
+
+class MockWriter:
+    transport = MockTransport()
+
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 5000)
+
+    def write(self, data):
+        # Kept decoded, as the text of the packets in the write
+        self.writes.append(get_codec(SEND_KEY).decode(data))
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    async def drain(self):
+        pass
+
+
+class ReplyHandler:
+    def __init__(self, entity):
+        self.entity = entity
+
+    async def handle(self, packet):
+        await self.entity.send(b"reply%d" % packet)
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_entity(self, scenario):
+        async def run():
+            writer = MockWriter()
+            entity = BaseNetworkEntity(None, writer, SEND_KEY, 0xC3)
+            # The Connection greeting
+            await asyncio.sleep(0)
+            self.assertEqual(len(writer.writes), 1)
+            await scenario(entity, writer)
+
+        self.loop.run_until_complete(run())
+
+    def test_replies_of_a_burst_share_one_write(self):
+        async def scenario(entity, writer):
+            handler = ReplyHandler(entity)
+            for packet in range(16):
+                entity._dispatcher.submit(handler, packet)
+            await asyncio.sleep(0.01)
+            self.assertEqual(len(writer.writes), 2)
+            replies = b"".join(b"reply%d" % i for i in range(16))
+            self.assertEqual(writer.writes[1], replies)
+
+        self.run_entity(scenario)
+
+    def test_disconnect_writes_queued_packets_first(self):
+        async def scenario(entity, writer):
+            entity.send_nowait(b"bye")
+            await entity.disconnect()
+            self.assertEqual(writer.writes[-1], b"bye")
+            self.assertTrue(writer.closed)
+            # Nothing is queued once the connection is closing
+            entity.send_nowait(b"late")
+            await asyncio.sleep(0)
+            self.assertEqual(len(writer.writes), 2)
+
+        self.run_entity(scenario)
+
+    def test_failed_drain_leaves_disconnecting_to_the_read_side(self):
+        async def scenario(entity, writer):
+            writer.drain = AsyncMock(side_effect=ConnectionResetError("reset"))
+            entity.disconnect = AsyncMock()
+            with patch.object(entities, "SEND_HIGH_WATER", 0):
+                await entity.send(b"lost")
+            writer.drain.assert_awaited_once()
+            entity.disconnect.assert_not_awaited()
+            self.assertTrue(writer.closed)
+            # Broken: nothing more is queued for it
+            entity.send_nowait(b"late")
+            self.assertEqual(entity._outbox, [])
+
+        self.run_entity(scenario)
+
+    def test_reset_connection_is_disconnected(self):
+        async def run():
+            reader = Mock()
+            reader.read = AsyncMock(side_effect=ConnectionResetError("reset"))
+            writer = MockWriter()
+            entity = BaseNetworkEntity(reader, writer, SEND_KEY, 0xC3)
+            with self.assertLogs(level="INFO"):
+                await entity.listen_task
+            self.assertTrue(writer.closed)
+
+        self.loop.run_until_complete(run())
+
+    def test_failed_flush_does_not_stall_other_connections(self):
+        async def scenario(entity, writer):
+            broken_writer = MockWriter()
+            broken = BaseNetworkEntity(None, broken_writer, SEND_KEY, 0xC3)
+            await asyncio.sleep(0)
+
+            def fail(data):
+                raise OSError("transport broken")
+
+            broken_writer.write = fail
+            broken.send_nowait(b"lost")
+            entity.send_nowait(b"first")
+            with self.assertLogs(level="ERROR"):
+                await asyncio.sleep(0)
+            self.assertEqual(writer.writes[-1], b"first")
+
+            # Both are scheduled again on their next send
+            del broken_writer.write
+            broken.send_nowait(b"retry")
+            entity.send_nowait(b"second")
+            await asyncio.sleep(0)
+            self.assertEqual(broken_writer.writes[-1], b"retry")
+            self.assertEqual(writer.writes[-1], b"second")
+
+        self.run_entity(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import unittest
+from unittest.mock import patch
+
+from wcps_auth import passwords
+from wcps_auth.handlers import server_list
+from wcps_auth.passwords import (
+    Pbkdf2Hasher,
+    PasswordVerifier,
+    ScryptHasher,
+    Sha256Hasher,
+    VerifierBusy,
+)
+
+
+class BlockingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Holds every check until released, to fill the verifier's queue"""
+
+    def __init__(self):
+        super().__init__(1)
+        self.release = threading.Event()
+
+    def submit(self, function, *args):
+        def blocked():
+            self.release.wait(5)
+            return function(*args)
+
+        return super().submit(blocked)
+
+
+class TestHashers(unittest.TestCase):
+
+    def test_verify(self):
+        for hasher in (Sha256Hasher(), Pbkdf2Hasher(1000), ScryptHasher(n=16)):
+            with self.subTest(scheme=hasher.scheme):
+                stored = hasher.hash("secret", "salt")
+                self.assertTrue(hasher.identify(stored))
+                self.assertTrue(hasher.verify("secret", "salt", stored))
+                self.assertFalse(hasher.verify("wrong", "salt", stored))
+                self.assertFalse(hasher.verify("secret", "pepper", stored))
+                self.assertFalse(hasher.needs_rehash(stored))
+
+    def test_sha256_is_the_legacy_format(self):
+        # Hex sha256 of password + salt, as stored by existing accounts
+        self.assertEqual(
+            Sha256Hasher().hash("secret", "salt"),
+            hashlib.sha256(b"secretsalt").hexdigest(),
+        )
+
+    def test_needs_rehash_on_other_parameters(self):
+        stored = Pbkdf2Hasher(1000).hash("secret", "salt")
+        self.assertTrue(Pbkdf2Hasher(2000).needs_rehash(stored))
+        stored = ScryptHasher(n=16).hash("secret", "salt")
+        self.assertTrue(ScryptHasher(n=32).needs_rehash(stored))
+
+
+class TestPasswordVerifier(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.hashers = [Sha256Hasher(), Pbkdf2Hasher(1000), ScryptHasher(n=16)]
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.loop.close()
+
+    def verifier(self, preferred, executor=None, max_pending=4):
+        return PasswordVerifier(
+            self.hashers, preferred, executor or self.executor, max_pending
+        )
+
+    def verify(self, verifier, password, salt, stored):
+        return self.loop.run_until_complete(verifier.verify(password, salt, stored))
+
+    def test_rehash_on_login(self):
+        verifier = self.verifier(self.hashers[1])
+        legacy = self.hashers[0].hash("secret", "salt")
+
+        result = self.verify(verifier, "secret", "salt", legacy)
+        self.assertTrue(result.valid)
+        self.assertTrue(result.new_hash.startswith("pbkdf2_sha256$1000$"))
+        self.assertNotEqual(result.new_salt, "salt")
+        self.assertTrue(
+            self.verify(verifier, "secret", result.new_salt, result.new_hash).valid
+        )
+
+        # Nothing to upgrade for the preferred scheme, or a wrong password
+        result = self.verify(verifier, "secret", result.new_salt, result.new_hash)
+        self.assertIsNone(result.new_hash)
+        result = self.verify(verifier, "wrong", "salt", legacy)
+        self.assertFalse(result.valid)
+        self.assertIsNone(result.new_hash)
+
+    def test_inline_scheme_without_rehash(self):
+        verifier = self.verifier(self.hashers[0], max_pending=0)
+        stored = self.hashers[0].hash("secret", "salt")
+        # Checked on the event loop, so the queue limit does not apply
+        result = self.verify(verifier, "secret", "salt", stored)
+        self.assertTrue(result.valid)
+        self.assertIsNone(result.new_hash)
+
+    def test_unknown_hash_is_invalid(self):
+        verifier = self.verifier(self.hashers[1])
+        self.assertFalse(self.verify(verifier, "secret", "salt", "md5$abc").valid)
+
+    def test_busy_when_queue_is_full(self):
+        executor = BlockingExecutor()
+        self.addCleanup(executor.shutdown)
+        verifier = self.verifier(self.hashers[1], executor, max_pending=2)
+        stored = self.hashers[1].hash("secret", "salt")
+
+        async def scenario():
+            pending = [
+                asyncio.ensure_future(verifier.verify("secret", "salt", stored))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            with self.assertRaises(VerifierBusy):
+                await verifier.verify("secret", "salt", stored)
+            self.assertEqual(verifier.rejected, 1)
+
+            executor.release.set()
+            results = await asyncio.gather(*pending)
+            self.assertTrue(all(result.valid for result in results))
+            self.assertEqual(verifier.pending, 0)
+
+        self.loop.run_until_complete(scenario())
+
+    def test_unknown_scheme_setting(self):
+        class Config:
+            password_scheme = "md5"
+            pbkdf2_iterations = 1000
+            scrypt_n = 16
+            scrypt_r = 8
+            scrypt_p = 1
+
+        with patch.object(passwords, "_verifier", None), patch.object(
+            passwords, "settings", return_value=Config()
+        ):
+            with self.assertRaisesRegex(ValueError, "sha256, pbkdf2_sha256, scrypt"):
+                passwords.get_password_verifier()
+
+
+class TestRehashTask(unittest.TestCase):
+
+    def test_failed_upgrade_is_logged(self):
+        class Verifier:
+            async def verify(self, password, salt, stored):
+                return passwords.VerifyResult(True, "new hash", "new salt")
+
+        async def update_password(username, new_password, new_salt):
+            raise ConnectionError("database gone")
+
+        async def scenario():
+            this_user = {"username": "user123", "salt": "salt", "password": "hash"}
+            self.assertTrue(await server_list.verify_password(this_user, "secret"))
+            self.assertEqual(len(server_list.rehash_tasks), 1)
+            with self.assertLogs(level="ERROR") as logs:
+                await asyncio.gather(*server_list.rehash_tasks, return_exceptions=True)
+                await asyncio.sleep(0)
+            self.assertIn("database gone", logs.output[0])
+            self.assertEqual(server_list.rehash_tasks, set())
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with patch.object(
+            server_list, "get_password_verifier", return_value=Verifier()
+        ), patch.object(server_list, "update_password", update_password):
+            loop.run_until_complete(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
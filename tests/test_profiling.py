@@ -0,0 +1,109 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+from wcps_auth import profiling
+
+
+class TestProfileHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_splits_busy_and_await_time(self):
+        async def handle():
+            time.sleep(0.02)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        result = self.loop.run_until_complete(
+            profiling.profile_handler("SplitHandler", handle())
+        )
+        self.assertEqual(result, "done")
+
+        busy = profiling.handler_busy_seconds.labels("SplitHandler")
+        waiting = profiling.handler_await_seconds.labels("SplitHandler")
+        self.assertEqual(busy.count, 1)
+        self.assertGreaterEqual(busy.sum, 0.02)
+        self.assertLess(busy.sum, 0.05)
+        self.assertGreaterEqual(waiting.sum, 0.04)
+
+    def test_exceptions_propagate(self):
+        async def handle():
+            await asyncio.sleep(0)
+            raise ValueError("bad packet")
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(
+                profiling.profile_handler("FailingHandler", handle())
+            )
+        busy = profiling.handler_busy_seconds.labels("FailingHandler")
+        self.assertEqual(busy.count, 1)
+
+    def test_cancellation_reaches_the_handler(self):
+        cancelled = []
+
+        async def handle():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def scenario():
+            task = asyncio.ensure_future(
+                profiling.profile_handler("SlowHandler", handle())
+            )
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.loop.run_until_complete(scenario())
+        self.assertEqual(cancelled, [True])
+
+
+class TestProfilingDumps(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = patch.object(profiling, "profile_dir", self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cpu_profile_window(self):
+        async def scenario():
+            self.assertTrue(profiling.start_cpu_profile(0.01))
+            self.assertFalse(profiling.start_cpu_profile(0.01))
+            self.assertTrue(profiling.handler_timing)
+            await asyncio.sleep(0.05)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(scenario())
+        finally:
+            loop.close()
+
+        self.assertFalse(profiling.handler_timing)
+        extensions = sorted(os.path.splitext(f)[1] for f in os.listdir(self.directory))
+        self.assertEqual(extensions, [".prof", ".txt"])
+
+    def test_tracemalloc_toggle(self):
+        self.assertIsNone(profiling.toggle_tracemalloc())
+        self.assertTrue(tracemalloc.is_tracing())
+        path = profiling.toggle_tracemalloc()
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
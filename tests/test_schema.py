@@ -0,0 +1,81 @@
+import unittest
+
+from wcps_auth.packets.schema import Field, InvalidPacket, PacketSchema
+
+ENTER_ID_ERROR = 74010
+NICKNAME_TOO_LONG = 74100
+ILLEGAL_NICKNAME = 74110
+SERVER_LIST = 0x1100
+
+
+class TestPacketSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.login = PacketSchema(
+            "LoginRequest",
+            None,
+            Field("username", min_length=3, alnum=True, error=ENTER_ID_ERROR),
+            Field("rights", int, min_value=1),
+            reply=SERVER_LIST,
+        )
+
+    def test_decodes_typed_record(self):
+        request = self.login.decode(["0", "user123", "3"])
+        self.assertEqual(request.username, "user123")
+        self.assertEqual(request.rights, 3)
+        self.assertEqual(type(request).__slots__, ("username", "rights"))
+        self.assertFalse(hasattr(request, "__dict__"))
+
+    def test_invalid_field_carries_its_error(self):
+        with self.assertRaises(InvalidPacket) as raised:
+            self.login.decode(["0", "us", "3"])
+        self.assertEqual(raised.exception.reply, SERVER_LIST)
+        self.assertEqual(raised.exception.error_code, ENTER_ID_ERROR)
+        self.assertTrue(raised.exception.disconnect)
+        self.assertIn("username", str(raised.exception))
+
+    def test_field_without_error_code_has_no_reply(self):
+        for rights in ("-1", "+3", "1_0", " 3", "x", "\u00b2", "0"):
+            with self.assertRaises(InvalidPacket) as raised:
+                self.login.decode(["0", "user123", rights])
+            self.assertIsNone(raised.exception.reply)
+
+    def test_missing_blocks(self):
+        with self.assertRaises(InvalidPacket) as raised:
+            self.login.decode(["0"])
+        self.assertEqual(raised.exception.error_code, ENTER_ID_ERROR)
+
+    def test_too_long_has_its_own_error(self):
+        schema = PacketSchema(
+            "NicknameRequest",
+            Field(
+                "nickname",
+                min_length=4,
+                max_length=16,
+                alnum=True,
+                error=ILLEGAL_NICKNAME,
+                too_long_error=NICKNAME_TOO_LONG,
+            ),
+            reply=SERVER_LIST,
+            disconnect=False,
+        )
+        for nickname, error_code in (
+            ("a" * 17, NICKNAME_TOO_LONG),
+            ("abc", ILLEGAL_NICKNAME),
+            ("nick name", ILLEGAL_NICKNAME),
+        ):
+            with self.assertRaises(InvalidPacket) as raised:
+                schema.decode([nickname])
+            self.assertEqual(raised.exception.error_code, error_code)
+            self.assertFalse(raised.exception.disconnect)
+
+    def test_choices(self):
+        schema = PacketSchema("TypeRequest", Field("kind", int, choices=(-1, 2)))
+        self.assertEqual(schema.decode(["2"]).kind, 2)
+        self.assertEqual(schema.decode(["-1"]).kind, -1)
+        with self.assertRaises(InvalidPacket):
+            schema.decode(["3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
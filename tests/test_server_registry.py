@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from wcps_auth import database
+from wcps_auth.server_registry import GameServerRegistry
+from wcps_auth.storage.memory import MemoryStorage
+
+
+class TestGameServerRegistry(unittest.TestCase):
+
+    def setUp(self):
+        GameServerRegistry._instance = None
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(setattr, database, "storage", database.storage)
+
+        self.storage = MemoryStorage()
+        self.wait(self.storage.add_server("1", "127.0.0.1", 5340))
+        self.wait(self.storage.add_server("2", "127.0.0.1", 5341, active=False))
+        self.wait(database.open_storage(self.storage))
+        self.registry = GameServerRegistry()
+
+    def tearDown(self):
+        GameServerRegistry._instance = None
+        self.loop.close()
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def run_refresh_loop(self, scenario):
+        async def run():
+            refresh_loop = asyncio.create_task(self.registry.run_refresh_loop(60))
+            try:
+                await scenario()
+            finally:
+                refresh_loop.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await refresh_loop
+
+        self.wait(run())
+
+    def test_lookup(self):
+        self.assertIsNone(self.registry.last_refresh)
+        self.wait(self.registry.refresh())
+        self.assertIsNotNone(self.registry.last_refresh)
+        self.assertIs(GameServerRegistry(), self.registry)
+
+        # Only active servers, matched on id, address and port
+        self.assertEqual(len(self.registry), 1)
+        self.assertTrue(self.registry.is_registered("1", "127.0.0.1", 5340))
+        self.assertFalse(self.registry.is_registered("1", "127.0.0.1", 5341))
+        self.assertFalse(self.registry.is_registered("1", "10.0.0.1", 5340))
+        self.assertFalse(self.registry.is_registered("3", "127.0.0.1", 5340))
+        self.assertFalse(self.registry.is_registered("2", "127.0.0.1", 5341))
+
+    def test_invalidate_reloads(self):
+        async def scenario():
+            self.registry.load([])
+            await self.storage.add_server("3", "127.0.0.1", 5343)
+            self.registry.invalidate()
+            # Well before the 60s refresh interval
+            await asyncio.sleep(0.01)
+            self.assertTrue(self.registry.is_registered("3", "127.0.0.1", 5343))
+
+        self.run_refresh_loop(scenario)
+
+    def test_failed_refresh_keeps_previous_list(self):
+        async def scenario():
+            await self.registry.refresh()
+            last_refresh = self.registry.last_refresh
+            with patch.object(
+                self.storage, "get_server_list", side_effect=ConnectionError("gone")
+            ), self.assertLogs(level="ERROR"):
+                self.registry.invalidate()
+                await asyncio.sleep(0.01)
+            self.assertTrue(self.registry.is_registered("1", "127.0.0.1", 5340))
+            self.assertEqual(self.registry.last_refresh, last_refresh)
+
+            # And recovers on the next refresh
+            await self.storage.add_server("3", "127.0.0.1", 5343)
+            self.registry.invalidate()
+            await asyncio.sleep(0.01)
+            self.assertTrue(self.registry.is_registered("3", "127.0.0.1", 5343))
+
+        self.run_refresh_loop(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from wcps_auth.session_store import (
+    RemoteSessionManager,
+    SessionStoreError,
+    SessionStoreServer,
+)
+from wcps_auth.sessions import SessionManager
+
+
+class MockUser:
+    def __init__(self, username, displayname="", rights=1):
+        self.username = username
+        self.displayname = displayname
+        self.rights = rights
+
+
+class MockServer:
+    def __init__(self, server_id):
+        self.id = server_id
+        self.name = f"server{server_id}"
+        self.address = "127.0.0.1"
+        self.port = 5340
+        self.current_players = 0
+        self.server_type = 0
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        SessionManager._instance = None
+        self.loop = asyncio.new_event_loop()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "sessions.sock")
+
+        self.coordinator = SessionManager()
+        self.store = SessionStoreServer(self.coordinator)
+        self.remote = RemoteSessionManager()
+        self.loop.run_until_complete(self.store.start(path))
+        self.loop.run_until_complete(self.remote.connect(path))
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.remote.close())
+        self.loop.run_until_complete(self.store.close())
+        self.loop.close()
+        SessionManager._instance = None
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_login_goes_through_the_coordinator(self):
+        session_id = self.wait(self.remote.replace_user_session(MockUser("user123")))
+        self.assertEqual(
+            self.wait(self.coordinator.get_user_session_id("user123")), session_id
+        )
+        self.assertTrue(self.wait(self.remote.is_user_authorized("user123")))
+
+        state = self.wait(self.remote.get_login_state("user123"))
+        self.assertTrue(state.is_authorized)
+        self.assertEqual(state.session_id, session_id)
+        self.assertFalse(state.is_activated)
+
+    def test_activated_session_is_not_replaced(self):
+        session_id = self.wait(self.remote.replace_user_session(MockUser("user123")))
+        self.wait(self.coordinator.activate_user_session(session_id, "server"))
+        self.assertIsNone(
+            self.wait(self.remote.replace_user_session(MockUser("user123")))
+        )
+
+    def test_set_user_displayname(self):
+        session_id = self.wait(self.remote.replace_user_session(MockUser("user123")))
+        self.assertTrue(
+            self.wait(self.remote.set_user_displayname("user123", session_id, "nick"))
+        )
+        user = self.wait(self.remote.get_user_by_session_id(session_id))
+        self.assertEqual(user.displayname, "nick")
+        self.assertEqual(user.session_id, session_id)
+        self.assertFalse(
+            self.wait(self.remote.set_user_displayname("user123", -5, "other"))
+        )
+
+    def test_errors_are_raised_in_the_worker(self):
+        with self.assertRaises(SessionStoreError):
+            self.wait(self.remote._call("no_such_method"))
+
+    def test_server_list_is_pushed(self):
+        self.assertEqual(self.remote.get_server_list_section(), "0")
+        self.wait(self.coordinator.authorize_server(MockServer("1")))
+
+        async def pushed():
+            version = self.coordinator.server_list_version
+            while self.remote.server_list_version != version:
+                await asyncio.sleep(0.001)
+
+        self.wait(asyncio.wait_for(pushed(), 1))
+        self.assertEqual(
+            self.remote.get_server_list_section(),
+            self.coordinator.get_server_list_section(),
+        )
+
+    def test_stalled_coordinator_times_out(self):
+        release = asyncio.Event()
+
+        async def stall(username):
+            await release.wait()
+            return True
+
+        self.store._methods["is_user_authorized"] = stall
+        self.remote.timeout = 0.05
+        with self.assertRaisesRegex(SessionStoreError, "timed out"):
+            self.wait(self.remote.is_user_authorized("user123"))
+        self.assertEqual(self.remote._pending, {})
+
+        # The late response is dropped, and the connection still works
+        release.set()
+        self.remote.timeout = 1
+        self.assertTrue(self.wait(self.remote.is_user_authorized("user123")))
+
+    def test_lost_connection_fails_calls(self):
+        self.wait(self.store.close())
+        self.wait(asyncio.wait_for(self.remote.wait_closed(), 1))
+        with self.assertRaises(ConnectionError):
+            self.wait(self.remote.is_user_authorized("user123"))
+
+
+if __name__ == "__main__":
+    unittest.main()
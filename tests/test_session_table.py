@@ -0,0 +1,93 @@
+import unittest
+
+from wcps_auth.session_table import (
+    MAX_USER_SESSIONS,
+    SessionIdAllocator,
+    SessionTable,
+)
+
+
+class MockUser:
+    def __init__(self, username):
+        self.username = username
+
+
+class TestSessionIdAllocator(unittest.TestCase):
+
+    def test_allocation_order_matches_rolling_counter(self):
+        allocator = SessionIdAllocator(8)
+        ids = [allocator.allocate() for _ in range(8)]
+        self.assertEqual(ids, [1, 2, 3, 4, 5, 6, 7, 0])
+
+    def test_exhaustion(self):
+        allocator = SessionIdAllocator(4)
+        for _ in range(4):
+            allocator.allocate()
+        self.assertEqual(len(allocator), 4)
+        with self.assertRaises(Exception):
+            allocator.allocate()
+
+    def test_released_ids_are_reused_last(self):
+        allocator = SessionIdAllocator(4)
+        first = allocator.allocate()
+        second = allocator.allocate()
+        allocator.release(first)
+        self.assertFalse(allocator.is_allocated(first))
+        self.assertTrue(allocator.is_allocated(second))
+
+        ids = [allocator.allocate() for _ in range(3)]
+        self.assertEqual(ids[-1], first)
+        self.assertEqual(len(allocator), 4)
+
+    def test_double_release(self):
+        allocator = SessionIdAllocator(4)
+        session_id = allocator.allocate()
+        allocator.release(session_id)
+        with self.assertRaises(ValueError):
+            allocator.release(session_id)
+
+    def test_full_space(self):
+        allocator = SessionIdAllocator()
+        ids = {allocator.allocate() for _ in range(MAX_USER_SESSIONS)}
+        self.assertEqual(ids, set(range(MAX_USER_SESSIONS)))
+
+
+class TestSessionTable(unittest.TestCase):
+
+    def test_add_get_remove(self):
+        table = SessionTable()
+        user = MockUser("user123")
+        session = table.add(user)
+        self.assertIs(table.get(session.session_id), session)
+        self.assertIs(table.get_by_username("user123"), session)
+        self.assertIn("user123", table)
+        self.assertEqual(len(table), 1)
+
+        self.assertIs(table.remove("user123"), session)
+        self.assertIsNone(table.get(session.session_id))
+        self.assertIsNone(table.remove("user123"))
+        self.assertEqual(len(table), 0)
+
+    def test_get_out_of_range(self):
+        table = SessionTable()
+        self.assertIsNone(table.get(-1))
+        self.assertIsNone(table.get(MAX_USER_SESSIONS))
+        self.assertIsNone(table.get(None))
+
+    def test_remove_game_server(self):
+        table = SessionTable()
+        sessions = [table.add(MockUser(f"user{i}")) for i in range(6)]
+        for session in sessions[:4]:
+            table.bind(session, "server-a")
+        table.bind(sessions[4], "server-b")
+
+        removed = table.remove_game_server("server-a")
+        self.assertEqual(len(removed), 4)
+        self.assertEqual(len(table), 2)
+        for session in sessions[:4]:
+            self.assertIsNone(table.get(session.session_id))
+        self.assertEqual(table.users_on_game_server("server-b"), {"user4"})
+
+
+if __name__ == "__main__":
+    unittest.main()
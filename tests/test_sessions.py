@@ -1,6 +1,6 @@
 import unittest
 import asyncio
-from wcps_auth.sessions import SessionManager
+from wcps_auth.sessions import ActivationResult, SessionManager
 
 # Adjust the import path
 import sys
@@ -95,6 +95,245 @@ class TestSessionManager(unittest.TestCase):
         authorized_servers = self.session_manager.get_all_authorized_servers()
         self.assertEqual(len(authorized_servers), len(servers))
 
+    def _assert_indexes_consistent(self):
+        table = self.session_manager._user_sessions
+        by_username = table._by_username
+        by_server = table._by_game_server
+
+        self.assertEqual(len(table._allocator), len(by_username))
+        for username, session in by_username.items():
+            self.assertIs(table.get(session.session_id), session)
+            if session.game_server is not None:
+                self.assertIn(username, by_server[session.game_server])
+
+        for game_server, usernames in by_server.items():
+            self.assertTrue(usernames)
+            for username in usernames:
+                self.assertEqual(by_username[username].game_server, game_server)
+
+    def test_get_user_by_session_id(self):
+        user = MockUser("user123")
+        session_id = self.loop.run_until_complete(
+            self.session_manager.authorize_user(user)
+        )
+        self.assertIs(
+            self.loop.run_until_complete(
+                self.session_manager.get_user_by_session_id(session_id)
+            ),
+            user,
+        )
+        self.assertIsNone(
+            self.loop.run_until_complete(
+                self.session_manager.get_user_by_session_id(session_id + 1)
+            )
+        )
+        self._assert_indexes_consistent()
+
+    def test_activate_user_session(self):
+        user = MockUser("user123")
+        session_id = self.loop.run_until_complete(
+            self.session_manager.authorize_user(user)
+        )
+        self.assertFalse(
+            self.loop.run_until_complete(
+                self.session_manager.is_user_session_activated(session_id)
+            )
+        )
+        self.assertTrue(
+            self.loop.run_until_complete(
+                self.session_manager.activate_user_session(session_id, "server-a")
+            )
+        )
+        self.assertTrue(
+            self.loop.run_until_complete(
+                self.session_manager.is_user_session_activated(session_id)
+            )
+        )
+        self._assert_indexes_consistent()
+
+        # Moving to another game server rebinds the user
+        self.loop.run_until_complete(
+            self.session_manager.activate_user_session(session_id, "server-b")
+        )
+        self.assertNotIn(
+            "server-a", self.session_manager._user_sessions._by_game_server
+        )
+        self._assert_indexes_consistent()
+
+        self.assertFalse(
+            self.loop.run_until_complete(
+                self.session_manager.activate_user_session(session_id + 1, "server-a")
+            )
+        )
+
+    def test_indexes_after_unauthorize_user(self):
+        users = [MockUser(f"user{i}") for i in range(10)]
+        for user in users:
+            session_id = self.loop.run_until_complete(
+                self.session_manager.authorize_user(user)
+            )
+            self.loop.run_until_complete(
+                self.session_manager.activate_user_session(session_id, "server-a")
+            )
+
+        for user in users[:5]:
+            self.loop.run_until_complete(
+                self.session_manager.unauthorize_user(user.username)
+            )
+        self._assert_indexes_consistent()
+        self.assertEqual(
+            len(self.session_manager._user_sessions.users_on_game_server("server-a")),
+            5,
+        )
+
+        for user in users[5:]:
+            self.loop.run_until_complete(
+                self.session_manager.unauthorize_user(user.username)
+            )
+        self._assert_indexes_consistent()
+        self.assertEqual(len(self.session_manager._user_sessions), 0)
+        self.assertEqual(self.session_manager._user_sessions._by_game_server, {})
+
+    def test_unauthorize_server_removes_bound_users(self):
+        server = MockServer(123)
+        server_session_id = self.loop.run_until_complete(
+            self.session_manager.authorize_server(server)
+        )
+        bound = [MockUser(f"bound{i}") for i in range(3)]
+        unbound = MockUser("unbound")
+        for user in bound:
+            session_id = self.loop.run_until_complete(
+                self.session_manager.authorize_user(user)
+            )
+            self.loop.run_until_complete(
+                self.session_manager.activate_user_session(
+                    session_id, server_session_id
+                )
+            )
+        self.loop.run_until_complete(self.session_manager.authorize_user(unbound))
+
+        self.loop.run_until_complete(self.session_manager.unauthorize_server(server.id))
+
+        for user in bound:
+            self.assertFalse(
+                self.loop.run_until_complete(
+                    self.session_manager.is_user_authorized(user.username)
+                )
+            )
+        self.assertTrue(
+            self.loop.run_until_complete(
+                self.session_manager.is_user_authorized(unbound.username)
+            )
+        )
+        self._assert_indexes_consistent()
+
+    def test_unauthorize_unknown_server(self):
+        # Must not raise for a server that was never authorized
+        self.loop.run_until_complete(self.session_manager.unauthorize_server(999))
+
+    def test_get_login_state(self):
+        state = self.loop.run_until_complete(
+            self.session_manager.get_login_state("user123")
+        )
+        self.assertFalse(state.is_authorized)
+        self.assertIsNone(state.session_id)
+
+        user = MockUser("user123")
+        session_id = self.loop.run_until_complete(
+            self.session_manager.authorize_user(user)
+        )
+        state = self.loop.run_until_complete(
+            self.session_manager.get_login_state("user123")
+        )
+        self.assertTrue(state.is_authorized)
+        self.assertEqual(state.session_id, session_id)
+        self.assertFalse(state.is_activated)
+
+    def test_replace_user_session(self):
+        first = MockUser("user123")
+        first_id = self.loop.run_until_complete(
+            self.session_manager.replace_user_session(first)
+        )
+        # An inactive session is replaced by the new login
+        second = MockUser("user123")
+        second_id = self.loop.run_until_complete(
+            self.session_manager.replace_user_session(second)
+        )
+        self.assertNotEqual(first_id, second_id)
+        self.assertIs(
+            self.loop.run_until_complete(
+                self.session_manager.get_user_by_session_id(second_id)
+            ),
+            second,
+        )
+        self._assert_indexes_consistent()
+
+        # An activated session is kept
+        self.loop.run_until_complete(
+            self.session_manager.activate_user_session(second_id, "server-a")
+        )
+        self.assertIsNone(
+            self.loop.run_until_complete(
+                self.session_manager.replace_user_session(MockUser("user123"))
+            )
+        )
+        self._assert_indexes_consistent()
+
+    def test_check_and_activate_user_session(self):
+        user = MockUser("user123")
+        session_id = self.loop.run_until_complete(
+            self.session_manager.authorize_user(user)
+        )
+
+        def check(username, reported_id, end_connection=False):
+            return self.loop.run_until_complete(
+                self.session_manager.check_and_activate_user_session(
+                    username, reported_id, "server-a", end_connection
+                )
+            )
+
+        self.assertEqual(check("nobody", session_id), ActivationResult.NOT_FOUND)
+        self.assertEqual(
+            check("user123", session_id + 1), ActivationResult.SESSION_MISMATCH
+        )
+        self.assertEqual(check("user123", session_id), ActivationResult.ACTIVATED)
+        self.assertEqual(
+            check("user123", session_id), ActivationResult.ALREADY_ACTIVATED
+        )
+        self.assertEqual(
+            self.session_manager._user_sessions.users_on_game_server("server-a"),
+            {"user123"},
+        )
+        self.assertEqual(
+            check("user123", session_id, end_connection=True), ActivationResult.ENDED
+        )
+        self.assertFalse(
+            self.loop.run_until_complete(
+                self.session_manager.is_user_authorized("user123")
+            )
+        )
+        self._assert_indexes_consistent()
+
+    def test_server_list_section(self):
+        self.assertEqual(self.session_manager.get_server_list_section(), "0")
+
+        server = MockServer("1")
+        server.name, server.address, server.port = "test server", "127.0.0.1", 5340
+        server.current_players, server.server_type = 0, 1
+        self.loop.run_until_complete(self.session_manager.authorize_server(server))
+        section = self.session_manager.get_server_list_section()
+        self.assertEqual(section, "1 1 test\x1dserver 127.0.0.1 5340 0 1")
+        # Cached until the servers change
+        self.assertIs(self.session_manager.get_server_list_section(), section)
+
+        server.current_players = 10
+        self.session_manager.mark_servers_changed()
+        section = self.session_manager.get_server_list_section()
+        self.assertEqual(section.split(" ")[5], "10")
+
+        self.loop.run_until_complete(self.session_manager.unauthorize_server("1"))
+        self.assertEqual(self.session_manager.get_server_list_section(), "0")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import unittest
+
+from wcps_auth.singleflight import KeyedLocks, SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_concurrent_calls_share_result(self):
+        calls = []
+
+        async def fetch(username):
+            calls.append(username)
+            await asyncio.sleep(0.01)
+            return {"username": username}
+
+        async def scenario():
+            flight = SingleFlight()
+            results = await asyncio.gather(
+                *(flight.do("user123", fetch, "user123") for _ in range(5)),
+                flight.do("user456", fetch, "user456"),
+            )
+            self.assertEqual(flight.coalesced, 4)
+            self.assertEqual(len(flight), 0)
+            return results
+
+        results = self.loop.run_until_complete(scenario())
+        self.assertEqual(calls, ["user123", "user456"])
+        self.assertTrue(all(r is results[0] for r in results[:5]))
+
+    def test_sequential_calls_are_not_shared(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+
+        async def scenario():
+            flight = SingleFlight()
+            await flight.do("user123", fetch)
+            await flight.do("user123", fetch)
+
+        self.loop.run_until_complete(scenario())
+        self.assertEqual(len(calls), 2)
+
+    def test_exceptions_are_shared(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("no database")
+
+        async def scenario():
+            flight = SingleFlight()
+            return await asyncio.gather(
+                flight.do("user123", fail),
+                flight.do("user123", fail),
+                return_exceptions=True,
+            )
+
+        results = self.loop.run_until_complete(scenario())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def scenario():
+            flight = SingleFlight()
+            first = asyncio.ensure_future(flight.do("user123", fetch))
+            second = asyncio.ensure_future(flight.do("user123", fetch))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            return await second
+
+        self.assertEqual(self.loop.run_until_complete(scenario()), "done")
+
+
+class TestKeyedLocks(unittest.TestCase):
+
+    def test_serializes_per_key(self):
+        log = []
+
+        async def critical(locks, key, name):
+            async with locks.hold(key):
+                log.append(("enter", name))
+                await asyncio.sleep(0.01)
+                log.append(("exit", name))
+
+        async def scenario():
+            locks = KeyedLocks()
+            await asyncio.gather(
+                critical(locks, "user123", "a"),
+                critical(locks, "user123", "b"),
+            )
+            self.assertEqual(len(locks), 0)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(scenario())
+        finally:
+            loop.close()
+        self.assertEqual(
+            log, [("enter", "a"), ("exit", "a"), ("enter", "b"), ("exit", "b")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
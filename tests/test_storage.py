@@ -0,0 +1,107 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from wcps_auth.storage.memory import MemoryStorage
+from wcps_auth.storage.sqlite import SQLiteStorage
+
+
+class StorageBackendTests:
+    """Behaviour every backend must share, run against each one below"""
+
+    def create_storage(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.storage = self.create_storage()
+        self.wait(self.storage.connect())
+        self.wait(self.storage.add_user("user123", "hash", "salt"))
+        self.wait(self.storage.add_user("user456", "hash", "salt", "taken"))
+        self.wait(self.storage.add_server("1", "127.0.0.1", 5340))
+        self.wait(self.storage.add_server("2", "127.0.0.1", 5341, active=False))
+
+    def tearDown(self):
+        self.wait(self.storage.close())
+        self.loop.close()
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_get_server_list(self):
+        self.assertEqual(
+            self.wait(self.storage.get_server_list()), [("1", "127.0.0.1", 5340)]
+        )
+
+    def test_fetch_user_details(self):
+        this_user = self.wait(self.storage.fetch_user_details("user123"))
+        self.assertEqual(this_user["username"], "user123")
+        self.assertEqual(this_user["displayname"], "")
+        self.assertEqual(this_user["password"], "hash")
+        self.assertEqual(this_user["salt"], "salt")
+        self.assertEqual(this_user["rights"], 1)
+        self.assertIsNone(self.wait(self.storage.fetch_user_details("nobody")))
+
+    def test_displayname_exists(self):
+        self.assertTrue(self.wait(self.storage.displayname_exists("taken")))
+        self.assertFalse(self.wait(self.storage.displayname_exists("free")))
+
+    def test_claim_displayname(self):
+        self.assertFalse(self.wait(self.storage.claim_displayname("user123", "taken")))
+        self.assertTrue(self.wait(self.storage.claim_displayname("user123", "free")))
+        self.assertEqual(
+            self.wait(self.storage.fetch_user_details("user123"))["displayname"],
+            "free",
+        )
+        self.assertFalse(self.wait(self.storage.claim_displayname("user456", "free")))
+
+    def test_concurrent_claims_have_one_winner(self):
+        async def claim_both():
+            return await asyncio.gather(
+                self.storage.claim_displayname("user123", "contested"),
+                self.storage.claim_displayname("user456", "contested"),
+            )
+
+        self.assertEqual(sorted(self.wait(claim_both())), [False, True])
+        owners = [
+            username
+            for username in ("user123", "user456")
+            if self.wait(self.storage.fetch_user_details(username))["displayname"]
+            == "contested"
+        ]
+        self.assertEqual(len(owners), 1)
+
+    def test_reclaim_own_displayname(self):
+        self.assertTrue(self.wait(self.storage.claim_displayname("user456", "taken")))
+        self.assertEqual(
+            self.wait(self.storage.fetch_user_details("user456"))["displayname"],
+            "taken",
+        )
+        self.assertFalse(self.wait(self.storage.claim_displayname("nobody", "free")))
+
+    def test_update_password(self):
+        self.wait(self.storage.update_password("user123", "new_hash", "new_salt"))
+        this_user = self.wait(self.storage.fetch_user_details("user123"))
+        self.assertEqual(this_user["password"], "new_hash")
+        self.assertEqual(this_user["salt"], "new_salt")
+
+
+class TestMemoryStorage(StorageBackendTests, unittest.TestCase):
+
+    def create_storage(self):
+        return MemoryStorage()
+
+
+class TestSQLiteStorage(StorageBackendTests, unittest.TestCase):
+
+    def create_storage(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        path = os.path.join(directory, "auth.sqlite3")
+        self.addCleanup(os.remove, path)
+        return SQLiteStorage(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+
+from wcps_auth.transport import ProtocolWriter, create_protocol_server
+
+
+class MockAdmission:
+    def __init__(self):
+        self.released = []
+
+    def admit(self, ip):
+        return True
+
+    def release(self, ip):
+        self.released.append(ip)
+
+
+class MockEntity:
+    handshake_timeout = None
+    idle_timeout = None
+    instances = []
+
+    def __init__(self, reader, writer):
+        self.writer = writer
+        self.received = bytearray()
+        self.disconnects = 0
+        self.awaiting_handshake = True
+        self.listen_task = asyncio.get_running_loop().create_future()
+        MockEntity.instances.append(self)
+
+    def feed(self, data) -> bool:
+        self.received += data
+        self.awaiting_handshake = False
+        self.writer.write(bytes(data).upper())
+        return b"drop" not in self.received
+
+    async def disconnect(self):
+        self.disconnects += 1
+        self.writer.close()
+
+
+class TestEntityProtocol(unittest.TestCase):
+
+    def setUp(self):
+        MockEntity.instances = []
+        MockEntity.handshake_timeout = None
+        self.admission = MockAdmission()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_client(self, client):
+        async def serve():
+            server = await create_protocol_server(
+                MockEntity, self.admission, "127.0.0.1", 0, 1024
+            )
+            port = server.sockets[0].getsockname()[1]
+            try:
+                result = await client(port)
+                await asyncio.wait_for(MockEntity.instances[0].listen_task, 1)
+                return result
+            finally:
+                server.close()
+
+        return self.loop.run_until_complete(serve())
+
+    def test_entity_is_fed_and_writes_back(self):
+        async def client(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"hello")
+            reply = await reader.readexactly(5)
+            writer.close()
+            return reply
+
+        self.assertEqual(self.run_client(client), b"HELLO")
+        entity = MockEntity.instances[0]
+        self.assertEqual(entity.received, b"hello")
+        self.assertEqual(entity.disconnects, 1)
+        self.assertEqual(self.admission.released, ["127.0.0.1"])
+
+    def test_entity_can_drop_the_connection(self):
+        async def client(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"drop")
+            data = await reader.read()
+            writer.close()
+            return data
+
+        self.assertEqual(self.run_client(client), b"DROP")
+        self.assertEqual(MockEntity.instances[0].disconnects, 1)
+
+    def test_handshake_timeout(self):
+        MockEntity.handshake_timeout = 0.05
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            data = await asyncio.wait_for(reader.read(), 1)
+            writer.close()
+            return data
+
+        self.assertEqual(self.run_client(client), b"")
+        self.assertEqual(MockEntity.instances[0].disconnects, 1)
+
+
+class TestProtocolWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_drain_waits_while_paused(self):
+        async def drain():
+            writer = ProtocolWriter(transport=None)
+            await writer.drain()
+
+            writer.pause_writing()
+            waiter = asyncio.create_task(writer.drain())
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            writer.resume_writing()
+            await asyncio.wait_for(waiter, 1)
+
+            writer.connection_lost(None)
+            with self.assertRaises(ConnectionResetError):
+                await writer.drain()
+
+        self.loop.run_until_complete(drain())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from wcps_auth.config import settings
+from wcps_auth.session_store import SessionStoreServer
+from wcps_auth.sessions import SessionManager
+from wcps_auth.workers import restart_dead_workers, start_worker, stop_coordinator
+
+# Read by the spawned worker, which loads the settings again
+WORKER_ENVIRONMENT = {
+    "STORAGE_BACKEND": "memory",
+    "METRICS_ENABLED": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+@unittest.skipUnless(hasattr(socket, "SO_REUSEPORT"), "needs SO_REUSEPORT")
+class TestWorkers(unittest.TestCase):
+
+    def setUp(self):
+        SessionManager._instance = None
+        self.loop = asyncio.new_event_loop()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "sessions.sock")
+
+    def tearDown(self):
+        self.loop.close()
+        SessionManager._instance = None
+
+    async def wait_for_workers(self, store, count: int):
+        # Workers connect once spawned and imported, which takes a while
+        async with asyncio.timeout(30):
+            while len(store._writers) != count:
+                await asyncio.sleep(0.05)
+
+    def test_dead_worker_is_restarted(self):
+        async def scenario():
+            store = SessionStoreServer()
+            await store.start(self.path)
+            workers = []
+            try:
+                with patch.dict(os.environ, WORKER_ENVIRONMENT):
+                    workers.append(start_worker(settings(), 1, store.path))
+                    await self.wait_for_workers(store, 1)
+                    restarted = restart_dead_workers(settings(), store, workers)
+                    self.assertEqual(restarted, 0)
+
+                    first = workers[0]
+                    first.kill()
+                    await asyncio.to_thread(first.join, 5)
+                    await self.wait_for_workers(store, 0)
+
+                    with self.assertLogs(level="ERROR"):
+                        restarted = restart_dead_workers(settings(), store, workers)
+                    self.assertEqual(restarted, 1)
+                    self.assertIsNot(workers[0], first)
+                    await self.wait_for_workers(store, 1)
+                    self.assertTrue(workers[0].is_alive())
+            finally:
+                await stop_coordinator(store, workers)
+
+        self.loop.run_until_complete(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import collections
+import time
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+class AdmissionController:
+    """
+    Decides whether a new connection is accepted, before any entity is built
+    for it. Enforces a global connection cap, a per-IP concurrent connection
+    cap and a per-IP token bucket on the accept rate. A None limit disables
+    that check.
+    """
+
+    # Most IPs with a token bucket. Past it the least recently seen IP loses
+    # its bucket, and starts again from a full burst if it comes back
+    MAX_TRACKED_IPS = 10000
+
+    def __init__(
+        self,
+        max_connections: int = None,
+        max_per_ip: int = None,
+        accept_rate: float = None,
+        accept_burst: int = 1,
+        clock=time.monotonic,
+    ):
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.accept_rate = accept_rate
+        self.accept_burst = accept_burst
+        self._clock = clock
+
+        self.active = 0
+        self._active_by_ip = {}
+        # Least recently seen first
+        self._buckets = collections.OrderedDict()
+        self.accepted = 0
+        self.rejected = {"max_connections": 0, "max_per_ip": 0, "accept_rate": 0}
+
+    def admit(self, ip: str) -> bool:
+        if self.max_connections is not None and self.active >= self.max_connections:
+            self.rejected["max_connections"] += 1
+            return False
+
+        active_for_ip = self._active_by_ip.get(ip, 0)
+        if self.max_per_ip is not None and active_for_ip >= self.max_per_ip:
+            self.rejected["max_per_ip"] += 1
+            return False
+
+        if self.accept_rate is not None and not self._take_token(ip):
+            self.rejected["accept_rate"] += 1
+            return False
+
+        self.active += 1
+        self._active_by_ip[ip] = active_for_ip + 1
+        self.accepted += 1
+        return True
+
+    def release(self, ip: str) -> None:
+        active_for_ip = self._active_by_ip.get(ip)
+        if active_for_ip is None:
+            return
+
+        self.active -= 1
+        if active_for_ip > 1:
+            self._active_by_ip[ip] = active_for_ip - 1
+        else:
+            del self._active_by_ip[ip]
+
+    def _take_token(self, ip: str) -> bool:
+        now = self._clock()
+        buckets = self._buckets
+        bucket = buckets.get(ip)
+        if bucket is None:
+            self._expire(now)
+            if len(buckets) >= self.MAX_TRACKED_IPS:
+                buckets.popitem(last=False)
+            bucket = buckets[ip] = TokenBucket(self.accept_burst, now)
+        else:
+            buckets.move_to_end(ip)
+            bucket.tokens = min(
+                self.accept_burst,
+                bucket.tokens + (now - bucket.updated) * self.accept_rate,
+            )
+            bucket.updated = now
+
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        return True
+
+    def _expire(self, now: float) -> None:
+        # A bucket that would have refilled completely carries no state. The
+        # least recently seen come first, so only those are looked at
+        refill_time = self.accept_burst / self.accept_rate
+        buckets = self._buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest.updated < refill_time:
+                break
+            buckets.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+        }
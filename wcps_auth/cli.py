@@ -1,6 +1,7 @@
 import argparse
-import asyncio
+from wcps_auth.config import settings
 from wcps_auth.main import main
+from wcps_auth.transport import run as run_loop
 from wcps_auth import __version__
 
 
@@ -11,10 +12,34 @@ def run():
         "--version", action="version", version=f"%(prog)s {__version__}"
     )
 
-    parser.parse_args()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="client worker processes (overrides WORKERS, Linux only above 1)",
+    )
+
+    parser.add_argument(
+        "--network-layer",
+        choices=("streams", "protocol"),
+        help="overrides NETWORK_LAYER",
+    )
+
+    parser.add_argument(
+        "--event-loop",
+        choices=("asyncio", "uvloop"),
+        help="overrides EVENT_LOOP, uvloop has to be installed",
+    )
+
+    args = parser.parse_args()
+    if args.workers is not None:
+        settings().workers = args.workers
+    if args.network_layer is not None:
+        settings().network_layer = args.network_layer
+    if args.event_loop is not None:
+        settings().event_loop = args.event_loop
 
     # Run the asyncio main function
-    asyncio.run(main())
+    run_loop(main(), settings().event_loop)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Buffers from this size up are XORed with NumPy when it is installed
+NUMPY_THRESHOLD = 1 << 16
+
+
+class XorCodec:
+    """
+    Single byte XOR used by the client and internal protocols.
+
+    XOR with a fixed key is a byte substitution, so a precomputed 256 byte
+    table lets bytes.translate do the work in C. Encoding and decoding are the
+    same operation.
+    """
+
+    __slots__ = ("key", "_table", "_use_numpy")
+
+    def __init__(self, key: int, use_numpy: bool = True):
+        self.key = key
+        self._table = bytes(i ^ key for i in range(256))
+        self._use_numpy = use_numpy and numpy is not None
+
+    def decode(self, data) -> bytes:
+        if self._use_numpy and len(data) >= NUMPY_THRESHOLD:
+            array = numpy.frombuffer(data, dtype=numpy.uint8)
+            return numpy.bitwise_xor(array, self.key).tobytes()
+
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return data.translate(self._table)
+
+    encode = decode
+
+
+_codecs = {}
+
+
+def get_codec(key: int) -> XorCodec:
+    # There are only a handful of keys, share one codec per key
+    codec = _codecs.get(key)
+    if codec is None:
+        codec = _codecs[key] = XorCodec(key)
+    return codec
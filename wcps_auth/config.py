@@ -1,20 +1,121 @@
+import functools
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
 
+    # Storage backend: mysql, sqlite or memory. The database_* settings
+    # apply to mysql, sqlite_path to sqlite
+    storage_backend: str = "mysql"
+    sqlite_path: str = "wcps_auth.sqlite3"
+    # Accounts and game servers created in the memory backend for
+    # wcps-auth-bench, see storage/memory.py
+    memory_seed_users: int = 0
+    memory_seed_servers: int = 0
+
     # Database
     database_ip: str = "127.0.0.1"
     database_name: str = "auth_test"
     database_user: str = "root"
     database_password: str = "root"
     database_port: int = 3306
+    # Connections opened at startup and upper bound of the pool
+    database_pool_minsize: int = 5
+    database_pool_maxsize: int = 20
+    # Seconds before a connection is recycled. -1 never recycles
+    database_pool_recycle: int = 3600
+    database_connect_timeout: int = 10
+
+    # User record cache, in front of the users table. TTLs in seconds
+    user_cache_size: int = 10000
+    user_cache_ttl: int = 30
+    user_cache_negative_ttl: int = 5
+
+    # Passwords. Hashes in other schemes are upgraded to password_scheme
+    # (sha256, pbkdf2_sha256 or scrypt) on login. The KDF schemes need a
+    # password column wider than the 64 chars of a sha256 hex digest, hashes
+    # that would not fit are not stored
+    password_scheme: str = "sha256"
+    password_executor: str = "thread"  # or "process"
+    password_workers: int = 4
+    password_queue_depth: int = 256
+    pbkdf2_iterations: int = 600000
+    scrypt_n: int = 16384
+    scrypt_r: int = 8
+    scrypt_p: int = 1
 
     # Networking
     server_ip: str = "127.0.0.1"
+    # Bytes requested per socket read and largest packet accepted, in bytes
+    read_chunk_size: int = 16384
+    max_frame_size: int = 8192
+    # Sends only wait for the socket once this many bytes are buffered
+    send_high_water: int = 65536
+    # Handlers running and packets waiting per connection. Packets are
+    # handled in order; a connection overflowing its queue is dropped
+    dispatch_max_in_flight: int = 1
+    dispatch_max_queued: int = 64
+
+    # Admission control. Rejected connections are closed before any
+    # processing. Accept rate is in connections per second per IP
+    max_client_connections: int = 4096
+    max_connections_per_ip: int = 16
+    accept_rate_per_ip: float = 5.0
+    accept_burst_per_ip: int = 10
+    max_internal_connections: int = 64
+    # Timeouts in seconds
+    handshake_timeout: float = 10.0
+    user_idle_timeout: float = 120.0
+    game_server_idle_timeout: float = 300.0
+    # Read buffer bound per connection, in bytes
+    stream_buffer_limit: int = 65536
+    # "streams" (asyncio.start_server) or "protocol" (asyncio.BufferedProtocol,
+    # see transport.py). The event loop may be "asyncio" or "uvloop", which
+    # has to be installed
+    network_layer: str = "streams"
+    event_loop: str = "asyncio"
+
+    # Client worker processes. Above 1, this process keeps the sessions and
+    # game server connections and the workers accept clients through
+    # SO_REUSEPORT (Linux only), see workers.py. The session store socket
+    # defaults to a file in the temporary directory. Workers give up on a
+    # session store call after session_store_timeout seconds
+    workers: int = 1
+    session_store_path: str = ""
+    session_store_timeout: float = 5.0
+
+    # Seconds between reloads of the registered game server list
+    server_registry_refresh_interval: int = 60
+
+    # Logging. Records are formatted and written by a background thread
+    log_level: str = "INFO"
+    # Packet dumps: 1 in packet_dump_every packet buffers, decoded, is kept
+    # in a ring of the last packet_dump_ring_size (served on the metrics
+    # listener at /packets) and, with packet_dump_log, written to the
+    # wcps_auth.packets logger. 0 turns dumps off
+    packet_dump_every: int = 0
+    packet_dump_ring_size: int = 1000
+    packet_dump_log: bool = False
+
+    # Prometheus metrics at http://metrics_host:metrics_port/metrics
+    metrics_enabled: bool = False
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9108
+
+    # Profiling, see profiling.py. handler_profiling splits handler time
+    # into running and awaiting. SIGUSR1 profiles for profile_window
+    # seconds, SIGUSR2 toggles tracemalloc. Output goes to profile_dir
+    handler_profiling: bool = False
+    profile_window: float = 30.0
+    profile_dir: str = "profiles"
+    tracemalloc_frames: int = 10
 
     class Config:
         env_file = ".env"
 
 
-settings = Settings
+@functools.lru_cache(maxsize=None)
+def settings() -> Settings:
+    # Read the environment and .env once, every caller shares the instance
+    return Settings()
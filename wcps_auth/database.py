@@ -1,93 +1,124 @@
-import asyncio
-import aiomysql
+import logging
 
+from wcps_auth import metrics
+from wcps_auth.cache import MISSING, TTLCache
 from wcps_auth.config import settings
-
-pool = None
-
-
-async def create_pool():
-    global pool
-    pool = await aiomysql.create_pool(
-        host=settings().database_ip,
-        port=settings().database_port,
-        user=settings().database_user,
-        password=settings().database_password,
-        db=settings().database_name,
-        loop=asyncio.get_event_loop(),
-    )
-    return pool
-
-
-async def run_pool():
-    await create_pool()
-
-
-def generate_servers_addresses(query_results: list) -> list:
-    server_list = []
-    for candidate_server in query_results:
-        # Each result is a tuple of 4 fields
-        server_id, addr, port, active = candidate_server
-        server_list.append((server_id, addr, port))
-
-    return server_list
-
-
+from wcps_auth.singleflight import SingleFlight
+from wcps_auth.storage import StorageBackend, create_storage
+
+# Backend chosen by settings().storage_backend, set up by open_storage
+storage: StorageBackend = None
+
+# Repeat logins are served from here. Unknown usernames are cached too, for
+# a shorter time, and bans take effect at most user_cache_ttl seconds late
+user_cache = TTLCache(
+    max_size=settings().user_cache_size,
+    ttl=settings().user_cache_ttl,
+    negative_ttl=settings().user_cache_negative_ttl,
+)
+user_fetches = SingleFlight()
+
+metrics.registry.callback(
+    "wcps_user_cache_lookups_total",
+    "User cache lookups",
+    ("result",),
+    lambda: [
+        (("hit",), user_cache.hits),
+        (("miss",), user_cache.misses),
+    ],
+    kind="counter",
+)
+metrics.registry.callback(
+    "wcps_user_cache_removals_total",
+    "User records dropped from the cache before being invalidated",
+    ("reason",),
+    lambda: [
+        (("evicted",), user_cache.evictions),
+        (("expired",), user_cache.expirations),
+    ],
+    kind="counter",
+)
+
+
+async def open_storage(backend: StorageBackend = None) -> StorageBackend:
+    global storage
+    storage = backend if backend is not None else create_storage(settings())
+    await storage.connect()
+    return storage
+
+
+def log_storage_stats():
+    storage.log_stats()
+
+
+@metrics.timed(metrics.db_seconds, metrics.db_errors)
 async def get_server_list() -> list:
-    async with pool.acquire() as connection:
-        async with connection.cursor() as cur:
-            await cur.execute("SELECT * FROM servers WHERE active = 1")
-            results = await cur.fetchall()
-            server_list = generate_servers_addresses(results)
-            return server_list
+    return await storage.get_server_list()
 
 
+# Not timed: hits never reach storage, and load_user_details times misses
 async def get_user_details(user_id: str) -> dict:
-    async with pool.acquire() as connection:
-        await connection.select_db(settings().database_name)
-        async with connection.cursor() as cur:
-            query = "SELECT * FROM users WHERE username = %s"
-            await cur.execute(query, (user_id,))
-            user_details = await cur.fetchall()
-            # By default a tuple is recieved
-            if user_details:
-                user_details = user_details[0]
-                if len(user_details) == 6:
-                    this_user = {
-                        "id": int(user_details[0]),
-                        "username": user_details[1],
-                        "displayname": user_details[2],
-                        "password": user_details[3],
-                        "salt": user_details[4],
-                        "rights": int(user_details[5]),
-                    }
-                    return this_user
-                else:
-                    # TODO: Improper db format
-                    print("Improper database schema")
-                    return None
-            else:
-                return None
+    this_user = user_cache.get(user_id)
+    if isinstance(this_user, str):
+        # Typed differently from the stored username, see load_user_details
+        this_user = user_cache.get(this_user)
+    if this_user is MISSING:
+        # Concurrent logins for the same user share a single query
+        this_user = await user_fetches.do(user_id, load_user_details, user_id)
+    return this_user
+
+
+@metrics.timed(metrics.db_seconds, metrics.db_errors)
+async def load_user_details(user_id: str) -> dict:
+    this_user = await storage.fetch_user_details(user_id)
+    if this_user is not None and this_user["username"] != user_id:
+        # A case-insensitive collation matched another spelling. The record
+        # is cached under the stored username, which the updates invalidate,
+        # and user_id only points to it
+        user_cache.put(this_user["username"], this_user)
+        user_cache.put(user_id, this_user["username"])
+    else:
+        user_cache.put(user_id, this_user)
+    return this_user
+
+
+@metrics.timed(metrics.db_seconds, metrics.db_errors)
+async def displayname_exists(displayname):
+    return await storage.displayname_exists(displayname)
 
 
-async def displayname_exists(displayname):
-    async with pool.acquire() as connection:
-        await connection.select_db(settings().database_name)
-        async with connection.cursor() as cur:
-            await cur.execute(
-                "SELECT COUNT(*) FROM users WHERE displayname=%s",
-                (displayname,)
-            )
-            (count,) = await cur.fetchone()
-            return count > 0
+@metrics.timed(metrics.db_seconds, metrics.db_errors)
+async def claim_displayname(username, new_displayname) -> bool:
+    """
+    Set username's displayname unless another user already has it, in a
+    single round-trip. Returns whether the name was claimed.
+    """
+    claimed = await storage.claim_displayname(username, new_displayname)
+    user_cache.invalidate(username)
+    return claimed
 
 
+@metrics.timed(metrics.db_seconds, metrics.db_errors)
 async def update_displayname(username, new_displayname):
-    async with pool.acquire() as connection:
-        await connection.select_db(settings().database_name)
-        async with connection.cursor() as cur:
-            # Update the displayname securely using a parameterized query
-            query = "UPDATE users SET displayname=%s WHERE username=%s"
-            await cur.execute(query, (new_displayname, username))
-            await connection.commit()
-            return True
+    updated = await storage.update_displayname(username, new_displayname)
+    user_cache.invalidate(username)
+    return updated
+
+
+@metrics.timed(metrics.db_seconds, metrics.db_errors)
+async def update_password(username, new_password, new_salt):
+    max_length = storage.password_max_length
+    if max_length is not None and len(new_password) > max_length:
+        # Stored truncated, the account could never log in again
+        logging.warning(
+            "Not storing a %d char password hash for %s, the password column "
+            "holds %d. Widen it to use this password_scheme",
+            len(new_password),
+            username,
+            max_length,
+        )
+        return False
+
+    updated = await storage.update_password(username, new_password, new_salt)
+    user_cache.invalidate(username)
+    return updated
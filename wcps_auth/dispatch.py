@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import logging
+import time
+
+from wcps_auth import metrics, profiling
+
+
+class DispatchQueueFull(Exception):
+    """Raised when a connection has more packets waiting than it is allowed"""
+
+
+# Totals across every connection
+dispatch_stats = {
+    "queued": 0,
+    "in_flight": 0,
+    "dispatched": 0,
+    "overflows": 0,
+    "max_queue_depth": 0,
+}
+
+
+class PacketDispatcher:
+    """
+    Per-connection handler queue.
+
+    Packets are handled in arrival order by at most max_in_flight tasks, and
+    at most max_queued packets may wait behind them. With max_in_flight = 1,
+    a handler only starts once the previous one for the connection finished.
+    on_idle is called whenever a worker runs out of packets to handle.
+    """
+
+    __slots__ = (
+        "max_in_flight",
+        "max_queued",
+        "on_idle",
+        "_queue",
+        "_workers",
+        "max_depth",
+    )
+
+    def __init__(self, max_in_flight: int = 1, max_queued: int = 64, on_idle=None):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.on_idle = on_idle
+        self._queue = collections.deque()
+        self._workers = set()
+        # Deepest this connection's queue has been
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._workers)
+
+    def submit(self, handler, packet) -> None:
+        if len(self._queue) >= self.max_queued:
+            dispatch_stats["overflows"] += 1
+            raise DispatchQueueFull(f"{len(self._queue)} packets already queued")
+
+        self._queue.append((handler, packet))
+        dispatch_stats["queued"] += 1
+
+        depth = len(self._queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+            if depth > dispatch_stats["max_queue_depth"]:
+                dispatch_stats["max_queue_depth"] = depth
+
+        if len(self._workers) < self.max_in_flight:
+            worker = asyncio.create_task(self._work())
+            self._workers.add(worker)
+            # Also for a worker cancelled before it started
+            worker.add_done_callback(self._workers.discard)
+
+    def clear(self) -> None:
+        # Drop waiting packets. Running handlers are left to finish, since a
+        # handler may be the one disconnecting the connection
+        dispatch_stats["queued"] -= len(self._queue)
+        self._queue.clear()
+
+    async def _work(self) -> None:
+        dispatch_stats["in_flight"] += 1
+        try:
+            while self._queue:
+                handler, packet = self._queue.popleft()
+                dispatch_stats["queued"] -= 1
+                dispatch_stats["dispatched"] += 1
+                handler_name = type(handler).__name__
+                start = time.perf_counter()
+                try:
+                    if profiling.handler_timing:
+                        await profiling.profile_handler(
+                            handler_name, handler.handle(packet)
+                        )
+                    else:
+                        await handler.handle(packet)
+                except Exception as e:
+                    metrics.handler_errors.labels(handler_name).inc()
+                    logging.exception(
+                        "Error handling packet %s: %s", packet.packet_id, e
+                    )
+                metrics.handler_seconds.labels(handler_name).observe(
+                    time.perf_counter() - start
+                )
+            if self.on_idle is not None:
+                self.on_idle()
+        finally:
+            # Not in a done callback: that only runs on a later iteration, and
+            # a packet submitted before it would find no worker to take it
+            self._workers.discard(asyncio.current_task())
+            dispatch_stats["in_flight"] -= 1
+
+
+metrics.registry.callback(
+    "wcps_dispatch_queued",
+    "Packets waiting for a handler",
+    (),
+    lambda: [((), dispatch_stats["queued"])],
+)
+metrics.registry.callback(
+    "wcps_dispatch_in_flight",
+    "Handlers running",
+    (),
+    lambda: [((), dispatch_stats["in_flight"])],
+)
+metrics.registry.callback(
+    "wcps_dispatch_overflows_total",
+    "Connections dropped for overflowing their queue",
+    (),
+    lambda: [((), dispatch_stats["overflows"])],
+    kind="counter",
+)
@@ -1,10 +1,67 @@
 import asyncio
 import logging
+import weakref
 
-from wcps_core.packets import PacketBuffer, Connection
+from wcps_core.packets import Connection
+
+from wcps_auth import metrics
+from wcps_auth.codec import get_codec
+from wcps_auth.config import settings
+from wcps_auth.dispatch import DispatchQueueFull, PacketDispatcher
+from wcps_auth.framing import FrameTooLarge, PacketFramer
+from wcps_auth.log import packet_dumps
+from wcps_auth.packets.in_packet import parse_packets
+from wcps_auth.packets.schema import InvalidPacket
+
+READ_CHUNK_SIZE = settings().read_chunk_size
+MAX_FRAME_SIZE = settings().max_frame_size
+MAX_IN_FLIGHT = settings().dispatch_max_in_flight
+MAX_QUEUED = settings().dispatch_max_queued
+SEND_HIGH_WATER = settings().send_high_water
+
+# Entities with packets queued during the current iteration of each event
+# loop. One callback per loop flushes them all, instead of one per connection
+pending_flushes = weakref.WeakKeyDictionary()
+
+
+def flush_pending(loop):
+    for entity in pending_flushes.pop(loop, ()):
+        entity._flush_scheduled = False
+        try:
+            entity._flush()
+        except Exception as e:
+            # A broken transport must not hold back the other connections
+            logging.exception("Error flushing packets to %s: %s", entity.peername, e)
+
+
+class Rejection:
+    """
+    Queued in place of a packet that failed its handler's schema, so that
+    the handler answers it in order with the packets around it, against the
+    state of the connection at that point
+    """
+
+    __slots__ = ("handler", "error")
+
+    def __init__(self, handler, error: InvalidPacket):
+        self.handler = handler
+        self.error = error
+
+    async def handle(self, packet) -> None:
+        receptor = packet.receptor
+        logging.warning("Rejected packet from %s: %s", receptor.peername, self.error)
+        if not self.handler.reject(receptor, packet, self.error):
+            await receptor.disconnect()
 
 
 class BaseNetworkEntity:
+    # Seconds allowed before the first packet and between reads afterwards.
+    # None waits forever
+    handshake_timeout = None
+    idle_timeout = None
+    # Label of the packet and byte counters
+    listener_name = "unknown"
+
     def __init__(
         self,
         reader: asyncio.StreamReader,
@@ -18,50 +75,172 @@ class BaseNetworkEntity:
         self.xor_key_receive = xor_key_receive
         self.authorized = False
         self.session_id = -1
+        self.peername = writer.get_extra_info("peername")
+        self._framer = PacketFramer(xor_key_receive, MAX_FRAME_SIZE)
+        self._codec = get_codec(xor_key_receive)
+        self._send_codec = get_codec(xor_key_send)
+        # Replies of the packets handled back to back go out in one write
+        self._dispatcher = PacketDispatcher(
+            MAX_IN_FLIGHT, MAX_QUEUED, on_idle=self._flush
+        )
+        self._packets_in = metrics.packets_in.labels(self.listener_name)
+        self._packets_out = metrics.packets_out.labels(self.listener_name)
+        self._packets_unhandled = metrics.packets_unhandled.labels(self.listener_name)
+        self._bytes_in = metrics.bytes_in.labels(self.listener_name)
+        self._bytes_out = metrics.bytes_out.labels(self.listener_name)
+        self._send_flushes = metrics.send_flushes.labels(self.listener_name)
+        self._send_drains = metrics.send_drains.labels(self.listener_name)
+
+        # Until a first packet arrives the handshake timeout applies
+        self.awaiting_handshake = True
+
+        # Text of the packets sent but not written yet. Flushed when the
+        # dispatcher runs out of packets, and otherwise at the end of the loop
+        # iteration
+        self._loop = asyncio.get_running_loop()
+        self._outbox = []
+        self._outbox_bytes = 0
+        self._flush_scheduled = False
 
+        # wcps_core builds the greeting already encoded, the outbox holds text
         self._connection = Connection(xor_key=self.xor_key_send).build()
-        asyncio.create_task(self.send(self._connection))
-        asyncio.create_task(self.listen())
+        self.send_nowait(self._send_codec.decode(self._connection))
+        if reader is not None:
+            self.listen_task = asyncio.create_task(self.listen())
+        else:
+            # The protocol layer feeds the entity and resolves this once it
+            # has disconnected, see transport.py
+            self.listen_task = asyncio.get_running_loop().create_future()
 
     async def listen(self):
+        loop = asyncio.get_running_loop()
+        handshake_deadline = None
+        if self.handshake_timeout is not None:
+            handshake_deadline = loop.time() + self.handshake_timeout
+
         while True:
-            data = await self.reader.read(1024)
-            if not data:
+            deadline = handshake_deadline if self.awaiting_handshake else None
+            if deadline is None and self.idle_timeout is not None:
+                deadline = loop.time() + self.idle_timeout
+
+            try:
+                async with asyncio.timeout_at(deadline):
+                    data = await self.reader.read(READ_CHUNK_SIZE)
+            except TimeoutError:
+                logging.info("Closing idle connection")
                 await self.disconnect()
                 break
+            except ConnectionError as e:
+                # Reset by the peer, or found broken by send()
+                logging.info("Connection lost: %s", e)
+                data = None
 
-            try:
-                incoming_packets = PacketBuffer(
-                    buffer=data, receptor=self, xor_key=self.xor_key_receive
-                )
-                if incoming_packets.decoded_buffer:
-                    logging.info(f"BUFFER IN:: {incoming_packets.decoded_buffer}")
-
-                    for packet in incoming_packets.packet_stack:
-                        handler = self.get_handler_for_packet(packet.packet_id)
-                        if handler:
-                            asyncio.create_task(handler.handle(packet))
-                        else:
-                            logging.error(
-                                f"Unknown handler for packet {packet.packet_id}"
-                            )
-                else:
-                    logging.error(f"Cannot decrypt packet buffer {incoming_packets}")
-                    await self.disconnect()
-            except Exception as e:
-                logging.exception(f"Error processing packet: {e}")
+            if not data or not self.feed(data):
                 await self.disconnect()
                 break
 
+    def feed(self, data) -> bool:
+        """
+        Frame, decode and dispatch bytes read from the peer. Returns False
+        when the connection has to be dropped.
+        """
+        self._bytes_in.inc(len(data))
+        try:
+            # TCP may split or coalesce packets: only handle whole ones
+            complete_packets = self._framer.feed(data)
+            if complete_packets is None:
+                return True
+
+            self.awaiting_handshake = False
+            decoded_buffer = self._codec.decode(complete_packets)
+            if packet_dumps.enabled:
+                packet_dumps.record("in", self.peername, decoded_buffer)
+
+            for packet in parse_packets(decoded_buffer, self):
+                self._packets_in.inc()
+                handler = self.get_handler_for_packet(packet.packet_id)
+                if not handler:
+                    # Unknown here, or meant for the other listener. Counted
+                    # rather than logged, a peer could send these endlessly
+                    self._packets_unhandled.inc()
+                    logging.debug("No handler for packet %s", packet.packet_id)
+                    continue
+
+                # Malformed packets never reach a handler's process()
+                try:
+                    packet.request = handler.schema.decode(packet.blocks)
+                except InvalidPacket as e:
+                    self._dispatcher.submit(Rejection(handler, e), packet)
+                    continue
+
+                self._dispatcher.submit(handler, packet)
+        except (FrameTooLarge, DispatchQueueFull) as e:
+            logging.error("Dropping connection: %s", e)
+            return False
+        except Exception as e:
+            logging.exception("Error processing packet: %s", e)
+            return False
+        return True
+
+    def send_nowait(self, buffer):
+        """
+        Queue a packet, as text from OutgoingPacket.build(), without waiting
+        for the socket. Queued packets are encoded and written together once
+        the handlers of the connection are idle, or at the end of the loop
+        iteration, and disconnect() writes them first.
+        """
+        if self.writer.is_closing():
+            return
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            pending = pending_flushes.get(self._loop)
+            if pending is None:
+                pending = pending_flushes[self._loop] = []
+                self._loop.call_soon(flush_pending, self._loop)
+            pending.append(self)
+        self._outbox.append(buffer)
+        self._outbox_bytes += len(buffer)
+        self._packets_out.inc()
+        self._bytes_out.inc(len(buffer))
+        if packet_dumps.enabled:
+            packet_dumps.record("out", self.peername, buffer)
+
+    def _flush(self):
+        if not self._outbox:
+            return
+        # XOR is per byte, so the whole outbox is encoded in one translate
+        data = self._send_codec.encode(b"".join(self._outbox))
+        self._outbox.clear()
+        self._outbox_bytes = 0
+        if not self.writer.is_closing():
+            self.writer.write(data)
+            self._send_flushes.inc()
+
     async def send(self, buffer):
+        """
+        Queue a packet, and only wait for the socket when the peer is not
+        keeping up with what is already buffered for it
+        """
+        self.send_nowait(buffer)
+        buffered = self.writer.transport.get_write_buffer_size() + self._outbox_bytes
+        if buffered < SEND_HIGH_WATER:
+            return
+
+        self._send_drains.inc()
+        self._flush()
         try:
-            self.writer.write(buffer)
             await self.writer.drain()
-        except Exception as e:
-            logging.exception(f"Error sending packet: {e}")
-            await self.disconnect()
+        except ConnectionError as e:
+            # Not disconnected from here, in the middle of a handler. Closing
+            # the writer marks the connection broken, so nothing more is
+            # queued, and listen() or the protocol disconnects it as for any
+            # lost connection
+            logging.info("Error sending packet: %s", e)
+            self.writer.close()
 
     async def disconnect(self):
+        self._dispatcher.clear()
+        self._flush()
         self.writer.close()
 
     def get_handler_for_packet(self, packet_id: int):
@@ -0,0 +1,66 @@
+# Every packet ends with a newline, XORed like the rest of the packet
+PACKET_TERMINATOR = 0x0A
+
+
+class FrameTooLarge(Exception):
+    """Raised when a peer sends more than max_frame_size bytes without a terminator"""
+
+
+class PacketFramer:
+    """
+    Incremental reassembly of a TCP stream into whole packets.
+
+    Bytes are appended to a per-connection buffer and only complete packets
+    are handed out. Consumed bytes are dropped lazily, once they make up half
+    of the buffer, so each byte is copied out at most once in the common case.
+    """
+
+    __slots__ = ("_terminator", "_buffer", "_start", "_scanned", "max_frame_size")
+
+    def __init__(self, xor_key: int, max_frame_size: int = 8192):
+        self._terminator = PACKET_TERMINATOR ^ xor_key
+        self._buffer = bytearray()
+        # Start of the first incomplete packet
+        self._start = 0
+        # Everything before this offset is known not to hold a terminator
+        self._scanned = 0
+        self.max_frame_size = max_frame_size
+
+    def __len__(self) -> int:
+        # Bytes waiting for the rest of their packet
+        return len(self._buffer) - self._start
+
+    def feed(self, data) -> bytes:
+        """
+        Add data read from the socket. Returns every packet completed by it as
+        one contiguous (still encoded) buffer, or None if no packet completed.
+        """
+        buffer = self._buffer
+        buffer += data
+
+        start = self._start
+        frames_end = start
+        position = self._scanned
+        while True:
+            end = buffer.find(self._terminator, position)
+            if end == -1:
+                break
+            if end + 1 - frames_end > self.max_frame_size:
+                raise FrameTooLarge(f"Packet of {end + 1 - frames_end} bytes")
+            frames_end = position = end + 1
+
+        if len(buffer) - frames_end > self.max_frame_size:
+            raise FrameTooLarge(f"Partial packet of {len(buffer) - frames_end} bytes")
+
+        frames = bytes(buffer[start:frames_end]) if frames_end > start else None
+
+        if frames_end == len(buffer):
+            buffer.clear()
+            frames_end = 0
+        elif frames_end > len(buffer) >> 1:
+            del buffer[:frames_end]
+            frames_end = 0
+
+        self._start = frames_end
+        self._scanned = len(buffer)
+        return frames
@@ -1 +1 @@
-from .handler_factory import get_handler_for_packet
+from .handler_factory import CLIENT_DISPATCH, INTERNAL_DISPATCH, get_handler_for_packet
@@ -1,27 +1,41 @@
 import abc
 import logging
 
-from wcps_core.packets import InPacket
-
 from wcps_auth.entities import BaseNetworkEntity
+from wcps_auth.packets.in_packet import IncomingPacket
+from wcps_auth.packets.packet_factory import PacketFactory
+from wcps_auth.packets.schema import InvalidPacket, PacketRecord, PacketSchema
 
 
 class PacketHandler(abc.ABC):
-    def __init__(self):
-        self.in_packet = None
+    # Blocks read by process, decoded and validated before it is called.
+    # Packets without blocks to read keep the empty schema
+    schema = PacketSchema("EmptyRequest")
 
-    async def handle(self, packet_to_handle: InPacket) -> None:
-        self.in_packet = packet_to_handle
+    async def handle(self, packet_to_handle: IncomingPacket) -> None:
         receptor = packet_to_handle.receptor
 
         if isinstance(receptor, BaseNetworkEntity):
-            await self.process(receptor)
+            await self.process(receptor, packet_to_handle.request)
         else:
             logging.error("No receptor for this packet!")
 
+    def reject(self, receptor, packet: IncomingPacket, error: InvalidPacket) -> bool:
+        """
+        Answer a packet that does not match the schema. Runs in the
+        connection's queue in place of the packet, see entities.Rejection, so
+        it sees the state process() would have. Returns whether the
+        connection stays open.
+
+        By default the schema decides: the reply packet with the field's error
+        code, if any, then disconnect. Handlers that ignore or drop packets
+        from unauthorized receptors override this to do the same.
+        """
+        if error.reply is not None:
+            reply = PacketFactory.create_packet(error.reply, error.error_code)
+            receptor.send_nowait(reply.build())
+        return not error.disconnect
+
     @abc.abstractmethod
-    async def process(self, user_or_server):
+    async def process(self, user_or_server, request: PacketRecord):
         pass
-
-    def get_block(self, block_id: int) -> str:
-        return self.in_packet.blocks[block_id]
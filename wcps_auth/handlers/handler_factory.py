@@ -1,5 +1,3 @@
-import logging
-
 from wcps_auth.packets.packet_list import PacketList
 
 from .base import PacketHandler
@@ -10,21 +8,38 @@ from .internal_server_auth import GameServerAuthHandler
 from .internal_server_status import GameServerStatusHandler
 from .internal_client_auth import InternalClientAuthRequestHandler
 
-# Dictionary to map packet IDs to handler classes
-HANDLER_MAP = {
-    PacketList.LAUNCHER: LauncherHandler,
-    PacketList.SERVER_LIST: ServerListHandler,
-    PacketList.SETNICKNAME: SetNickNameHandler,
-    PacketList.INTERNALGAMEAUTHENTICATION: GameServerAuthHandler,
-    PacketList.INTERNALGAMESTATUS: GameServerStatusHandler,
-    PacketList.INTERNALPLAYERAUTHENTICATION: InternalClientAuthRequestHandler,
+# Handlers keep no state between packets, so one instance per packet ID is
+# shared by every connection. Each listener only accepts its own packets: a
+# game client cannot send INTERNALGAMEAUTHENTICATION, nor a game server
+# client packets
+CLIENT_HANDLERS = {
+    PacketList.LAUNCHER: LauncherHandler(),
+    PacketList.SERVER_LIST: ServerListHandler(),
+    PacketList.SETNICKNAME: SetNickNameHandler(),
+}
+INTERNAL_HANDLERS = {
+    PacketList.INTERNALGAMEAUTHENTICATION: GameServerAuthHandler(),
+    PacketList.INTERNALGAMESTATUS: GameServerStatusHandler(),
+    PacketList.INTERNALPLAYERAUTHENTICATION: InternalClientAuthRequestHandler(),
 }
+HANDLER_MAP = {**CLIENT_HANDLERS, **INTERNAL_HANDLERS}
+
+
+def build_dispatch_table(handlers: dict) -> tuple:
+    """Handlers indexed directly by packet ID, None for the IDs without one"""
+    table = [None] * (max(handlers) + 1)
+    for packet_id, handler in handlers.items():
+        table[packet_id] = handler
+    return tuple(table)
+
+
+CLIENT_DISPATCH = build_dispatch_table(CLIENT_HANDLERS)
+INTERNAL_DISPATCH = build_dispatch_table(INTERNAL_HANDLERS)
+DISPATCH = build_dispatch_table(HANDLER_MAP)
 
 
-def get_handler_for_packet(packet_id: int) -> PacketHandler:
-    handler_class = HANDLER_MAP.get(packet_id)
-    if handler_class:
-        return handler_class()
-    else:
-        logging.info(f"Unknown packet ID {packet_id}")
-        return None
+def get_handler_for_packet(packet_id: int, table: tuple = DISPATCH) -> PacketHandler:
+    # Packet IDs come from the peer: negative ones must not index from the end
+    if 0 <= packet_id < len(table):
+        return table[packet_id]
+    return None
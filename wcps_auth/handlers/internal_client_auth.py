@@ -3,50 +3,67 @@ import logging
 from wcps_core.constants import ErrorCodes
 
 from wcps_auth.handlers.base import PacketHandler
-from wcps_auth.sessions import SessionManager
+from wcps_auth.sessions import ActivationResult, SessionManager
 from wcps_auth.packets.packet_factory import PacketFactory
 from wcps_auth.packets.packet_list import PacketList
+from wcps_auth.packets.schema import Field, PacketSchema
 
 
 class InternalClientAuthRequestHandler(PacketHandler):
-    async def process(self, server) -> None:
-        if server.authorized:
-            error_code = int(self.get_block(0))
-            reported_session_id = int(self.get_block(1))
-            reported_username = self.get_block(2)
-            reported_rights = int(self.get_block(3))
+    # The game server holds the player until it gets an answer, so a
+    # malformed report is refused rather than dropped, see reject()
+    schema = PacketSchema(
+        "ClientAuthRequest",
+        Field("error_code", int),
+        Field("session_id", int),
+        Field("username"),
+        Field("rights", int),
+        disconnect=False,
+    )
 
-            session_manager = SessionManager()
-            has_login_session = await session_manager.is_user_authorized(
-                reported_username
+    def reject(self, server, packet, error) -> bool:
+        if not server.authorized:
+            logging.info(
+                "Unauthorized client authorization request from %s", server.address
             )
-            error_to_report = ErrorCodes.INVALID_KEY_SESSION
+            return False
 
-            if not has_login_session:
-                error_to_report = ErrorCodes.INVALID_KEY_SESSION
+        # Echo what the game server reported, as far as it sent it, so it can
+        # tell which player was refused
+        reported = packet.blocks[1:4]
+        reported += [""] * (3 - len(reported))
+        reply = PacketFactory.create_packet(
+            PacketList.INTERNALPLAYERAUTHENTICATION,
+            ErrorCodes.INVALID_SESSION_MATCH,
+            reported_session=reported[0],
+            reported_user=reported[1],
+            reported_rights=reported[2],
+        )
+        server.send_nowait(reply.build())
+        return True
 
-            stored_session_id = await session_manager.get_user_session_id(
-                reported_username
-            )
-            is_activated_session = await session_manager.is_user_session_activated(
-                stored_session_id
-            )
+    async def process(self, server, request) -> None:
+        if server.authorized:
+            error_code = request.error_code
+            reported_session_id = request.session_id
+            reported_username = request.username
+            reported_rights = request.rights
 
-            if reported_session_id == stored_session_id:
-                if is_activated_session:
-                    # check if the server wants us to unauthorize the user
-                    if error_code == ErrorCodes.END_CONNECTION:
-                        await session_manager.unauthorize_user(reported_username)
-                        return
+            session_manager = SessionManager()
+            result = await session_manager.check_and_activate_user_session(
+                username=reported_username,
+                session_id=reported_session_id,
+                game_server_id=server.session_id,
+                # the server wants us to unauthorize the user
+                end_connection=error_code == ErrorCodes.END_CONNECTION,
+            )
 
-                    error_to_report = ErrorCodes.ALREADY_AUTHORIZED
-                else:
-                    error_to_report = ErrorCodes.SUCCESS
-                    # Activate the sesssion
-                    await session_manager.activate_user_session(
-                        session_id=stored_session_id,
-                        game_server_id=server.session_id
-                        )
+            if result == ActivationResult.ENDED:
+                return
+            elif result == ActivationResult.ACTIVATED:
+                error_to_report = ErrorCodes.SUCCESS
+            elif result == ActivationResult.ALREADY_ACTIVATED:
+                error_to_report = ErrorCodes.ALREADY_AUTHORIZED
             else:
                 error_to_report = ErrorCodes.INVALID_SESSION_MATCH
 
@@ -62,6 +79,6 @@ class InternalClientAuthRequestHandler(PacketHandler):
             await server.send(packet.build())
         else:
             logging.info(
-                f"Unauthorized client authorization request from {server.address}"
+                "Unauthorized client authorization request from %s", server.address
             )
-            server.disconnect()
+            await server.disconnect()
@@ -4,97 +4,89 @@ from wcps_core.constants import ErrorCodes, ServerTypes
 
 from wcps_auth.packets.packet_factory import PacketFactory
 from wcps_auth.packets.packet_list import PacketList
+from wcps_auth.packets.schema import Field, PacketSchema
 
 from wcps_auth.handlers.base import PacketHandler
-from wcps_auth.database import get_server_list
+from wcps_auth.server_registry import GameServerRegistry
 from wcps_auth.sessions import SessionManager
 
 
 class GameServerAuthHandler(PacketHandler):
-    async def process(self, server) -> None:
-
-        error_code = int(self.get_block(0))
-
-        if error_code != ErrorCodes.SUCCESS:
+    schema = PacketSchema(
+        "GameServerAuthRequest",
+        Field("error_code", int),
+        Field(
+            "server_id", min_length=1, alnum=True, error=ErrorCodes.SERVER_ERROR_OTHER
+        ),
+        Field(
+            "server_name", min_length=3, alnum=True, error=ErrorCodes.SERVER_ERROR_OTHER
+        ),
+        Field("server_addr"),
+        Field("server_port", int, min_value=0, error=ErrorCodes.SERVER_ERROR_OTHER),
+        Field(
+            "server_type",
+            int,
+            choices=(
+                ServerTypes.ENTIRE,
+                ServerTypes.ADULT,
+                ServerTypes.CLAN,
+                ServerTypes.TEST,
+                ServerTypes.DEVELOPMENT,
+                ServerTypes.TRAINEE,
+            ),
+            error=ErrorCodes.INVALID_SERVER_TYPE,
+        ),
+        Field("current_players", int, min_value=0, error=ErrorCodes.SERVER_ERROR_OTHER),
+        Field("max_players", int, min_value=0, error=ErrorCodes.SERVER_ERROR_OTHER),
+        reply=PacketList.INTERNALGAMEAUTHENTICATION,
+    )
+
+    def reject(self, server, packet, error) -> bool:
+        # Same order as process(): only a packet reporting SUCCESS is read,
+        # and a full auth server refuses before the other fields matter
+        error_code = packet.blocks[0] if packet.blocks else None
+        if error_code != str(int(ErrorCodes.SUCCESS)):
+            return True
+        if self.refuse_if_full(server):
+            return True
+        return super().reject(server, packet, error)
+
+    def refuse_if_full(self, server) -> bool:
+        servers_registered = len(SessionManager().get_all_authorized_servers())
+        if servers_registered < 31:
+            return False
+
+        logging.error("Maximum limit of servers reached. Rejecting...")
+        packet = PacketFactory.create_packet(
+            PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.SERVER_LIMIT_REACHED
+        )
+        server.send_nowait(packet.build())
+        return True
+
+    async def process(self, server, request) -> None:
+
+        if request.error_code != ErrorCodes.SUCCESS:
             return
 
         # Check if the auth server is already full before anything else
-        session_manager = SessionManager()
-
-        servers_registered = len(session_manager.get_all_authorized_servers())
-
-        if servers_registered >= 31:
-            logging.error("Maximum limit of servers reached. Rejecting...")
-            packet = PacketFactory.create_packet(
-                PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.SERVER_LIMIT_REACHED
-            )
-            await server.send(packet.build())
-            return
-
-        server_id = self.get_block(1)
-        server_name = self.get_block(2)
-        server_addr = self.get_block(3)
-        server_port = int(self.get_block(4))
-        server_type = self.get_block(5)
-        current_players = self.get_block(6)
-        max_players = self.get_block(7)
-
-        if len(server_name) < 3 or not server_name.isalnum():
-            logging.error(f"Invalid server name for ID {server_id} at {server_addr}")
-            packet = PacketFactory.create_packet(
-                PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.SERVER_ERROR_OTHER
-            )
-            await server.send(packet.build())
-            await server.disconnect()
+        if self.refuse_if_full(server):
             return
 
-        if not server_id or not server_id.isalnum():
-            packet = PacketFactory.create_packet(
-                PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.SERVER_ERROR_OTHER
-            )
-            await server.send(packet.build())
-            logging.error(f"Invalid server ID {server_id}")
-            await server.disconnect()
-            return
-
-        if not current_players.isdigit() or not max_players.isdigit():
-            packet = PacketFactory.create_packet(
-                PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.SERVER_ERROR_OTHER
-            )
-            await server.send(packet.build())
-            logging.error(f"Invalid value/s reported ¨{current_players}/{max_players}")
-            await server.disconnect()
-            return
-
-        valid_servers = [
-            ServerTypes.ENTIRE,
-            ServerTypes.ADULT,
-            ServerTypes.CLAN,
-            ServerTypes.TEST,
-            ServerTypes.DEVELOPMENT,
-            ServerTypes.TRAINEE,
-        ]
-
-        if not (server_type.isdigit() and int(server_type) in valid_servers):
-            logging.error(f"Invalid server type: {server_type}")
-            packet = PacketFactory.create_packet(
-                PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.INVALID_SERVER_TYPE
-            )
-            await server.send(packet.build())
-            await server.disconnect()
-            return
+        session_manager = SessionManager()
+        server_id = request.server_id
+        server_addr = request.server_addr
+        server_port = request.server_port
 
-        # get list of servers registered in the DB
-        # server list format is [(id,ip,addr)]
-        # TODO: Potential DDoS here... generate a list that only updates each X?
+        # Check against the servers registered in the DB. The registry is
+        # refreshed in the background so this never hits the database
         # TODO: check against max. number of authorized servers
-        all_active_servers = await get_server_list()
-        if not (server_id, server_addr, server_port) in all_active_servers:
-            logging.error(f"Unregistered server: {server_addr}:{server_port}")
+        registry = GameServerRegistry()
+        if not registry.is_registered(server_id, server_addr, server_port):
+            logging.error("Unregistered server: %s:%s", server_addr, server_port)
             packet = PacketFactory.create_packet(
                 PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.INVALID_SESSION_MATCH
             )
-            await server.send(packet.build())
+            server.send_nowait(packet.build())
             await server.disconnect()
             return
 
@@ -104,8 +96,8 @@ class GameServerAuthHandler(PacketHandler):
             packet = PacketFactory.create_packet(
                 PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.ALREADY_AUTHORIZED
             )
-            await server.send(packet.build())
-            logging.info(f"Server {server_addr} already registered")
+            server.send_nowait(packet.build())
+            logging.info("Server %s already registered", server_addr)
             await server.disconnect()
 
         else:
@@ -113,16 +105,19 @@ class GameServerAuthHandler(PacketHandler):
             server.address = server_addr
             server.port = server_port
             await server.authorize(
-                server_name=server_name,
+                server_name=request.server_name,
                 server_id=server_id,
-                server_type=int(server_type),
-                current_players=int(current_players),
-                max_players=int(max_players),
+                server_type=request.server_type,
+                current_players=request.current_players,
+                max_players=request.max_players,
             )
             packet = PacketFactory.create_packet(
                 PacketList.INTERNALGAMEAUTHENTICATION, ErrorCodes.SUCCESS, server
             )
             await server.send(packet.build())
             logging.info(
-                f"Server {server.address}:{server.port} authenticated as {server.session_id}"
+                "Server %s:%s authenticated as %s",
+                server.address,
+                server.port,
+                server.session_id,
             )
@@ -1,18 +1,35 @@
 import logging
 from wcps_auth.handlers.base import PacketHandler
+from wcps_auth.packets.schema import Field, PacketSchema
+from wcps_auth.sessions import SessionManager
 
 
 class GameServerStatusHandler(PacketHandler):
-    async def process(self, server) -> None:
+    # A malformed report is dropped, the next one will do
+    schema = PacketSchema(
+        "GameServerStatusRequest",
+        None,
+        Field("server_time"),
+        Field("server_id"),
+        Field("current_players", int, min_value=0),
+        Field("current_rooms", int, min_value=0),
+        disconnect=False,
+    )
+
+    def reject(self, server, packet, error) -> bool:
+        if not server.authorized:
+            logging.info("Ping from unauthorized server ignored")
+            return False
+        return super().reject(server, packet, error)
+
+    async def process(self, server, request) -> None:
         # Check if the server is authorized
         if server.authorized:
-            server_time = self.get_block(1)
-            server_id = self.get_block(2)
-            current_players = self.get_block(3)
-            current_rooms = self.get_block(4)
-
             # TODO: Update more data
-            server.current_players = int(current_players)
+            current_players = request.current_players
+            if current_players != server.current_players:
+                server.current_players = current_players
+                SessionManager().mark_servers_changed()
         else:
-            logging.info(f"Ping from unauthorized server ignored")
+            logging.info("Ping from unauthorized server ignored")
             await server.disconnect()
@@ -4,6 +4,6 @@ from wcps_auth.packets.packet_list import PacketList
 
 
 class LauncherHandler(PacketHandler):
-    async def process(self, receptor) -> None:
+    async def process(self, receptor, request) -> None:
         packet = PacketFactory.create_packet(PacketList.LAUNCHER)
         await receptor.send(packet.build())
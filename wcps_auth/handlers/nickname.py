@@ -1,33 +1,50 @@
 from wcps_core.constants import ErrorCodes as corerr
 
-from wcps_auth.database import displayname_exists, update_displayname
+from wcps_auth.database import claim_displayname
 from wcps_auth.error_codes import ServerListError
 from wcps_auth.handlers.base import PacketHandler
 from wcps_auth.packets.packet_list import PacketList
 from wcps_auth.packets.packet_factory import PacketFactory
+from wcps_auth.packets.schema import Field, PacketSchema
 
 
 class SetNickNameHandler(PacketHandler):
-    async def process(self, user) -> None:
+    # WarRock won't let any user set a nickname longer than 16 char. Invalid
+    # names are answered without dropping the user, who may try another
+    schema = PacketSchema(
+        "SetNickNameRequest",
+        Field(
+            "nickname",
+            min_length=4,
+            max_length=16,
+            alnum=True,
+            error=ServerListError.ILLEGAL_NICKNAME,
+            too_long_error=ServerListError.NICKNAME_TOO_LONG,
+        ),
+        reply=PacketList.SERVER_LIST,
+        disconnect=False,
+    )
+
+    def reject(self, user, packet, error) -> bool:
+        # Only authorized users may set a nickname, anyone else is ignored
+        # whatever they sent
+        if not user.authorized:
+            return True
+        return super().reject(user, packet, error)
+
+    async def process(self, user, request) -> None:
         if user.authorized:
-            # WarRock won't let any user set a nickname longer than 16 char
-            new_nickname = self.get_block(0)
-            is_valid_nickname = False
+            new_nickname = request.nickname
             invalid_reason = None
 
-            if not new_nickname.isalnum() or len(new_nickname) <= 3:
-                invalid_reason = ServerListError.ILLEGAL_NICKNAME
-
-            if len(new_nickname) > 16:
-                invalid_reason = ServerListError.NICKNAME_TOO_LONG
-
-            # Database call to check if the display name is already in use
-            if await displayname_exists(displayname=new_nickname):
+            # Only valid names reach the database, where the name is claimed
+            # atomically so two users cannot take the same one
+            if not await claim_displayname(
+                username=user.username, new_displayname=new_nickname
+            ):
                 invalid_reason = ServerListError.NICKNAME_TAKEN
-            else:
-                is_valid_nickname = True
 
-            if not is_valid_nickname:
+            if invalid_reason is not None:
                 packet = PacketFactory.create_packet(
                     PacketList.SERVER_LIST, error_code=invalid_reason
                 )
@@ -38,10 +55,5 @@ class SetNickNameHandler(PacketHandler):
                 packet = PacketFactory.create_packet(
                     packet_id=PacketList.SERVER_LIST, error_code=corerr.SUCCESS, u=user
                 )
-                await user.send(packet.build())
+                user.send_nowait(packet.build())
                 await user.disconnect()
-
-                # update the database nickname
-                await update_displayname(
-                    username=user.username, new_displayname=new_nickname
-                )
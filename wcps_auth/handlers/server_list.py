@@ -1,56 +1,103 @@
-import hashlib
+import asyncio
+import logging
 
 from wcps_auth.handlers.base import PacketHandler
-from wcps_auth.database import get_user_details
+from wcps_auth.database import get_user_details, update_password
+from wcps_auth.log import packet_dumps
+from wcps_auth.passwords import VerifierBusy, get_password_verifier
+from wcps_auth.session_store import SessionStoreError
+from wcps_auth.singleflight import KeyedLocks, SingleFlight
 from wcps_auth.packets.packet_factory import PacketFactory
 from wcps_auth.packets.packet_list import PacketList
-from wcps_auth.sessions import SessionManager
+from wcps_auth.packets.schema import Field, PacketSchema
 
 from wcps_core.constants import ErrorCodes as corerr
 from wcps_auth.error_codes import ServerListError
 
+# Shared by every login: concurrent attempts for one account verify once,
+# and replace the account's session one at a time
+verifications = SingleFlight()
+login_locks = KeyedLocks()
+# Hash upgrades still being stored. The event loop only keeps weak references
+# to tasks, so they are held here until done
+rehash_tasks = set()
+
+
+def _rehash_done(task: asyncio.Task) -> None:
+    rehash_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(
+            "Failed to upgrade the password hash (%s): %s",
+            task.get_name(),
+            task.exception(),
+        )
+
+
+async def verify_password(this_user: dict, input_pw: str) -> bool:
+    verified = await get_password_verifier().verify(
+        input_pw, this_user["salt"], this_user["password"]
+    )
+    if verified.new_hash is not None:
+        # Upgrade the stored hash to the preferred scheme
+        username = this_user["username"]
+        task = asyncio.create_task(
+            update_password(username, verified.new_hash, verified.new_salt),
+            name=f"rehash {username}",
+        )
+        rehash_tasks.add(task)
+        task.add_done_callback(_rehash_done)
+    return verified.valid
+
 
 class ServerListHandler(PacketHandler):
-    async def process(self, user) -> None:
-        input_id = self.get_block(2)
-        input_pw = self.get_block(3)
+    schema = PacketSchema(
+        "ServerListRequest",
+        None,
+        None,
+        Field(
+            "username", min_length=3, alnum=True, error=ServerListError.ENTER_ID_ERROR
+        ),
+        Field("password", min_length=3, error=ServerListError.ENTER_PASSWORD_ERROR),
+        reply=PacketList.SERVER_LIST,
+    )
 
-        # Validate input ID
-        if len(input_id) < 3 or not input_id.isalnum():
-            packet = PacketFactory.create_packet(
-                PacketList.SERVER_LIST, ServerListError.ENTER_ID_ERROR
-            )
-            await user.send(packet.build())
-            await user.disconnect()
-            return
+    async def process(self, user, request) -> None:
+        input_id = request.username
+        input_pw = request.password
 
-        # Validate input password
-        if len(input_pw) < 3:
+        # Retrieve user details
+        this_user = await get_user_details(input_id)
+        if not this_user:
             packet = PacketFactory.create_packet(
-                PacketList.SERVER_LIST, ServerListError.ENTER_PASSWORD_ERROR
+                PacketList.SERVER_LIST, ServerListError.WRONG_USER
             )
-            await user.send(packet.build())
+            user.send_nowait(packet.build())
             await user.disconnect()
             return
 
-        # Retrieve user details
-        this_user = await get_user_details(input_id)
-        if not this_user:
+        # Verify password, off the event loop for the expensive schemes.
+        # Retries of the same login in flight share one verification
+        try:
+            is_valid_password = await verifications.do(
+                (this_user["username"], this_user["password"], input_pw),
+                verify_password,
+                this_user,
+                input_pw,
+            )
+        except VerifierBusy:
+            logging.warning("Password verification queue full. Rejecting login")
             packet = PacketFactory.create_packet(
-                PacketList.SERVER_LIST, ServerListError.WRONG_USER
+                PacketList.SERVER_LIST, ServerListError.ILLEGAL_EXCEPTION
             )
-            await user.send(packet.build())
+            user.send_nowait(packet.build())
             await user.disconnect()
             return
 
-        # Hash password and verify
-        password_to_hash = f"{input_pw}{this_user['salt']}".encode("utf-8")
-        hashed_password = hashlib.sha256(password_to_hash).hexdigest()
-        if this_user["password"] != hashed_password:
+        if not is_valid_password:
             packet = PacketFactory.create_packet(
                 PacketList.SERVER_LIST, ServerListError.WRONG_PW
             )
-            await user.send(packet.build())
+            user.send_nowait(packet.build())
             await user.disconnect()
             return
 
@@ -59,33 +106,38 @@ class ServerListHandler(PacketHandler):
             packet = PacketFactory.create_packet(
                 PacketList.SERVER_LIST, ServerListError.BANNED
             )
-            await user.send(packet.build())
+            user.send_nowait(packet.build())
             await user.disconnect()
             return
 
-        # Check session status
-        session_manager = SessionManager()
-        is_authorized = await session_manager.is_user_authorized(this_user["username"])
-        session_id = await session_manager.get_user_session_id(this_user["username"])
-        is_activated_session = await session_manager.is_user_session_activated(
-            session_id
-        )
-
         # When players leave the server selection menu or are rejected by a server
-        # their session will exists already after reaching this code block,
-        # but it won't be active
-
-        if not is_authorized or (
-            is_authorized and session_id is not None and not is_activated_session
-        ):
-            if is_authorized:
-                await session_manager.unauthorize_user(this_user["username"])
-
-            await user.authorize(
-                username=this_user["username"],
-                displayname=this_user["displayname"],
-                rights=this_user["rights"],
-            )
+        # their session will exist already after reaching this code block,
+        # but it won't be active and is replaced by this login
+        async with login_locks.hold(this_user["username"]):
+            try:
+                is_authorized = await user.authorize(
+                    username=this_user["username"],
+                    displayname=this_user["displayname"],
+                    rights=this_user["rights"],
+                )
+            except SessionStoreError as e:
+                # Only with workers, when the coordinator failed or stalled
+                logging.error("Session store call failed. Rejecting login: %s", e)
+                packet = PacketFactory.create_packet(
+                    PacketList.SERVER_LIST, ServerListError.ILLEGAL_EXCEPTION
+                )
+                user.send_nowait(packet.build())
+                await user.disconnect()
+                return
+
+            if not is_authorized:
+                packet = PacketFactory.create_packet(
+                    PacketList.SERVER_LIST, ServerListError.ALREADY_LOGGED_IN
+                )
+                user.send_nowait(packet.build())
+                await user.disconnect()
+                return
+
             # Nickname is not set. Send new nickname packet
             if not this_user["displayname"]:
                 packet = PacketFactory.create_packet(
@@ -97,17 +149,10 @@ class ServerListHandler(PacketHandler):
                 packet = PacketFactory.create_packet(
                     PacketList.SERVER_LIST, corerr.SUCCESS, u=user
                 )
-                await user.send(packet.build())
+                user.send_nowait(packet.build())
                 await user.disconnect()
-        else:
-            if is_activated_session:
-                packet = PacketFactory.create_packet(
-                    PacketList.SERVER_LIST, ServerListError.ALREADY_LOGGED_IN
-                )
-            else:
-                packet = PacketFactory.create_packet(
-                    PacketList.SERVER_LIST, ServerListError.ILLEGAL_EXCEPTION
-                )
 
-            await user.send(packet.build())
-            await user.disconnect()
+
+# Sampled packet dumps are kept in memory and served over HTTP: never with the
+# password block of a login
+packet_dumps.redact(PacketList.SERVER_LIST, 3)
@@ -0,0 +1,312 @@
+"""
+Protocol level load generator for wcps_auth.
+
+Simulated clients run launcher -> server list -> nickname against the client
+port, while simulated game servers authenticate on the internal port, report
+their status periodically and authenticate every player that logged in.
+
+Run the server with the memory backend seeded with the same accounts and
+servers, and admission limits raised for loopback:
+
+    STORAGE_BACKEND=memory MEMORY_SEED_USERS=2000 MEMORY_SEED_SERVERS=4 \\
+    MAX_CONNECTIONS_PER_IP=100000 ACCEPT_RATE_PER_IP=100000 \\
+    ACCEPT_BURST_PER_IP=100000 wcps-auth
+
+    wcps-auth-bench --clients 2000 --servers 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from wcps_core.constants import ErrorCodes, InternalKeys, Ports, ServerTypes
+
+from wcps_auth.codec import get_codec
+from wcps_auth.error_codes import ServerListError
+from wcps_auth.framing import PacketFramer
+from wcps_auth.packets.in_packet import SPACE_PLACEHOLDER, parse_packets
+from wcps_auth.packets.packet_list import ClientXorKeys, PacketList
+from wcps_auth.storage.memory import BENCH_SERVER_BASE_PORT, bench_username
+
+PACKET_NAMES = {
+    PacketList.LAUNCHER: "LAUNCHER",
+    PacketList.SERVER_LIST: "SERVER_LIST",
+    PacketList.SETNICKNAME: "SETNICKNAME",
+    PacketList.INTERNALGAMEAUTHENTICATION: "INTERNALGAMEAUTHENTICATION",
+    PacketList.INTERNALGAMESTATUS: "INTERNALGAMESTATUS",
+    PacketList.INTERNALPLAYERAUTHENTICATION: "INTERNALPLAYERAUTHENTICATION",
+}
+
+
+def build_packet(packet_id: int, blocks, xor_key: int) -> bytes:
+    ticks = int(time.monotonic() * 1000) & 0x7FFFFFFF
+    text = " ".join(
+        [str(ticks), str(packet_id)]
+        + [str(block).replace(" ", SPACE_PLACEHOLDER) for block in blocks]
+    )
+    return get_codec(xor_key).encode(f"{text} \n".encode("utf-8"))
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name: str) -> None:
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {"elapsed_s": elapsed, "operations": {}, "errors": self.errors}
+        for name, samples in sorted(self.samples.items()):
+            samples.sort()
+            count = len(samples)
+            result["operations"][name] = {
+                "count": count,
+                "per_s": count / elapsed,
+                "p50_ms": samples[int(count * 0.50)] * 1000,
+                "p95_ms": samples[min(count - 1, int(count * 0.95))] * 1000,
+                "p99_ms": samples[min(count - 1, int(count * 0.99))] * 1000,
+            }
+        return result
+
+
+class ProtocolConnection:
+    def __init__(self, reader, writer, send_key: int, receive_key: int):
+        self.reader = reader
+        self.writer = writer
+        self.send_key = send_key
+        self.framer = PacketFramer(receive_key, max_frame_size=1 << 16)
+        self.codec = get_codec(receive_key)
+        self.pending = []
+
+    @classmethod
+    async def open(cls, host: str, port: int, send_key: int, receive_key: int):
+        reader, writer = await asyncio.open_connection(host, port)
+        connection = cls(reader, writer, send_key, receive_key)
+        # The server greets every connection with a Connection packet
+        await connection.receive()
+        return connection
+
+    async def receive(self):
+        while not self.pending:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("Connection closed by server")
+            complete_packets = self.framer.feed(data)
+            if complete_packets:
+                self.pending.extend(
+                    parse_packets(self.codec.decode(complete_packets), None)
+                )
+        return self.pending.pop(0)
+
+    def send(self, packet_id: int, blocks=()) -> None:
+        self.writer.write(build_packet(packet_id, blocks, self.send_key))
+
+    async def request(self, recorder, packet_id: int, blocks=()):
+        start = time.perf_counter()
+        self.send(packet_id, blocks)
+        reply = await self.receive()
+        recorder.record(PACKET_NAMES[packet_id], time.perf_counter() - start)
+        return reply
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+async def simulate_client(host, index, recorder, logged_in: asyncio.Queue = None):
+    username = bench_username(index)
+    start = time.perf_counter()
+
+    launcher = await ProtocolConnection.open(
+        host, Ports.AUTH_CLIENT, ClientXorKeys.RECEIVE, ClientXorKeys.SEND
+    )
+    await launcher.request(recorder, PacketList.LAUNCHER)
+    launcher.close()
+
+    client = await ProtocolConnection.open(
+        host, Ports.AUTH_CLIENT, ClientXorKeys.RECEIVE, ClientXorKeys.SEND
+    )
+    try:
+        reply = await client.request(
+            recorder, PacketList.SERVER_LIST, (0, 0, username, username)
+        )
+        if int(reply.blocks[0]) == ServerListError.NEW_NICKNAME:
+            reply = await client.request(
+                recorder, PacketList.SETNICKNAME, (f"n{username}",)
+            )
+
+        if int(reply.blocks[0]) != ErrorCodes.SUCCESS:
+            recorder.error(f"login_{reply.blocks[0]}")
+            return
+    finally:
+        client.close()
+
+    recorder.record("login_total", time.perf_counter() - start)
+    if logged_in is not None:
+        # blocks: error, internal id, unknown, username, password, nickname,
+        # session
+        await logged_in.put((username, int(reply.blocks[6])))
+
+
+class SimulatedGameServer:
+    def __init__(self, host, index, recorder, status_interval):
+        self.host = host
+        self.index = index
+        self.recorder = recorder
+        self.status_interval = status_interval
+        self.players = 0
+        self.connection = None
+        self.lock = asyncio.Lock()
+
+    async def authenticate(self) -> None:
+        self.connection = await ProtocolConnection.open(
+            self.host,
+            Ports.INTERNAL,
+            InternalKeys.XOR_GAME_SEND,
+            InternalKeys.XOR_AUTH_SEND,
+        )
+        reply = await self.connection.request(
+            self.recorder,
+            PacketList.INTERNALGAMEAUTHENTICATION,
+            (
+                ErrorCodes.SUCCESS,
+                self.index,
+                f"bench{self.index}",
+                "127.0.0.1",
+                BENCH_SERVER_BASE_PORT + self.index,
+                ServerTypes.ENTIRE,
+                0,
+                3600,
+            ),
+        )
+        if int(reply.blocks[0]) != ErrorCodes.SUCCESS:
+            raise RuntimeError(f"Game server {self.index} rejected: {reply.blocks}")
+
+    async def report_status(self) -> None:
+        while True:
+            await asyncio.sleep(self.status_interval)
+            start = time.perf_counter()
+            self.connection.send(
+                PacketList.INTERNALGAMESTATUS,
+                (ErrorCodes.SUCCESS, int(time.time()), self.index, self.players, 0),
+            )
+            await self.connection.writer.drain()
+            self.recorder.record("INTERNALGAMESTATUS", time.perf_counter() - start)
+
+    async def authenticate_players(self, logged_in: asyncio.Queue) -> None:
+        while True:
+            username, session_id = await logged_in.get()
+            try:
+                # Replies arrive in order, one request in flight at a time
+                async with self.lock:
+                    reply = await self.connection.request(
+                        self.recorder,
+                        PacketList.INTERNALPLAYERAUTHENTICATION,
+                        (ErrorCodes.SUCCESS, session_id, username, 1),
+                    )
+                    if int(reply.blocks[0]) != ErrorCodes.SUCCESS:
+                        self.recorder.error(f"player_auth_{reply.blocks[0]}")
+                        continue
+                    self.players += 1
+                    # Log the player out again so the account can be reused
+                    self.connection.send(
+                        PacketList.INTERNALPLAYERAUTHENTICATION,
+                        (ErrorCodes.END_CONNECTION, session_id, username, 1),
+                    )
+            finally:
+                logged_in.task_done()
+
+
+async def run_load(args) -> dict:
+    recorder = LatencyRecorder()
+    # Without game servers, logins are not followed by player authentication
+    logged_in = asyncio.Queue() if args.servers else None
+
+    servers = [
+        SimulatedGameServer(args.host, index, recorder, args.status_interval)
+        for index in range(1, args.servers + 1)
+    ]
+    await asyncio.gather(*(server.authenticate() for server in servers))
+    workers = [
+        asyncio.create_task(server.authenticate_players(logged_in))
+        for server in servers
+    ] + [asyncio.create_task(server.report_status()) for server in servers]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_client(index):
+        async with semaphore:
+            try:
+                await simulate_client(args.host, index, recorder, logged_in)
+            except (ConnectionError, OSError, IndexError, ValueError) as e:
+                recorder.error(type(e).__name__)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            one_client(index)
+            for index in range(args.first_client, args.first_client + args.clients)
+        )
+    )
+    if logged_in is not None:
+        await logged_in.join()
+    elapsed = time.perf_counter() - start
+
+    for worker in workers:
+        worker.cancel()
+    for server in servers:
+        server.connection.close()
+
+    return recorder.summary(elapsed)
+
+
+def print_summary(summary: dict) -> None:
+    print(f"Elapsed: {summary['elapsed_s']:.2f}s")
+    print(
+        f"{'operation':<32}{'count':>8}{'per s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for name, stats in summary["operations"].items():
+        print(
+            f"{name:<32}{stats['count']:>8}{stats['per_s']:>10.1f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+    for name, count in summary["errors"].items():
+        print(f"error {name}: {count}")
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="WCPS Authentication server load generator",
+        epilog="Accounts and servers must exist, see MEMORY_SEED_USERS/SERVERS",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--clients", type=int, default=1000, help="logins to run")
+    parser.add_argument(
+        "--first-client", type=int, default=0, help="index of the first account"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=100, help="clients in flight at once"
+    )
+    parser.add_argument(
+        "--servers", type=int, default=2, help="game servers, 0 for logins only"
+    )
+    parser.add_argument(
+        "--status-interval", type=float, default=5.0, help="seconds between pings"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    run()
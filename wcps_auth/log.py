@@ -0,0 +1,125 @@
+import collections
+import logging
+import logging.handlers
+import queue
+import time
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Sampled packet dumps are written here, so they can be routed or silenced
+# apart from the server log
+packet_log = logging.getLogger("wcps_auth.packets")
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue untouched. The stock QueueHandler formats the
+    message first so records can be pickled, which would keep formatting on
+    the event loop; the listener thread of this process does it instead.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.enqueue(record)
+        except Exception:
+            self.handleError(record)
+
+
+def configure_logging(level="INFO") -> logging.handlers.QueueListener:
+    """
+    Route every log record through a queue to a listener thread that formats
+    and writes it, so logging never blocks the event loop. Returns the
+    started listener; stop it on shutdown to flush pending records.
+    """
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(LocalQueueHandler(records))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(
+        records, output, respect_handler_level=True
+    )
+    listener.start()
+    return listener
+
+
+def start_logging(config) -> logging.handlers.QueueListener:
+    """Configure logging and packet dumps from settings"""
+    listener = configure_logging(config.log_level)
+    packet_dumps.configure(
+        config.packet_dump_every, config.packet_dump_ring_size, config.packet_dump_log
+    )
+    return listener
+
+
+class PacketDumps:
+    """
+    Keeps 1 in sample_every packets, decoded, in a ring buffer of the last
+    ring_size and optionally in the packet log. Skipped packets cost a
+    counter increment; with sample_every = 0 callers skip dumping entirely.
+    """
+
+    def __init__(self, sample_every: int = 0, ring_size: int = 0, log=False):
+        # Packet ID, as in the buffer, -> blocks blanked in inbound packets
+        self.redacted = {}
+        self.configure(sample_every, ring_size, log)
+
+    def redact(self, packet_id: int, block: int) -> None:
+        """Never keep block of inbound packet_id packets, e.g. a password"""
+        self.redacted.setdefault(str(packet_id).encode(), set()).add(block)
+
+    def configure(self, sample_every: int, ring_size: int, log=False) -> None:
+        self.sample_every = sample_every
+        self.log = log
+        self.ring = collections.deque(maxlen=ring_size)
+        self._seen = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_every > 0
+
+    def record(self, direction: str, peer, data: bytes, codec=None) -> None:
+        """
+        Count a packet buffer and keep it when it is sampled. Still encoded
+        buffers are passed with their codec, decoded only when sampled.
+        """
+        self._seen += 1
+        if self._seen % self.sample_every:
+            return
+
+        decoded = codec.decode(data) if codec is not None else data
+        if direction == "in" and self.redacted:
+            decoded = self._redact(decoded)
+        if self.ring.maxlen:
+            self.ring.append((time.time(), direction, peer, decoded))
+        if self.log:
+            packet_log.info("%s %s %r", direction, peer, decoded)
+
+    def _redact(self, decoded: bytes) -> bytes:
+        packets = decoded.split(b"\n")
+        for position, packet in enumerate(packets):
+            # Ticks and packet ID come before the blocks
+            fields = packet.split(b" ")
+            blocks = self.redacted.get(fields[1]) if len(fields) > 1 else None
+            if blocks:
+                for block in blocks:
+                    if block + 2 < len(fields):
+                        fields[block + 2] = b""
+                packets[position] = b" ".join(fields)
+        return b"\n".join(packets)
+
+    def format(self) -> str:
+        lines = []
+        for timestamp, direction, peer, decoded in self.ring:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+            lines.append(f"{stamp} {direction} {peer} {decoded!r}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+# Configured from settings by main
+packet_dumps = PacketDumps()
@@ -1,8 +1,18 @@
 import asyncio
 import logging
 
-from wcps_auth.database import get_server_list, run_pool
-from wcps_auth.networking import start_listeners
+from wcps_auth import profiling
+from wcps_auth.config import settings
+from wcps_auth.database import get_server_list, log_storage_stats, open_storage
+from wcps_auth.log import start_logging
+from wcps_auth.metrics import start_metrics_server
+from wcps_auth.networking import start_internal_listener, start_listeners
+from wcps_auth.server_registry import GameServerRegistry
+from wcps_auth.workers import (
+    restart_dead_workers,
+    start_coordinator,
+    stop_coordinator,
+)
 
 # ASCII LOGO
 WCPS_IMAGE = r"""
@@ -15,35 +25,64 @@ ____    __    ____  ______ .______     _______.
     \__/  \__/     \______|| _|   |_______/       
                             by SGMartin      
 """
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 
 
 async def main():
     print(WCPS_IMAGE)
 
+    log_listener = start_logging(settings())
+    try:
+        await serve()
+    finally:
+        # Write out whatever the listener thread has not yet
+        log_listener.stop()
+
+
+async def serve():
     keep_running = True
-    logging.info("Initializing database pool...")
-    await run_pool()
+    logging.info("Initializing %s storage...", settings().storage_backend)
+    await open_storage()
 
     logging.info("Retrieving game server master list...")
     all_game_servers = await get_server_list()
-    logging.info(f"Found {len(all_game_servers)} server/s to watch.")
+    logging.info("Found %d server/s to watch.", len(all_game_servers))
 
-    # Start the asyncio listeners
-    asyncio.create_task(start_listeners())
+    registry = GameServerRegistry()
+    registry.load(all_game_servers)
+    asyncio.create_task(
+        registry.run_refresh_loop(settings().server_registry_refresh_interval)
+    )
+
+    profiling.install(settings())
+    if settings().metrics_enabled:
+        await start_metrics_server(settings().metrics_host, settings().metrics_port)
+
+    # Start the asyncio listeners. With several workers, clients are
+    # accepted by the worker processes and only game servers connect here
+    coordinator = None
+    if settings().workers > 1:
+        coordinator = await start_coordinator(settings())
+        asyncio.create_task(start_internal_listener())
+    else:
+        asyncio.create_task(start_listeners())
     logging.info("Authentication server started!")
-    while keep_running:
-        logging.info("Awaiting connections...")
-        # tasks = []
-        # for server in all_game_servers:
-        #     task = asyncio.create_task(connect_to_game_server(server))
-        #     tasks.append(task)
-        # await asyncio.gather(*tasks)
-
-        await asyncio.sleep(10)
+    try:
+        while keep_running:
+            logging.info("Awaiting connections...")
+            log_storage_stats()
+            if coordinator is not None:
+                # A worker that died takes its share of the clients with it
+                restart_dead_workers(settings(), *coordinator)
+            # tasks = []
+            # for server in all_game_servers:
+            #     task = asyncio.create_task(connect_to_game_server(server))
+            #     tasks.append(task)
+            # await asyncio.gather(*tasks)
+
+            await asyncio.sleep(10)
+    finally:
+        if coordinator is not None:
+            await stop_coordinator(*coordinator)
 
 
 if __name__ == "__main__":
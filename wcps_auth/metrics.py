@@ -0,0 +1,296 @@
+import asyncio
+import bisect
+import functools
+import logging
+import time
+
+from wcps_auth.log import packet_dumps
+
+# Seconds. Handlers and queries normally finish well under a second
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _format_labels(labelnames, labelvalues, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1) -> None:
+        self.value += amount
+
+
+class HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        # One count per bucket plus +Inf, made cumulative when rendered
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *labelvalues):
+        """
+        Value for one label combination. Hot paths should look it up once
+        and keep it, recording is then a plain attribute update.
+        """
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[labelvalues] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """(suffix, label string, value) tuples in exposition order"""
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterValue()
+
+    def inc(self, amount=1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for labelvalues, child in self._children.items():
+            yield "", _format_labels(self.labelnames, labelvalues), child.value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        for labelvalues, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                yield "_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield "_sum", labels, child.sum
+            yield "_count", labels, child.count
+
+
+class CallbackMetric(Metric):
+    """
+    Metric read at scrape time from state kept elsewhere, such as the
+    session table or admission controllers. function returns an iterable of
+    (labelvalues, value) pairs.
+    """
+
+    def __init__(self, name, documentation, labelnames, kind, function):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.function = function
+
+    def samples(self):
+        for labelvalues, value in self.function():
+            yield "", _format_labels(self.labelnames, labelvalues), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def callback(self, name, documentation, labelnames, function, kind="gauge"):
+        # Registering again replaces the function, e.g. for new listeners
+        metric = CallbackMetric(name, documentation, labelnames, kind, function)
+        self._metrics[name] = metric
+        return metric
+
+    def get(self, name) -> Metric:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.exception("Failed to collect metric %s: %s", metric.name, e)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+handler_seconds = registry.histogram(
+    "wcps_handler_seconds", "Time spent handling a packet", ("handler",)
+)
+handler_errors = registry.counter(
+    "wcps_handler_errors_total", "Handlers that raised", ("handler",)
+)
+db_seconds = registry.histogram(
+    "wcps_db_seconds", "Time spent in a database function", ("function",)
+)
+db_errors = registry.counter(
+    "wcps_db_errors_total", "Database functions that raised", ("function",)
+)
+pool_wait_seconds = registry.histogram(
+    "wcps_db_pool_wait_seconds", "Time waiting for a pooled connection", ("query",)
+)
+packets_in = registry.counter(
+    "wcps_packets_in_total", "Packets received", ("listener",)
+)
+packets_out = registry.counter("wcps_packets_out_total", "Packets sent", ("listener",))
+send_flushes = registry.counter(
+    "wcps_send_flushes_total", "Coalesced writes of queued packets", ("listener",)
+)
+send_drains = registry.counter(
+    "wcps_send_drains_total",
+    "Sends that waited for the socket, over the high-water mark",
+    ("listener",),
+)
+packets_unhandled = registry.counter(
+    "wcps_packets_unhandled_total",
+    "Packets dropped for having no handler on their listener",
+    ("listener",),
+)
+bytes_in = registry.counter("wcps_bytes_in_total", "Bytes received", ("listener",))
+bytes_out = registry.counter("wcps_bytes_out_total", "Bytes sent", ("listener",))
+
+
+def timed(histogram: Histogram, errors: Counter = None):
+    """
+    Decorator recording the duration of a coroutine function in histogram,
+    and raised exceptions in errors, labelled with the function name.
+    """
+
+    def decorator(coroutine_function):
+        name = coroutine_function.__name__
+        durations = histogram.labels(name)
+        failures = errors.labels(name) if errors is not None else None
+
+        @functools.wraps(coroutine_function)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await coroutine_function(*args, **kwargs)
+            except Exception:
+                if failures is not None:
+                    failures.inc()
+                raise
+            finally:
+                durations.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        async with asyncio.timeout(5):
+            request_line = await reader.readline()
+            # Headers are not needed, only read past them
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+    except (TimeoutError, ValueError, ConnectionError):
+        writer.close()
+        return
+
+    parts = request_line.split()
+    path = parts[1] if len(parts) >= 2 and parts[0] == b"GET" else None
+    if path == b"/metrics":
+        status = "200 OK"
+        body = registry.render().encode("utf-8")
+    elif path == b"/packets":
+        status = "200 OK"
+        body = packet_dumps.format().encode("utf-8")
+    else:
+        status = "404 Not Found"
+        body = b"Not Found\n"
+
+    writer.write(
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode("ascii")
+        + body
+    )
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    Serve GET /metrics in the Prometheus text format, and the sampled
+    packet dumps at GET /packets
+    """
+    server = await asyncio.start_server(serve_metrics, host, port)
+    logging.info("Metrics available at http://%s:%d/metrics", host, port)
+    return server
@@ -4,67 +4,194 @@ import logging
 import wcps_core.constants
 import wcps_core.packets
 
+from wcps_auth import metrics
+from wcps_auth.admission import AdmissionController
 from wcps_auth.config import settings
 from wcps_auth.entities import BaseNetworkEntity
 from wcps_auth.sessions import SessionManager
+from wcps_auth.transport import create_protocol_server
 
-from wcps_auth.handlers import get_handler_for_packet
+from wcps_auth.handlers import (
+    CLIENT_DISPATCH,
+    INTERNAL_DISPATCH,
+    get_handler_for_packet,
+)
 from wcps_auth.packets.packet_list import ClientXorKeys
 
-logging.basicConfig(level=logging.INFO)
+
+def accept_connections(entity_class, admission: AdmissionController):
+    """
+    Connection callback for asyncio.start_server. Connections rejected by
+    admission control are aborted before any entity is built for them.
+    """
+
+    def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peername = writer.get_extra_info("peername")
+        ip = peername[0] if peername else None
+        if not admission.admit(ip):
+            writer.transport.abort()
+            return
+
+        entity = entity_class(reader, writer)
+        entity.listen_task.add_done_callback(lambda _: admission.release(ip))
+
+    return on_connection
+
+
+async def start_entity_server(entity_class, admission, port: int, **kwargs):
+    """Listen for entity_class connections on the configured network layer"""
+    config = settings()
+    if config.network_layer == "protocol":
+        return await create_protocol_server(
+            entity_class,
+            admission,
+            config.server_ip,
+            port,
+            config.read_chunk_size,
+            **kwargs,
+        )
+    if config.network_layer != "streams":
+        raise ValueError(f"Unknown network layer {config.network_layer}")
+    return await asyncio.start_server(
+        accept_connections(entity_class, admission),
+        config.server_ip,
+        port,
+        limit=config.stream_buffer_limit,
+        **kwargs,
+    )
+
+
+# Admission controller of each listener, by listener name
+admissions = {}
 
 
 async def start_listeners():
+    await asyncio.gather(start_client_listener(), start_internal_listener())
+
+
+async def start_client_listener(reuse_port: bool = False):
+    """
+    Accept game clients. With reuse_port, several processes may listen on
+    the port at once and the kernel spreads connections between them.
+    """
+    config = settings()
+    admission = admissions[User.listener_name] = AdmissionController(
+        max_connections=config.max_client_connections,
+        max_per_ip=config.max_connections_per_ip,
+        accept_rate=config.accept_rate_per_ip,
+        accept_burst=config.accept_burst_per_ip,
+    )
+
     try:
-        client_server = await asyncio.start_server(
-            User, settings().server_ip, wcps_core.constants.Ports.AUTH_CLIENT
+        client_server = await start_entity_server(
+            User,
+            admission,
+            wcps_core.constants.Ports.AUTH_CLIENT,
+            reuse_port=reuse_port,
         )
         logging.info("Client listener started.")
     except OSError:
-        logging.error(f"Failed to bind to port {wcps_core.constants.Ports.AUTH_CLIENT}")
+        logging.error(
+            "Failed to bind to port %d", wcps_core.constants.Ports.AUTH_CLIENT
+        )
         return
 
+    await client_server.serve_forever()
+
+
+async def start_internal_listener():
+    config = settings()
+    # Several game servers may share a host, so only the global cap applies
+    admission = admissions[GameServer.listener_name] = AdmissionController(
+        max_connections=config.max_internal_connections
+    )
+
     try:
-        server_listener = await asyncio.start_server(
-            GameServer, settings().server_ip, wcps_core.constants.Ports.INTERNAL
+        server_listener = await start_entity_server(
+            GameServer, admission, wcps_core.constants.Ports.INTERNAL
         )
         logging.info("Server listener started.")
     except OSError:
-        logging.error(f"Failed to bind to port {wcps_core.constants.Ports.INTERNAL}")
+        logging.error("Failed to bind to port %d", wcps_core.constants.Ports.INTERNAL)
         return
 
-    await asyncio.gather(client_server.serve_forever(), server_listener.serve_forever())
+    await server_listener.serve_forever()
+
+
+metrics.registry.callback(
+    "wcps_active_connections",
+    "Open connections",
+    ("listener",),
+    lambda: [((name,), a.active) for name, a in admissions.items()],
+)
+metrics.registry.callback(
+    "wcps_connections_accepted_total",
+    "Connections accepted",
+    ("listener",),
+    lambda: [((name,), a.accepted) for name, a in admissions.items()],
+    kind="counter",
+)
+metrics.registry.callback(
+    "wcps_connections_rejected_total",
+    "Connections rejected by admission control",
+    ("listener", "reason"),
+    lambda: [
+        ((name, reason), count)
+        for name, a in admissions.items()
+        for reason, count in a.rejected.items()
+    ],
+    kind="counter",
+)
 
 
 class User(BaseNetworkEntity):
+    handshake_timeout = settings().handshake_timeout
+    idle_timeout = settings().user_idle_timeout
+    listener_name = "client"
+
     def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         super().__init__(reader, writer, ClientXorKeys.SEND, ClientXorKeys.RECEIVE)
         self.username = "none"
         self.displayname = ""
         self.rights = 0
 
-    async def authorize(self, username: str, displayname: str, rights: int):
+    async def authorize(self, username: str, displayname: str, rights: int) -> bool:
+        """
+        Take over username's session unless a game server has already
+        activated it. Returns False when the user is logged in elsewhere.
+        """
         self.username = username
         self.displayname = displayname
         self.rights = rights
-        self.authorized = True
         session_manager = SessionManager()
-        self.session_id = await session_manager.authorize_user(self)
+        session_id = await session_manager.replace_user_session(self)
+        if session_id is None:
+            return False
+
+        self.session_id = session_id
+        self.authorized = True
+        return True
 
     async def update_displayname(self, new_nickname: str):
         self.displayname = new_nickname
 
+        # Just in case some random disconnection happened, the session may
+        # be gone already
         session_manager = SessionManager()
-        if await session_manager.is_user_authorized(self.username):
-            this_user = await session_manager.get_user_by_session_id(self.session_id)
-            # Just in case some random disconnection happened lol
-            this_user.displayname = new_nickname
+        await session_manager.set_user_displayname(
+            self.username, self.session_id, new_nickname
+        )
 
     def get_handler_for_packet(self, packet_id):
-        return get_handler_for_packet(packet_id)
+        return get_handler_for_packet(packet_id, CLIENT_DISPATCH)
 
 
 class GameServer(BaseNetworkEntity):
+    handshake_timeout = settings().handshake_timeout
+    # Game servers report their status periodically, allow a few misses
+    idle_timeout = settings().game_server_idle_timeout
+    listener_name = "internal"
+
     def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         super().__init__(
             reader,
@@ -107,4 +234,4 @@ class GameServer(BaseNetworkEntity):
                 await session_manager.unauthorize_server(self.id)
 
     def get_handler_for_packet(self, packet_id):
-        return get_handler_for_packet(packet_id)
+        return get_handler_for_packet(packet_id, INTERNAL_DISPATCH)
@@ -0,0 +1,40 @@
+# Decoded packets are text: "<ticks> <packet id> <block> <block> ... \n"
+BLOCK_SEPARATOR = " "
+# Spaces inside a block are sent as 0x1D
+SPACE_PLACEHOLDER = "\x1d"
+PACKET_TERMINATOR = "\n"
+
+
+class IncomingPacket:
+    __slots__ = ("receptor", "ticks", "packet_id", "blocks", "request")
+
+    def __init__(self, receptor, ticks: int, packet_id: int, blocks: list):
+        self.receptor = receptor
+        self.ticks = ticks
+        self.packet_id = packet_id
+        self.blocks = blocks
+        # The blocks decoded with the handler's schema, see schema.py
+        self.request = None
+
+
+def parse_packet(line: str, receptor) -> IncomingPacket:
+    fields = line.split(BLOCK_SEPARATOR)
+    # Packets end with a separator before the terminator
+    if fields and fields[-1] == "":
+        fields.pop()
+
+    if len(fields) < 2:
+        raise ValueError(f"Malformed packet {line!r}")
+
+    blocks = [block.replace(SPACE_PLACEHOLDER, " ") for block in fields[2:]]
+    return IncomingPacket(receptor, int(fields[0]), int(fields[1]), blocks)
+
+
+def parse_packets(decoded_buffer: bytes, receptor) -> list:
+    """Parse a decoded buffer holding one or more whole packets"""
+    text = decoded_buffer.decode("utf-8", errors="replace")
+    return [
+        parse_packet(line, receptor)
+        for line in text.split(PACKET_TERMINATOR)
+        if line
+    ]
@@ -1,15 +1,12 @@
-from wcps_core.constants import ErrorCodes, InternalKeys
-from wcps_core.packets import OutPacket
+from wcps_core.constants import ErrorCodes
 
+from wcps_auth.packets.out_packet import OutgoingPacket
 from wcps_auth.packets.packet_list import PacketList
 
 
-class InternalGameAuthentication(OutPacket):
+class InternalGameAuthentication(OutgoingPacket):
     def __init__(self, error_code, s=None):
-        super().__init__(
-            packet_id=PacketList.INTERNALGAMEAUTHENTICATION,
-            xor_key=InternalKeys.XOR_AUTH_SEND,
-        )
+        super().__init__(packet_id=PacketList.INTERNALGAMEAUTHENTICATION)
 
         if error_code != ErrorCodes.SUCCESS or not s:
             self.append(error_code)
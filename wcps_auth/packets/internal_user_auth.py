@@ -1,10 +1,10 @@
-from wcps_core.constants import ErrorCodes, InternalKeys
-from wcps_core.packets import OutPacket
+from wcps_core.constants import ErrorCodes
 
+from wcps_auth.packets.out_packet import OutgoingPacket
 from wcps_auth.packets.packet_list import PacketList
 
 
-class InternalClientAuthentication(OutPacket):
+class InternalClientAuthentication(OutgoingPacket):
     def __init__(
         self,
         error_code: ErrorCodes,
@@ -12,10 +12,7 @@ class InternalClientAuthentication(OutPacket):
         reported_session: int,
         reported_rights: int,
     ):
-        super().__init__(
-            packet_id=PacketList.INTERNALPLAYERAUTHENTICATION,
-            xor_key=InternalKeys.XOR_AUTH_SEND,
-        )
+        super().__init__(packet_id=PacketList.INTERNALPLAYERAUTHENTICATION)
         self.append(error_code)
         self.append(reported_user)
         self.append(reported_session)
@@ -1,9 +1,8 @@
-from wcps_core.packets import OutPacket
+from wcps_auth.packets.out_packet import OutgoingPacket
+from wcps_auth.packets.packet_list import PacketList
 
-from wcps_auth.packets.packet_list import PacketList, ClientXorKeys
 
-
-class Launcher(OutPacket):
+class Launcher(OutgoingPacket):
     def __init__(self):
-        super().__init__(packet_id=PacketList.LAUNCHER, xor_key=ClientXorKeys.SEND)
+        super().__init__(packet_id=PacketList.LAUNCHER)
         self.fill(0, 7)
@@ -0,0 +1,49 @@
+import time
+
+from wcps_auth.codec import get_codec
+from wcps_auth.packets.in_packet import (
+    BLOCK_SEPARATOR,
+    PACKET_TERMINATOR,
+    SPACE_PLACEHOLDER,
+)
+
+
+def ticks() -> int:
+    # Milliseconds, wrapped to a positive 32 bit int like the client's counter
+    return int(time.monotonic() * 1000) & 0x7FFFFFFF
+
+
+def format_block(block) -> str:
+    return str(block).replace(BLOCK_SEPARATOR, SPACE_PLACEHOLDER)
+
+
+class OutgoingPacket:
+    """
+    A packet to send, the counterpart of IncomingPacket.
+
+    build() returns the packet as text. Entities XOR everything queued for a
+    connection with its send key in one pass when the outbox is flushed, so
+    packets are not encoded one by one.
+    """
+
+    def __init__(self, packet_id: int):
+        self.packet_id = packet_id
+        self.blocks = []
+
+    def append(self, block) -> None:
+        self.blocks.append(format_block(block))
+
+    def fill(self, block, count: int) -> None:
+        self.blocks.extend([format_block(block)] * count)
+
+    def splice(self, blocks: str) -> None:
+        """Add blocks already formatted and joined with BLOCK_SEPARATOR"""
+        self.blocks.append(blocks)
+
+    def build(self) -> bytes:
+        fields = [str(ticks()), str(self.packet_id), *self.blocks, ""]
+        return (BLOCK_SEPARATOR.join(fields) + PACKET_TERMINATOR).encode("utf-8")
+
+    def encode(self, xor_key: int) -> bytes:
+        """The packet as sent on the wire with xor_key"""
+        return get_codec(xor_key).encode(self.build())
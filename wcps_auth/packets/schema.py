@@ -0,0 +1,161 @@
+"""
+Declarative layouts of inbound packets.
+
+Each handler declares the blocks it reads as a PacketSchema. The entity
+decodes every packet with it before the handler is queued, so a handler only
+ever sees a typed record whose fields passed their constraints, and a
+malformed packet costs neither a handler task nor a storage call.
+
+    PacketSchema(
+        "ServerListRequest",
+        None,  # block 0 is not read
+        None,
+        Field("username", min_length=3, alnum=True, error=ENTER_ID_ERROR),
+        Field("password", min_length=3, error=ENTER_PASSWORD_ERROR),
+        reply=PacketList.SERVER_LIST,
+    )
+"""
+
+
+class InvalidPacket(Exception):
+    """Raised when a packet does not match the schema of its handler"""
+
+    def __init__(self, message: str, schema, error_code: int = None):
+        super().__init__(message)
+        # Packet ID to report error_code with, if any
+        self.reply = schema.reply if error_code is not None else None
+        self.error_code = error_code
+        self.disconnect = schema.disconnect
+
+
+class Field:
+    """One block of a packet, converted to kind and checked"""
+
+    __slots__ = (
+        "name",
+        "kind",
+        "min_length",
+        "max_length",
+        "alnum",
+        "min_value",
+        "choices",
+        "error",
+        "too_long_error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        kind: type = str,
+        *,
+        min_length: int = 0,
+        max_length: int = None,
+        alnum: bool = False,
+        min_value: int = None,
+        choices=None,
+        error: int = None,
+        too_long_error: int = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.min_length = min_length
+        self.max_length = max_length
+        self.alnum = alnum
+        self.min_value = min_value
+        self.choices = frozenset(choices) if choices is not None else None
+        # Error code replied when the block is invalid, and when it is only
+        # too long if that has its own code
+        self.error = error
+        self.too_long_error = too_long_error
+
+    def decode(self, block: str):
+        """Returns the value of block. Raises ValueError with the reason"""
+        if self.max_length is not None and len(block) > self.max_length:
+            raise ValueError(f"longer than {self.max_length}")
+        if len(block) < self.min_length:
+            raise ValueError(f"shorter than {self.min_length}")
+        if self.alnum and not block.isalnum():
+            raise ValueError("not alphanumeric")
+
+        if self.kind is int:
+            # Unlike int(), no plus sign, spaces or underscores
+            digits = block[1:] if block.startswith("-") else block
+            if not digits.isdecimal():
+                raise ValueError("not a number")
+            value = int(block)
+            if self.min_value is not None and value < self.min_value:
+                raise ValueError(f"below {self.min_value}")
+        else:
+            value = block
+
+        if self.choices is not None and value not in self.choices:
+            raise ValueError("not an allowed value")
+        return value
+
+
+def _record_init(names: tuple):
+    # Generated like dataclasses do: plain assignments are several times
+    # faster than setattr in a loop, and a record is built per packet
+    arguments = "".join(f", {name}" for name in names)
+    body = "".join(f"    self.{name} = {name}\n" for name in names) or "    pass\n"
+    namespace = {}
+    exec(f"def __init__(self{arguments}):\n{body}", namespace)
+    return namespace["__init__"]
+
+
+class PacketRecord:
+    """Base of the records built by PacketSchema, one slot per field"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class PacketSchema:
+    """
+    Fields of a packet, by block position. None skips a block. reply is the
+    packet ID used to report Field.error codes, and disconnect whether the
+    connection is dropped after an invalid packet instead of only the packet.
+    Both are the defaults of PacketHandler.reject, which handlers override
+    where the receptor changes the answer.
+    """
+
+    __slots__ = ("record", "fields", "reply", "disconnect", "_indexed")
+
+    def __init__(self, name: str, *fields, reply: int = None, disconnect=True):
+        self.fields = fields
+        self.reply = reply
+        self.disconnect = disconnect
+        self._indexed = tuple(
+            (index, field) for index, field in enumerate(fields) if field is not None
+        )
+        names = tuple(field.name for _, field in self._indexed)
+        self.record = type(
+            name, (PacketRecord,), {"__slots__": names, "__init__": _record_init(names)}
+        )
+
+    def decode(self, blocks: list) -> PacketRecord:
+        """Decode and validate the blocks of a packet. Raises InvalidPacket"""
+        if len(blocks) < len(self.fields):
+            missing = [f for f in self.fields[len(blocks) :] if f is not None]
+            raise InvalidPacket(
+                f"{self.record.__name__}: {len(blocks)} of {len(self.fields)} blocks",
+                self,
+                missing[0].error if missing else None,
+            )
+
+        values = []
+        for index, field in self._indexed:
+            block = blocks[index]
+            try:
+                values.append(field.decode(block))
+            except ValueError as e:
+                error_code = field.error
+                if field.too_long_error is not None and len(block) > field.max_length:
+                    error_code = field.too_long_error
+                raise InvalidPacket(
+                    f"{self.record.__name__}.{field.name} {e}", self, error_code
+                ) from None
+        return self.record(*values)
@@ -0,0 +1,227 @@
+import abc
+import asyncio
+import concurrent.futures
+import hashlib
+import hmac
+import secrets
+
+from wcps_auth.config import settings
+
+
+class VerifierBusy(Exception):
+    """Raised when too many password checks are already pending"""
+
+
+class PasswordHasher(abc.ABC):
+    scheme = None
+    # Cheap hashes are checked on the event loop, a pool round-trip costs more
+    inline = False
+
+    @abc.abstractmethod
+    def hash(self, password: str, salt: str) -> str:
+        pass
+
+    @abc.abstractmethod
+    def identify(self, stored: str) -> bool:
+        pass
+
+    def verify(self, password: str, salt: str, stored: str) -> bool:
+        return hmac.compare_digest(self.hash(password, salt), stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        return False
+
+
+class Sha256Hasher(PasswordHasher):
+    # Legacy scheme: hex sha256 of password + salt column
+    scheme = "sha256"
+    inline = True
+
+    def hash(self, password: str, salt: str) -> str:
+        return hashlib.sha256(f"{password}{salt}".encode("utf-8")).hexdigest()
+
+    def identify(self, stored: str) -> bool:
+        return "$" not in stored
+
+
+class Pbkdf2Hasher(PasswordHasher):
+    # Stored as pbkdf2_sha256$<iterations>$<hex digest>
+    scheme = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 600000):
+        self.iterations = iterations
+
+    def hash(self, password: str, salt: str) -> str:
+        return self._hash(password, salt, self.iterations)
+
+    def _hash(self, password: str, salt: str, iterations: int) -> str:
+        digest = hashlib.pbkdf2_hmac(
+            "sha256", password.encode("utf-8"), salt.encode("utf-8"), iterations
+        )
+        return f"{self.scheme}${iterations}${digest.hex()}"
+
+    def identify(self, stored: str) -> bool:
+        return stored.startswith(f"{self.scheme}$")
+
+    def verify(self, password: str, salt: str, stored: str) -> bool:
+        try:
+            _, iterations, _ = stored.split("$")
+            iterations = int(iterations)
+        except ValueError:
+            return False
+        return hmac.compare_digest(self._hash(password, salt, iterations), stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        return stored.split("$")[1] != str(self.iterations)
+
+
+class ScryptHasher(PasswordHasher):
+    # Stored as scrypt$<n>$<r>$<p>$<hex digest>
+    scheme = "scrypt"
+
+    def __init__(self, n: int = 16384, r: int = 8, p: int = 1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def hash(self, password: str, salt: str) -> str:
+        return self._hash(password, salt, self.n, self.r, self.p)
+
+    def _hash(self, password: str, salt: str, n: int, r: int, p: int) -> str:
+        digest = hashlib.scrypt(
+            password.encode("utf-8"),
+            salt=salt.encode("utf-8"),
+            n=n,
+            r=r,
+            p=p,
+            maxmem=256 * n * r,
+        )
+        return f"{self.scheme}${n}${r}${p}${digest.hex()}"
+
+    def identify(self, stored: str) -> bool:
+        return stored.startswith(f"{self.scheme}$")
+
+    def verify(self, password: str, salt: str, stored: str) -> bool:
+        try:
+            _, n, r, p, _ = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            return False
+        return hmac.compare_digest(self._hash(password, salt, n, r, p), stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        return stored.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+
+class VerifyResult:
+    __slots__ = ("valid", "new_hash", "new_salt")
+
+    def __init__(self, valid: bool, new_hash: str = None, new_salt: str = None):
+        self.valid = valid
+        # Set when the stored hash should be replaced by the preferred scheme
+        self.new_hash = new_hash
+        self.new_salt = new_salt
+
+
+def _check_and_rehash(hasher, preferred, password, salt, stored):
+    # Runs in the worker pool, so it must stay a picklable module function
+    if not hasher.verify(password, salt, stored):
+        return VerifyResult(False)
+
+    if hasher.scheme == preferred.scheme and not preferred.needs_rehash(stored):
+        return VerifyResult(True)
+
+    new_salt = secrets.token_hex(16)
+    return VerifyResult(True, preferred.hash(password, new_salt), new_salt)
+
+
+class PasswordVerifier:
+    """
+    Checks passwords against any known scheme off the event loop.
+
+    Hashes that are not in the preferred scheme are upgraded on a successful
+    login: the result then carries the new hash and salt to store.
+    """
+
+    def __init__(
+        self,
+        hashers: list,
+        preferred: PasswordHasher,
+        executor: concurrent.futures.Executor,
+        max_pending: int,
+    ):
+        self.hashers = hashers
+        self.preferred = preferred
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    def identify(self, stored: str) -> PasswordHasher:
+        for hasher in self.hashers:
+            if hasher.identify(stored):
+                return hasher
+        return None
+
+    async def verify(self, password: str, salt: str, stored: str) -> VerifyResult:
+        hasher = self.identify(stored)
+        if hasher is None:
+            return VerifyResult(False)
+
+        if hasher.inline and self.preferred.inline:
+            return _check_and_rehash(hasher, self.preferred, password, salt, stored)
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise VerifierBusy(f"{self.pending} password checks pending")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                _check_and_rehash,
+                hasher,
+                self.preferred,
+                password,
+                salt,
+                stored,
+            )
+        finally:
+            self.pending -= 1
+
+
+_verifier = None
+
+
+def get_password_verifier() -> PasswordVerifier:
+    global _verifier
+    if _verifier is None:
+        config = settings()
+        hashers = [
+            Sha256Hasher(),
+            Pbkdf2Hasher(config.pbkdf2_iterations),
+            ScryptHasher(config.scrypt_n, config.scrypt_r, config.scrypt_p),
+        ]
+        schemes = {hasher.scheme: hasher for hasher in hashers}
+        preferred = schemes.get(config.password_scheme)
+        if preferred is None:
+            raise ValueError(
+                f"Unknown password_scheme {config.password_scheme!r}, "
+                f"expected one of: {', '.join(schemes)}"
+            )
+
+        if config.password_executor == "process":
+            executor = concurrent.futures.ProcessPoolExecutor(config.password_workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                config.password_workers, thread_name_prefix="password"
+            )
+
+        _verifier = PasswordVerifier(
+            hashers,
+            preferred,
+            executor,
+            max_pending=config.password_workers + config.password_queue_depth,
+        )
+    return _verifier
@@ -0,0 +1,167 @@
+"""
+On-demand profiling.
+
+- Handler timing splits each handler's wall time into time running on the
+  event loop and time awaiting (database, password pool, other sessions),
+  per handler class. It is on while handler_profiling is set or a CPU
+  profile window is open, and costs one flag check per packet otherwise.
+- SIGUSR1 opens a cProfile window of profile_window seconds and writes the
+  result to profile_dir, both as a .prof file for pstats/snakeviz and as a
+  text summary.
+- SIGUSR2 starts tracemalloc; sending it again writes a snapshot of the top
+  allocations to profile_dir and stops tracing.
+"""
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+import types
+
+from wcps_auth import metrics
+
+handler_busy_seconds = metrics.registry.histogram(
+    "wcps_handler_busy_seconds",
+    "Time a handler ran on the event loop, with handler profiling on",
+    ("handler",),
+)
+handler_await_seconds = metrics.registry.histogram(
+    "wcps_handler_await_seconds",
+    "Time a handler spent awaiting, with handler profiling on",
+    ("handler",),
+)
+
+# Checked by PacketDispatcher before every handler
+handler_timing = False
+# Set from settings by install()
+handler_profiling = False
+profile_dir = "profiles"
+tracemalloc_frames = 10
+
+_cpu_profiler = None
+
+
+@types.coroutine
+def _stepped(coroutine, durations: list):
+    # Drives coroutine like a Task would, timing each step between awaits.
+    # durations receives the time spent running, excluding suspensions
+    busy = 0.0
+    value, error = None, None
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                if error is None:
+                    future = coroutine.send(value)
+                else:
+                    future = coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                busy += time.perf_counter() - start
+
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+    finally:
+        durations.append(busy)
+
+
+async def profile_handler(handler_name: str, coroutine):
+    """Await coroutine, recording its busy and await time under handler_name"""
+    durations = []
+    start = time.perf_counter()
+    try:
+        return await _stepped(coroutine, durations)
+    finally:
+        wall = time.perf_counter() - start
+        busy = durations[0] if durations else 0.0
+        handler_busy_seconds.labels(handler_name).observe(busy)
+        handler_await_seconds.labels(handler_name).observe(max(wall - busy, 0.0))
+
+
+def _output_path(kind: str, extension: str) -> str:
+    os.makedirs(profile_dir, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(profile_dir, f"{kind}-{timestamp}-{os.getpid()}.{extension}")
+
+
+def start_cpu_profile(seconds: float) -> bool:
+    """Profile the event loop thread for seconds. False if already running"""
+    global _cpu_profiler, handler_timing
+    if _cpu_profiler is not None:
+        logging.warning("A CPU profile is already running")
+        return False
+
+    _cpu_profiler = cProfile.Profile()
+    handler_timing = True
+    _cpu_profiler.enable()
+    asyncio.get_running_loop().call_later(seconds, stop_cpu_profile)
+    logging.info("CPU profile started for %ss", seconds)
+    return True
+
+
+def stop_cpu_profile() -> str:
+    global _cpu_profiler, handler_timing
+    profiler, _cpu_profiler = _cpu_profiler, None
+    if profiler is None:
+        return None
+
+    profiler.disable()
+    handler_timing = handler_profiling
+
+    path = _output_path("cpu", "prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+    with open(path[: -len(".prof")] + ".txt", "w") as output:
+        output.write(summary.getvalue())
+
+    logging.info("CPU profile written to %s", path)
+    return path
+
+
+def toggle_tracemalloc() -> str:
+    """Start tracing allocations, or dump a snapshot and stop if tracing"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(tracemalloc_frames)
+        logging.info("tracemalloc started, signal again to write a snapshot")
+        return None
+
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    path = _output_path("memory", "txt")
+    with open(path, "w") as output:
+        for stat in snapshot.statistics("traceback")[:50]:
+            output.write(f"{stat}\n")
+            for line in stat.traceback.format():
+                output.write(f"{line}\n")
+            output.write("\n")
+
+    logging.info("tracemalloc snapshot written to %s", path)
+    return path
+
+
+def install(config) -> None:
+    """Apply the profiling settings and listen for the profiling signals"""
+    global handler_timing, handler_profiling, profile_dir, tracemalloc_frames
+    handler_timing = handler_profiling = config.handler_profiling
+    profile_dir = config.profile_dir
+    tracemalloc_frames = config.tracemalloc_frames
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(
+            signal.SIGUSR1, start_cpu_profile, config.profile_window
+        )
+        loop.add_signal_handler(signal.SIGUSR2, toggle_tracemalloc)
+    except (AttributeError, NotImplementedError):
+        # No SIGUSR1/2 or no signal support in this event loop (Windows)
+        logging.warning("Profiling signals are not available on this platform")
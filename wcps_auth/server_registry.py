@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+
+from wcps_auth.database import get_server_list
+
+
+class GameServerRegistry:
+    """
+    In-memory copy of the game servers registered in the database.
+
+    Game server authentication checks against this copy, which is reloaded
+    in the background every refresh interval or right away after invalidate().
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(GameServerRegistry, cls).__new__(cls)
+            # set of (id, addr, port)
+            cls._instance._servers = frozenset()
+            cls._instance._last_refresh = None
+            cls._instance._refresh_requested = asyncio.Event()
+        return cls._instance
+
+    def load(self, servers: list) -> None:
+        self._servers = frozenset(servers)
+        self._last_refresh = time.monotonic()
+
+    async def refresh(self) -> None:
+        self.load(await get_server_list())
+
+    def invalidate(self) -> None:
+        # Wake up the refresh loop so the next check sees a fresh list
+        self._refresh_requested.set()
+
+    def is_registered(self, server_id, addr: str, port: int) -> bool:
+        return (server_id, addr, port) in self._servers
+
+    def __len__(self) -> int:
+        return len(self._servers)
+
+    @property
+    def last_refresh(self):
+        return self._last_refresh
+
+    async def run_refresh_loop(self, interval: float) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the last known list if the database is down
+                logging.error("Failed to refresh game server list: %s", e)
@@ -0,0 +1,306 @@
+"""
+Session state shared between processes in multi-core mode.
+
+The coordinator process keeps the real SessionManager and serves it to the
+client workers over a Unix socket with SessionStoreServer. Each worker
+installs a RemoteSessionManager as the SessionManager singleton, so handlers
+and entities are unchanged. Every call is executed by the coordinator under
+its session lock, so compound operations stay atomic across workers.
+
+Messages are JSON, one per line:
+
+    request   {"id": 1, "method": "replace_user_session", "args": [...]}
+    response  {"id": 1, "result": 7}  or  {"id": 1, "error": "..."}
+    push      {"push": "server_list", "version": 3, "section": "..."}
+    push      {"push": "stats", "stats": {...}}
+
+The server list section is pushed with its version whenever it changes, so
+building a ServerList packet in a worker never waits on the coordinator.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import stat
+
+from wcps_auth.session_table import MAX_USER_SESSIONS
+from wcps_auth.sessions import LoginState, SessionManager
+
+
+class SessionStoreError(Exception):
+    """Raised in a worker when the coordinator failed to run a call"""
+
+
+class SessionUser:
+    """What the coordinator keeps of a user logged in through a worker"""
+
+    __slots__ = ("username", "displayname", "rights", "session_id")
+
+    def __init__(self, username: str, displayname: str = "", rights: int = 0):
+        self.username = username
+        self.displayname = displayname
+        self.rights = rights
+        self.session_id = -1
+
+
+def _user_fields(user) -> list:
+    return [user.username, user.displayname, user.rights]
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class SessionStoreServer:
+    """Serves SessionManager to worker processes, run by the coordinator"""
+
+    # Pushed periodically so worker metrics report the shared session counts
+    STATS_INTERVAL = 5.0
+
+    def __init__(self, session_manager: SessionManager = None):
+        self.session_manager = session_manager or SessionManager()
+        self._writers = set()
+        self._server = None
+        self._path = None
+        self._stats_task = None
+        self.session_manager.add_server_list_listener(self._push_server_list)
+
+        self._methods = {
+            "authorize_user": self._authorize_user,
+            "replace_user_session": self._replace_user_session,
+            "is_user_authorized": self.session_manager.is_user_authorized,
+            "unauthorize_user": self.session_manager.unauthorize_user,
+            "get_login_state": self._get_login_state,
+            "get_user_session_id": self.session_manager.get_user_session_id,
+            "get_user_by_session_id": self._get_user_by_session_id,
+            "set_user_displayname": self.session_manager.set_user_displayname,
+        }
+
+    @property
+    def path(self) -> str:
+        """Unix socket the workers connect to, once started"""
+        return self._path
+
+    async def start(self, path: str) -> None:
+        # A socket left behind by a previous run would make the bind fail
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        self._server = await asyncio.start_unix_server(self._serve, path)
+        self._path = path
+        self._stats_task = asyncio.create_task(self._push_stats_loop())
+        logging.info("Session store listening on %s", path)
+
+    async def close(self) -> None:
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+        for writer in list(self._writers):
+            writer.close()
+        if self._server is not None:
+            server, self._server = self._server, None
+            server.close()
+            await server.wait_closed()
+            os.remove(self._path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        writer.write(self._server_list_message())
+        writer.write(self._stats_message())
+        try:
+            while line := await reader.readline():
+                writer.write(await self._handle(json.loads(line)))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logging.error("Session store client failed: %s", e)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle(self, request: dict) -> bytes:
+        method = self._methods.get(request.get("method"))
+        try:
+            if method is None:
+                raise SessionStoreError(f"Unknown method {request.get('method')}")
+            result = await method(*request.get("args", ()))
+        except Exception as e:
+            return _encode({"id": request.get("id"), "error": repr(e)})
+        return _encode({"id": request.get("id"), "result": result})
+
+    async def _authorize_user(self, fields):
+        user = SessionUser(*fields)
+        user.session_id = await self.session_manager.authorize_user(user)
+        return user.session_id
+
+    async def _replace_user_session(self, fields):
+        user = SessionUser(*fields)
+        session_id = await self.session_manager.replace_user_session(user)
+        if session_id is not None:
+            user.session_id = session_id
+        return session_id
+
+    async def _get_login_state(self, username):
+        state = await self.session_manager.get_login_state(username)
+        return [state.is_authorized, state.session_id, state.is_activated]
+
+    async def _get_user_by_session_id(self, session_id):
+        user = await self.session_manager.get_user_by_session_id(session_id)
+        if user is None:
+            return None
+        return _user_fields(user) + [session_id]
+
+    def _server_list_message(self) -> bytes:
+        return _encode(
+            {
+                "push": "server_list",
+                "version": self.session_manager.server_list_version,
+                "section": self.session_manager.get_server_list_section(),
+            }
+        )
+
+    def _stats_message(self) -> bytes:
+        return _encode({"push": "stats", "stats": self.session_manager.stats()})
+
+    def _push(self, message: bytes) -> None:
+        for writer in self._writers:
+            writer.write(message)
+
+    def _push_server_list(self) -> None:
+        if self._writers:
+            self._push(self._server_list_message())
+
+    async def _push_stats_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.STATS_INTERVAL)
+            if self._writers:
+                self._push(self._stats_message())
+
+
+class RemoteSessionManager:
+    """
+    SessionManager stand-in for worker processes, forwarding each call to
+    the coordinator's SessionStoreServer. Game servers only connect to the
+    coordinator, so the server side of the API is not available here.
+    """
+
+    def __init__(self, timeout: float = 5.0):
+        # Seconds a call may take, including waiting for the socket
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}
+        self._next_id = 0
+        self._server_list_version = -1
+        self._server_list_section = "0"
+        self._stats = {
+            "user_sessions": 0,
+            "server_sessions": 0,
+            "session_id_capacity": MAX_USER_SESSIONS,
+        }
+
+    async def connect(self, path: str) -> None:
+        self._reader, self._writer = await asyncio.open_unix_connection(path)
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def wait_closed(self) -> None:
+        """Returns once the connection to the coordinator is gone"""
+        await asyncio.shield(self._reader_task)
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self.wait_closed()
+
+    async def _call(self, method: str, *args):
+        if self._reader_task is None or self._reader_task.done():
+            raise ConnectionError("Not connected to the session store")
+
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        request = {"id": request_id, "method": method, "args": args}
+        self._writer.write(_encode(request))
+        try:
+            # A stalled coordinator must not hold logins, and their locks,
+            # forever. A late response finds no pending call and is dropped
+            async with asyncio.timeout(self.timeout):
+                await self._writer.drain()
+                return await future
+        except TimeoutError:
+            message = f"{method} timed out after {self.timeout}s"
+            raise SessionStoreError(message) from None
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_responses(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                message = json.loads(line)
+                push = message.get("push")
+                if push == "server_list":
+                    self._server_list_version = message["version"]
+                    self._server_list_section = message["section"]
+                elif push == "stats":
+                    self._stats = message["stats"]
+                else:
+                    self._resolve(message)
+        except (ConnectionError, ValueError) as e:
+            logging.error("Session store connection failed: %s", e)
+        finally:
+            lost = ConnectionError("Session store connection lost")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(lost)
+            self._pending.clear()
+
+    def _resolve(self, message: dict) -> None:
+        future = self._pending.pop(message["id"], None)
+        if future is None or future.done():
+            return
+        if "error" in message:
+            future.set_exception(SessionStoreError(message["error"]))
+        else:
+            future.set_result(message["result"])
+
+    async def authorize_user(self, user):
+        return await self._call("authorize_user", _user_fields(user))
+
+    async def replace_user_session(self, user):
+        return await self._call("replace_user_session", _user_fields(user))
+
+    async def is_user_authorized(self, username):
+        return await self._call("is_user_authorized", username)
+
+    async def unauthorize_user(self, username):
+        return await self._call("unauthorize_user", username)
+
+    async def get_login_state(self, username) -> LoginState:
+        return LoginState(*await self._call("get_login_state", username))
+
+    async def get_user_session_id(self, username):
+        return await self._call("get_user_session_id", username)
+
+    async def get_user_by_session_id(self, session_id):
+        # A copy: changes to it do not reach the coordinator
+        fields = await self._call("get_user_by_session_id", session_id)
+        if fields is None:
+            return None
+        user = SessionUser(*fields[:3])
+        user.session_id = fields[3]
+        return user
+
+    async def set_user_displayname(self, username, session_id, displayname) -> bool:
+        return await self._call(
+            "set_user_displayname", username, session_id, displayname
+        )
+
+    @property
+    def server_list_version(self):
+        return self._server_list_version
+
+    def get_server_list_section(self) -> str:
+        return self._server_list_section
+
+    def stats(self) -> dict:
+        # As of the coordinator's last push
+        return self._stats
@@ -0,0 +1,154 @@
+from array import array
+
+# The client and game servers carry user session IDs as a 15 bit value
+MAX_USER_SESSIONS = 32768
+
+
+class UserSession:
+    __slots__ = ("user", "session_id", "is_activated", "game_server")
+
+    def __init__(self, user, session_id: int):
+        self.user = user
+        self.session_id = session_id
+        self.is_activated = False
+        self.game_server = None
+
+
+class SessionIdAllocator:
+    """
+    O(1) allocator for the fixed [0, size) session ID space.
+
+    Free IDs are kept in a preallocated FIFO ring so a released ID is the last
+    one to be handed out again, and a bitmap tracks which IDs are in use.
+    Memory is fixed at creation time regardless of how full the space is.
+    """
+
+    __slots__ = ("_size", "_free", "_head", "_free_count", "_bitmap")
+
+    def __init__(self, size: int = MAX_USER_SESSIONS, first: int = 1):
+        self._size = size
+        # Same order the old rolling counter used: first, first + 1, ..., wrap
+        self._free = array("H", [(first + i) % size for i in range(size)])
+        self._head = 0
+        self._free_count = size
+        self._bitmap = bytearray((size + 7) // 8)
+
+    def __len__(self) -> int:
+        return self._size - self._free_count
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def is_allocated(self, session_id: int) -> bool:
+        if not 0 <= session_id < self._size:
+            return False
+        return bool(self._bitmap[session_id >> 3] & (1 << (session_id & 7)))
+
+    def allocate(self) -> int:
+        if self._free_count == 0:
+            raise Exception("No available session IDs for users")
+
+        session_id = self._free[self._head]
+        self._head = (self._head + 1) % self._size
+        self._free_count -= 1
+        self._bitmap[session_id >> 3] |= 1 << (session_id & 7)
+        return session_id
+
+    def release(self, session_id: int) -> None:
+        if not self.is_allocated(session_id):
+            raise ValueError(f"Session ID {session_id} is not allocated")
+
+        self._bitmap[session_id >> 3] &= ~(1 << (session_id & 7)) & 0xFF
+        self._free[(self._head + self._free_count) % self._size] = session_id
+        self._free_count += 1
+
+
+class SessionTable:
+    """
+    Array backed user session store.
+
+    Sessions live in a preallocated slot list indexed by session ID, with
+    username and game server indexes kept alongside. It does no locking of its
+    own: callers are expected to hold SessionManager's lock.
+    """
+
+    __slots__ = ("_slots", "_allocator", "_by_username", "_by_game_server")
+
+    def __init__(self, size: int = MAX_USER_SESSIONS):
+        self._slots = [None] * size
+        self._allocator = SessionIdAllocator(size)
+        self._by_username = {}
+        # game server session ID -> set(usernames)
+        self._by_game_server = {}
+
+    def __len__(self) -> int:
+        return len(self._by_username)
+
+    def __iter__(self):
+        return iter(self._by_username.values())
+
+    def __contains__(self, username) -> bool:
+        return username in self._by_username
+
+    @property
+    def capacity(self) -> int:
+        return self._allocator.size
+
+    def add(self, user) -> UserSession:
+        session_id = self._allocator.allocate()
+        session = UserSession(user, session_id)
+        self._slots[session_id] = session
+        self._by_username[user.username] = session
+        return session
+
+    def get(self, session_id) -> UserSession:
+        if isinstance(session_id, int) and 0 <= session_id < len(self._slots):
+            return self._slots[session_id]
+        return None
+
+    def get_by_username(self, username) -> UserSession:
+        return self._by_username.get(username)
+
+    def bind(self, session: UserSession, game_server) -> None:
+        username = session.user.username
+        previous_server = session.game_server
+        if previous_server is not None and previous_server != game_server:
+            self._unbind(username, previous_server)
+
+        session.game_server = game_server
+        if game_server is not None:
+            self._by_game_server.setdefault(game_server, set()).add(username)
+
+    def remove(self, username) -> UserSession:
+        session = self._by_username.pop(username, None)
+        if session is None:
+            return None
+
+        if session.game_server is not None:
+            self._unbind(username, session.game_server)
+
+        self._release(session)
+        return session
+
+    def remove_game_server(self, game_server) -> list:
+        removed = []
+        for username in self._by_game_server.pop(game_server, ()):
+            session = self._by_username.pop(username)
+            self._release(session)
+            removed.append(session)
+        return removed
+
+    def users_on_game_server(self, game_server) -> frozenset:
+        return frozenset(self._by_game_server.get(game_server, ()))
+
+    def _unbind(self, username, game_server) -> None:
+        bound_users = self._by_game_server.get(game_server)
+        if bound_users is not None:
+            bound_users.discard(username)
+            if not bound_users:
+                del self._by_game_server[game_server]
+
+    def _release(self, session: UserSession) -> None:
+        self._slots[session.session_id] = None
+        self._allocator.release(session.session_id)
@@ -1,6 +1,30 @@
 import asyncio
 import uuid
 
+from wcps_auth import metrics
+from wcps_auth.packets.in_packet import BLOCK_SEPARATOR
+from wcps_auth.packets.out_packet import format_block
+from wcps_auth.session_table import MAX_USER_SESSIONS, SessionTable
+
+
+class LoginState:
+    """Snapshot of a username's session taken under a single lock acquisition"""
+
+    __slots__ = ("is_authorized", "session_id", "is_activated")
+
+    def __init__(self, is_authorized=False, session_id=None, is_activated=False):
+        self.is_authorized = is_authorized
+        self.session_id = session_id
+        self.is_activated = is_activated
+
+
+class ActivationResult:
+    NOT_FOUND = 0
+    SESSION_MISMATCH = 1
+    ACTIVATED = 2
+    ALREADY_ACTIVATED = 3
+    ENDED = 4
+
 
 class SessionManager:
     _instance = None
@@ -9,46 +33,43 @@ class SessionManager:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(SessionManager, cls).__new__(cls)
-            cls._instance._user_sessions = {}
+            cls._instance._user_sessions = SessionTable(MAX_USER_SESSIONS)
             cls._instance._server_sessions = {}
-            cls._instance._user_session_id_counter = (
-                0  # Initialize counter within the allowed range
-            )
+            # Server list blocks sent on every login, rebuilt only when the
+            # servers change
+            cls._instance._server_list_version = 0
+            cls._instance._server_list_section = None
+            cls._instance._server_list_section_version = -1
+            # Called with no arguments whenever the server list changes
+            cls._instance._server_list_listeners = []
         return cls._instance
 
     async def authorize_user(self, user):
         async with self._lock:
-            if user.username in self._user_sessions:
-                return self._user_sessions[user.username]["session_id"]
-
-            if (
-                len(self._user_sessions) >= 32768
-            ):  # Check if all possible session IDs are used
-                raise Exception("No available session IDs for users")
-
-            # Generate a new session ID within the range [0, 32767]
-            session_id = self._generate_user_session_id()
-            self._user_sessions[user.username] = {
-                "user": user,
-                "session_id": session_id,
-                "is_activated": False,
-                "game_server": None
-            }
-            return session_id
+            session = self._user_sessions.get_by_username(user.username)
+            if session is not None:
+                return session.session_id
 
-    def _generate_user_session_id(self):
-        used_ids = {session["session_id"] for session in self._user_sessions.values()}
-        for _ in range(
-            32768
-        ):  # 32768 is the total number of unique session IDs available
-            self._user_session_id_counter += 1
-            if self._user_session_id_counter > 32767:
-                self._user_session_id_counter = 0
+            # Raises if all possible session IDs are used
+            session = self._user_sessions.add(user)
+            return session.session_id
 
-            if self._user_session_id_counter not in used_ids:
-                return self._user_session_id_counter
+    async def replace_user_session(self, user):
+        """
+        Authorize user, replacing any session of the same username that was
+        never activated by a game server. Returns the new session ID, or None
+        when the username already has an activated session.
+        """
+        async with self._lock:
+            session = self._user_sessions.get_by_username(user.username)
+            if session is not None:
+                if session.is_activated:
+                    return None
+                self._user_sessions.remove(user.username)
 
-        raise Exception("No available session IDs for users")
+            # Raises if all possible session IDs are used
+            session = self._user_sessions.add(user)
+            return session.session_id
 
     async def authorize_server(self, server):
         async with self._lock:
@@ -60,6 +81,7 @@ class SessionManager:
                 "server": server,
                 "session_id": session_id,
             }
+            self._server_list_changed()
             return session_id
 
     async def is_user_authorized(self, username):
@@ -72,59 +94,166 @@ class SessionManager:
 
     async def unauthorize_user(self, username):
         async with self._lock:
-            if username in self._user_sessions:
-                del self._user_sessions[username]
+            self._user_sessions.remove(username)
 
     async def unauthorize_server(self, server_id):
         async with self._lock:
-            server_session = self._server_sessions.get(server_id)
-            session_id = server_session["session_id"]
-            # Remove the server session from _server_sessions
-            if server_id in self._server_sessions:
-                del self._server_sessions[server_id]
-
-            # Remove all user sessions associated with this server_id
-            users_to_remove = [
-                username
-                for username, session in self._user_sessions.items()
-                if session.get("game_server") == session_id
-                ]
-
-        for username in users_to_remove:
-            del self._user_sessions[username]
+            server_session = self._server_sessions.pop(server_id, None)
+            if server_session is None:
+                return
+            self._server_list_changed()
+
+            # Remove all user sessions associated with this server
+            self._user_sessions.remove_game_server(server_session["session_id"])
 
     def get_all_authorized_users(self):
-        return list(self._user_sessions.values())
+        return list(self._user_sessions)
 
     def get_all_authorized_servers(self):
         return list(self._server_sessions.values())
 
+    def mark_servers_changed(self):
+        # Call when a server reports data shown in the server list
+        self._server_list_changed()
+
+    def add_server_list_listener(self, callback):
+        self._server_list_listeners.append(callback)
+
+    def _server_list_changed(self):
+        self._server_list_version += 1
+        for callback in self._server_list_listeners:
+            callback()
+
+    @property
+    def server_list_version(self):
+        return self._server_list_version
+
+    def stats(self) -> dict:
+        return {
+            "user_sessions": len(self._user_sessions),
+            "server_sessions": len(self._server_sessions),
+            "session_id_capacity": self._user_sessions.capacity,
+        }
+
+    def get_server_list_section(self) -> str:
+        """
+        Blocks describing the authorized servers in the ServerList packet:
+        the server count followed by six fields per server. They are formatted
+        and joined once per server list change, and every reply splices them
+        in as they are.
+        """
+        if self._server_list_section_version != self._server_list_version:
+            section = [len(self._server_sessions)]
+            for session in self._server_sessions.values():
+                s = session["server"]
+                section.extend(
+                    (
+                        s.id,
+                        s.name,
+                        s.address,
+                        s.port,
+                        # Current pop. Assumed to be x/3600. In the future, maybe
+                        # do fractions for servers with smaller capacity
+                        s.current_players,
+                        s.server_type,
+                    )
+                )
+            self._server_list_section = BLOCK_SEPARATOR.join(map(format_block, section))
+            self._server_list_section_version = self._server_list_version
+        return self._server_list_section
+
+    async def get_login_state(self, username) -> LoginState:
+        async with self._lock:
+            session = self._user_sessions.get_by_username(username)
+            if session is None:
+                return LoginState()
+            return LoginState(True, session.session_id, session.is_activated)
+
+    async def check_and_activate_user_session(
+        self, username, session_id, game_server_id, end_connection=False
+    ):
+        """
+        Validate a game server's report of (username, session_id) and activate
+        the session in one step. When end_connection is set, an activated
+        session is closed instead. Returns an ActivationResult value.
+        """
+        async with self._lock:
+            session = self._user_sessions.get_by_username(username)
+            if session is None:
+                return ActivationResult.NOT_FOUND
+
+            if session.session_id != session_id:
+                return ActivationResult.SESSION_MISMATCH
+
+            if session.is_activated:
+                if end_connection:
+                    self._user_sessions.remove(username)
+                    return ActivationResult.ENDED
+                return ActivationResult.ALREADY_ACTIVATED
+
+            session.is_activated = True
+            self._user_sessions.bind(session, game_server_id)
+            return ActivationResult.ACTIVATED
+
     async def get_user_session_id(self, username):
         async with self._lock:
-            if username in self._user_sessions:
-                return self._user_sessions[username]["session_id"]
-            else:
-                return None
+            session = self._user_sessions.get_by_username(username)
+            if session is not None:
+                return session.session_id
+            return None
 
     async def get_user_by_session_id(self, session_id):
         async with self._lock:
-            for session in self._user_sessions.values():
-                if session["session_id"] == session_id:
-                    return session["user"]
+            session = self._user_sessions.get(session_id)
+            if session is not None:
+                return session.user
             return None
 
+    async def set_user_displayname(self, username, session_id, displayname) -> bool:
+        async with self._lock:
+            session = self._user_sessions.get_by_username(username)
+            if session is None or session.session_id != session_id:
+                return False
+            session.user.displayname = displayname
+            return True
+
     async def activate_user_session(self, session_id, game_server_id):
         async with self._lock:
-            for session in self._user_sessions.values():
-                if session["session_id"] == session_id:
-                    session["is_activated"] = True
-                    session["game_server"] = game_server_id
-                    return True
-            return False
+            session = self._user_sessions.get(session_id)
+            if session is None:
+                return False
+
+            session.is_activated = True
+            self._user_sessions.bind(session, game_server_id)
+            return True
 
     async def is_user_session_activated(self, session_id):
         async with self._lock:
-            for session in self._user_sessions.values():
-                if session["session_id"] == session_id:
-                    return session["is_activated"]
+            session = self._user_sessions.get(session_id)
+            if session is not None:
+                return session.is_activated
             return False
+
+
+def _session_metrics():
+    stats = SessionManager().stats()
+    return [
+        (("user",), stats["user_sessions"]),
+        (("server",), stats["server_sessions"]),
+    ]
+
+
+def _session_id_utilization():
+    stats = SessionManager().stats()
+    return [((), stats["user_sessions"] / stats["session_id_capacity"])]
+
+
+metrics.registry.callback(
+    "wcps_sessions", "Authorized sessions", ("kind",), _session_metrics
+)
+metrics.registry.callback(
+    "wcps_session_id_utilization",
+    f"Fraction of the {MAX_USER_SESSIONS} user session IDs in use",
+    (),
+    _session_id_utilization,
+)
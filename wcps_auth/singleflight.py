@@ -0,0 +1,60 @@
+import asyncio
+import contextlib
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key: while a call for a key is in
+    flight, later callers wait for and share its result (or exception)
+    instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key, coroutine_function, *args):
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(coroutine_function(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        # A cancelled caller must not cancel the call the others wait for
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+class KeyedLocks:
+    """asyncio.Lock per key, dropped once nobody holds or waits for it"""
+
+    def __init__(self):
+        # key -> [lock, holders and waiters]
+        self._locks = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
@@ -0,0 +1,24 @@
+from .base import StorageBackend
+
+
+def create_storage(config) -> StorageBackend:
+    """Build the backend named by config.storage_backend"""
+    # Backends are imported lazily so their drivers stay optional
+    if config.storage_backend == "mysql":
+        from .mysql import MySQLStorage
+
+        return MySQLStorage(config)
+    elif config.storage_backend == "sqlite":
+        from .sqlite import SQLiteStorage
+
+        return SQLiteStorage(config.sqlite_path)
+    elif config.storage_backend == "memory":
+        from .memory import MemoryStorage
+
+        storage = MemoryStorage()
+        storage.seed_benchmark_data(
+            config.memory_seed_users, config.memory_seed_servers
+        )
+        return storage
+    else:
+        raise ValueError(f"Unknown storage backend: {config.storage_backend}")
@@ -0,0 +1,49 @@
+import abc
+
+
+class StorageBackend(abc.ABC):
+    """
+    Persistence used by the authentication server.
+
+    User records are dicts with id, username, displayname, password, salt and
+    rights. Servers are (id, addr, port) tuples of the active servers.
+    """
+
+    # Longest password hash the users table holds, None when unbounded. Set
+    # by connect() where the schema is not created by the backend itself
+    password_max_length = None
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def log_stats(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get_server_list(self) -> list:
+        pass
+
+    @abc.abstractmethod
+    async def fetch_user_details(self, username: str) -> dict:
+        pass
+
+    @abc.abstractmethod
+    async def displayname_exists(self, displayname: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    async def claim_displayname(self, username: str, new_displayname: str) -> bool:
+        """Set the displayname unless another user has it. Returns if it did"""
+
+    @abc.abstractmethod
+    async def update_displayname(self, username: str, new_displayname: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    async def update_password(
+        self, username: str, new_password: str, new_salt: str
+    ) -> bool:
+        pass
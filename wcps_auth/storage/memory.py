@@ -0,0 +1,114 @@
+import hashlib
+
+from wcps_auth.storage.base import StorageBackend
+
+# Seeded accounts are bench<i>, password bench<i>. Seeded game servers are
+# bench<i> with ID <i> on 127.0.0.1:BENCH_SERVER_BASE_PORT + i
+BENCH_PREFIX = "bench"
+BENCH_SALT = "bench"
+BENCH_SERVER_BASE_PORT = 5340
+
+
+def bench_username(index: int) -> str:
+    return f"{BENCH_PREFIX}{index}"
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Process-local storage with no external services. Data is lost on exit,
+    it is meant for load tests and local benchmarking.
+    """
+
+    def __init__(self):
+        self._users = {}
+        # displayname -> username
+        self._displaynames = {}
+        # server id -> (id, addr, port, active)
+        self._servers = {}
+
+    async def add_user(
+        self,
+        username: str,
+        password: str,
+        salt: str,
+        displayname: str = "",
+        rights: int = 1,
+    ) -> dict:
+        return self._insert_user(username, password, salt, displayname, rights)
+
+    async def add_server(self, server_id, addr: str, port: int, active: bool = True):
+        self._insert_server(server_id, addr, port, active)
+
+    # Seeding runs before any event loop, so it writes through these directly
+    def _insert_user(
+        self, username: str, password: str, salt: str, displayname: str, rights: int
+    ) -> dict:
+        this_user = {
+            "id": len(self._users) + 1,
+            "username": username,
+            "displayname": displayname,
+            "password": password,
+            "salt": salt,
+            "rights": rights,
+        }
+        self._users[username] = this_user
+        if displayname:
+            self._displaynames[displayname] = username
+        return this_user
+
+    def _insert_server(self, server_id, addr: str, port: int, active: bool):
+        self._servers[server_id] = (server_id, addr, port, active)
+
+    def seed_benchmark_data(self, users: int, servers: int) -> None:
+        # Accounts and game servers the load generator logs in with
+        for index in range(users):
+            username = bench_username(index)
+            password = hashlib.sha256(f"{username}{BENCH_SALT}".encode("utf-8"))
+            self._insert_user(username, password.hexdigest(), BENCH_SALT, "", 1)
+
+        for index in range(1, servers + 1):
+            self._insert_server(
+                str(index), "127.0.0.1", BENCH_SERVER_BASE_PORT + index, True
+            )
+
+    async def get_server_list(self) -> list:
+        return [
+            (server_id, addr, port)
+            for server_id, addr, port, active in self._servers.values()
+            if active
+        ]
+
+    async def fetch_user_details(self, username: str) -> dict:
+        this_user = self._users.get(username)
+        # Callers get a copy, like a fresh row from a database
+        return dict(this_user) if this_user is not None else None
+
+    async def displayname_exists(self, displayname: str) -> bool:
+        return displayname in self._displaynames
+
+    async def claim_displayname(self, username: str, new_displayname: str) -> bool:
+        owner = self._displaynames.get(new_displayname)
+        if username not in self._users or (owner is not None and owner != username):
+            return False
+        return await self.update_displayname(username, new_displayname)
+
+    async def update_displayname(self, username: str, new_displayname: str) -> bool:
+        this_user = self._users.get(username)
+        if this_user is None:
+            return False
+
+        self._displaynames.pop(this_user["displayname"], None)
+        this_user["displayname"] = new_displayname
+        self._displaynames[new_displayname] = username
+        return True
+
+    async def update_password(
+        self, username: str, new_password: str, new_salt: str
+    ) -> bool:
+        this_user = self._users.get(username)
+        if this_user is None:
+            return False
+
+        this_user["password"] = new_password
+        this_user["salt"] = new_salt
+        return True
@@ -0,0 +1,222 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+import aiomysql
+from pymysql.constants import CLIENT, ER
+
+from wcps_auth import metrics
+from wcps_auth.storage.base import StorageBackend
+
+
+# claim_displayname is only race-free with this index. Players without a
+# displayname must have it NULL rather than '', which the index would count
+# as a duplicate; the SQLite schema uses a partial index instead
+DISPLAYNAME_INDEX = "CREATE UNIQUE INDEX users_displayname ON users (displayname)"
+
+# A claim that loses a row lock to a concurrent one fails with these
+LOCK_ERRORS = (ER.LOCK_DEADLOCK, ER.LOCK_WAIT_TIMEOUT)
+
+
+def generate_servers_addresses(query_results: list) -> list:
+    server_list = []
+    for candidate_server in query_results:
+        # Each result is a tuple of 4 fields
+        server_id, addr, port, active = candidate_server
+        server_list.append((server_id, addr, port))
+
+    return server_list
+
+
+class MySQLStorage(StorageBackend):
+    def __init__(self, config):
+        self.config = config
+        self.pool = None
+        # query name -> [checkouts, total wait, max wait], wait times in seconds
+        self.pool_wait_stats = {}
+
+    async def connect(self) -> None:
+        config = self.config
+        # The database is selected once per connection, at connect time
+        self.pool = await aiomysql.create_pool(
+            host=config.database_ip,
+            port=config.database_port,
+            user=config.database_user,
+            password=config.database_password,
+            db=config.database_name,
+            minsize=config.database_pool_minsize,
+            maxsize=config.database_pool_maxsize,
+            pool_recycle=config.database_pool_recycle,
+            connect_timeout=config.database_connect_timeout,
+            # rowcount counts matched rows, not only changed ones: a user
+            # claiming the displayname they already have still succeeds
+            client_flag=CLIENT.FOUND_ROWS,
+            loop=asyncio.get_event_loop(),
+        )
+        await self.warm_pool()
+        await self.check_displayname_index()
+        self.password_max_length = await self.fetch_password_max_length()
+
+    async def close(self) -> None:
+        self.pool.close()
+        await self.pool.wait_closed()
+
+    async def warm_pool(self) -> None:
+        # Check out minsize connections at once so none is opened on first use
+        async def ping(connection):
+            async with connection.cursor() as cur:
+                await cur.execute("SELECT 1")
+
+        connections = [await self.pool.acquire() for _ in range(self.pool.minsize)]
+        try:
+            await asyncio.gather(*(ping(connection) for connection in connections))
+        finally:
+            for connection in connections:
+                self.pool.release(connection)
+
+    async def check_displayname_index(self) -> None:
+        async with self.acquire("check_displayname_index") as connection:
+            async with connection.cursor() as cur:
+                await cur.execute(
+                    "SELECT COUNT(*) FROM information_schema.STATISTICS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users' "
+                    "AND COLUMN_NAME = 'displayname' AND SEQ_IN_INDEX = 1 "
+                    "AND NON_UNIQUE = 0"
+                )
+                (count,) = await cur.fetchone()
+        if not count:
+            logging.warning(
+                "users.displayname has no unique index, two players claiming the "
+                "same nickname at once may both get it. Create it with: %s",
+                DISPLAYNAME_INDEX,
+            )
+
+    async def fetch_password_max_length(self) -> int:
+        # In non-strict mode MySQL truncates a longer value instead of failing
+        async with self.acquire("fetch_password_max_length") as connection:
+            async with connection.cursor() as cur:
+                await cur.execute(
+                    "SELECT CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users' "
+                    "AND COLUMN_NAME = 'password'"
+                )
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, query_name: str):
+        start = time.perf_counter()
+        async with self.pool.acquire() as connection:
+            wait = time.perf_counter() - start
+            metrics.pool_wait_seconds.labels(query_name).observe(wait)
+            stats = self.pool_wait_stats.get(query_name)
+            if stats is None:
+                stats = self.pool_wait_stats[query_name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += wait
+            if wait > stats[2]:
+                stats[2] = wait
+            yield connection
+
+    def log_stats(self) -> None:
+        for query_name, stats in self.pool_wait_stats.items():
+            checkouts, total_wait, max_wait = stats
+            logging.info(
+                "Pool wait %s: %d checkouts, avg %.2f ms, max %.2f ms",
+                query_name,
+                checkouts,
+                total_wait / checkouts * 1000,
+                max_wait * 1000,
+            )
+
+    async def get_server_list(self) -> list:
+        async with self.acquire("get_server_list") as connection:
+            async with connection.cursor() as cur:
+                await cur.execute("SELECT * FROM servers WHERE active = 1")
+                results = await cur.fetchall()
+                server_list = generate_servers_addresses(results)
+                return server_list
+
+    async def fetch_user_details(self, username: str) -> dict:
+        async with self.acquire("fetch_user_details") as connection:
+            async with connection.cursor() as cur:
+                query = "SELECT * FROM users WHERE username = %s"
+                await cur.execute(query, (username,))
+                user_details = await cur.fetchall()
+                # By default a tuple is recieved
+                if user_details:
+                    user_details = user_details[0]
+                    if len(user_details) == 6:
+                        this_user = {
+                            "id": int(user_details[0]),
+                            "username": user_details[1],
+                            "displayname": user_details[2],
+                            "password": user_details[3],
+                            "salt": user_details[4],
+                            "rights": int(user_details[5]),
+                        }
+                        return this_user
+                    else:
+                        # TODO: Improper db format
+                        logging.error("Improper database schema")
+                        return None
+                else:
+                    return None
+
+    async def displayname_exists(self, displayname: str) -> bool:
+        async with self.acquire("displayname_exists") as connection:
+            async with connection.cursor() as cur:
+                await cur.execute(
+                    "SELECT COUNT(*) FROM users WHERE displayname=%s",
+                    (displayname,)
+                )
+                (count,) = await cur.fetchone()
+                return count > 0
+
+    async def claim_displayname(self, username: str, new_displayname: str) -> bool:
+        # Single statement. The unique index on users.displayname, see
+        # DISPLAYNAME_INDEX, makes this race-free: the loser of a concurrent
+        # claim gets a duplicate key error, or a lock error from the self-join
+        async with self.acquire("claim_displayname") as connection:
+            async with connection.cursor() as cur:
+                query = (
+                    "UPDATE users AS claimant "
+                    "LEFT JOIN users AS owner "
+                    "ON owner.displayname = %s AND owner.username <> claimant.username "
+                    "SET claimant.displayname = %s "
+                    "WHERE claimant.username = %s AND owner.username IS NULL"
+                )
+                try:
+                    await cur.execute(
+                        query, (new_displayname, new_displayname, username)
+                    )
+                    await connection.commit()
+                except aiomysql.IntegrityError:
+                    await connection.rollback()
+                    return False
+                except aiomysql.OperationalError as e:
+                    if e.args[0] not in LOCK_ERRORS:
+                        raise
+                    await connection.rollback()
+                    return False
+                return cur.rowcount == 1
+
+    async def update_displayname(self, username: str, new_displayname: str) -> bool:
+        async with self.acquire("update_displayname") as connection:
+            async with connection.cursor() as cur:
+                # Update the displayname securely using a parameterized query
+                query = "UPDATE users SET displayname=%s WHERE username=%s"
+                await cur.execute(query, (new_displayname, username))
+                await connection.commit()
+                return True
+
+    async def update_password(
+        self, username: str, new_password: str, new_salt: str
+    ) -> bool:
+        async with self.acquire("update_password") as connection:
+            async with connection.cursor() as cur:
+                query = "UPDATE users SET password=%s, salt=%s WHERE username=%s"
+                await cur.execute(query, (new_password, new_salt, username))
+                await connection.commit()
+                return True
@@ -0,0 +1,154 @@
+import asyncio
+import concurrent.futures
+import sqlite3
+
+from wcps_auth.storage.base import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS servers (
+    id TEXT PRIMARY KEY,
+    addr TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    displayname TEXT,
+    password TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    rights INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_displayname ON users (displayname)
+    WHERE displayname IS NOT NULL AND displayname <> '';
+"""
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    SQLite storage with the same tables as the MySQL schema, created if
+    missing. The sqlite3 module blocks, so every query runs on a single
+    dedicated thread, which also serializes writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix="sqlite"
+        )
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def connect(self) -> None:
+        await self._run(self._connect)
+
+    def _connect(self) -> None:
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    async def close(self) -> None:
+        await self._run(self._db.close)
+        self._executor.shutdown()
+
+    def _execute(self, query: str, parameters=()) -> sqlite3.Cursor:
+        cursor = self._db.execute(query, parameters)
+        self._db.commit()
+        return cursor
+
+    async def get_server_list(self) -> list:
+        def query():
+            return self._db.execute(
+                "SELECT id, addr, port FROM servers WHERE active = 1"
+            ).fetchall()
+
+        return await self._run(query)
+
+    async def fetch_user_details(self, username: str) -> dict:
+        def query():
+            return self._db.execute(
+                "SELECT id, username, displayname, password, salt, rights "
+                "FROM users WHERE username = ?",
+                (username,),
+            ).fetchone()
+
+        row = await self._run(query)
+        if row is None:
+            return None
+        return {
+            "id": int(row[0]),
+            "username": row[1],
+            "displayname": row[2] or "",
+            "password": row[3],
+            "salt": row[4],
+            "rights": int(row[5]),
+        }
+
+    async def displayname_exists(self, displayname: str) -> bool:
+        def query():
+            return self._db.execute(
+                "SELECT COUNT(*) FROM users WHERE displayname = ?", (displayname,)
+            ).fetchone()[0]
+
+        return await self._run(query) > 0
+
+    async def claim_displayname(self, username: str, new_displayname: str) -> bool:
+        def query():
+            try:
+                return self._execute(
+                    "UPDATE users SET displayname = ? WHERE username = ? "
+                    "AND NOT EXISTS (SELECT 1 FROM users "
+                    "WHERE displayname = ? AND username <> ?)",
+                    (new_displayname, username, new_displayname, username),
+                ).rowcount
+            except sqlite3.IntegrityError:
+                self._db.rollback()
+                return 0
+
+        return await self._run(query) == 1
+
+    async def update_displayname(self, username: str, new_displayname: str) -> bool:
+        await self._run(
+            self._execute,
+            "UPDATE users SET displayname = ? WHERE username = ?",
+            (new_displayname, username),
+        )
+        return True
+
+    async def update_password(
+        self, username: str, new_password: str, new_salt: str
+    ) -> bool:
+        await self._run(
+            self._execute,
+            "UPDATE users SET password = ?, salt = ? WHERE username = ?",
+            (new_password, new_salt, username),
+        )
+        return True
+
+    async def add_user(
+        self,
+        username: str,
+        password: str,
+        salt: str,
+        displayname: str = "",
+        rights: int = 1,
+    ) -> None:
+        await self._run(
+            self._execute,
+            "INSERT INTO users (username, displayname, password, salt, rights) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (username, displayname, password, salt, rights),
+        )
+
+    async def add_server(
+        self, server_id, addr: str, port: int, active: bool = True
+    ) -> None:
+        await self._run(
+            self._execute,
+            "INSERT OR REPLACE INTO servers (id, addr, port, active) "
+            "VALUES (?, ?, ?, ?)",
+            (server_id, addr, port, int(active)),
+        )
@@ -0,0 +1,204 @@
+"""
+Network layer built on asyncio.BufferedProtocol, and event loop selection.
+
+With network_layer = "protocol", listeners are created with
+loop.create_server instead of asyncio.start_server. The event loop then
+receives straight into a preallocated buffer (get_buffer/buffer_updated) and
+entities are fed from the protocol callbacks, with no reader task per
+connection. Replies are written directly to the transport through a
+ProtocolWriter, whose drain() only waits while the transport is paused.
+
+Entities are built the same way in both layers, with reader=None here, so
+User and GameServer, and the handlers using them, do not depend on the layer.
+"""
+
+import asyncio
+import logging
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+class ProtocolWriter:
+    """The part of asyncio.StreamWriter that entities use, over a transport"""
+
+    __slots__ = ("transport", "_paused", "_waiters", "_exception")
+
+    def __init__(self, transport: asyncio.Transport):
+        self.transport = transport
+        self._paused = False
+        self._waiters = []
+        self._exception = None
+
+    def write(self, data) -> None:
+        self.transport.write(data)
+
+    def writelines(self, data) -> None:
+        self.transport.writelines(data)
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def drain(self) -> None:
+        if self._exception is not None:
+            raise self._exception
+        if not self._paused:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await waiter
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        self._wake(None)
+
+    def connection_lost(self, exc) -> None:
+        self._exception = exc or ConnectionResetError("Connection lost")
+        self._wake(self._exception)
+
+    def _wake(self, exc) -> None:
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+
+class EntityProtocol(asyncio.BufferedProtocol):
+    """
+    Drives one entity from transport callbacks. The receive buffer belongs
+    to the listener: buffer_updated hands the bytes to the entity's framer,
+    which copies what it keeps, before the loop reads into it again.
+    """
+
+    def __init__(self, entity_class, admission, buffer: memoryview):
+        self.entity_class = entity_class
+        self.admission = admission
+        self.entity = None
+        self._buffer = buffer
+        self._loop = None
+        self._writer = None
+        self._ip = None
+        self._connected_at = 0.0
+        self._last_read = 0.0
+        self._timeout = None
+        self._closing = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        peername = transport.get_extra_info("peername")
+        self._ip = peername[0] if peername else None
+        if not self.admission.admit(self._ip):
+            transport.abort()
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._connected_at = self._last_read = self._loop.time()
+        self._writer = ProtocolWriter(transport)
+        self.entity = self.entity_class(None, self._writer)
+        self.entity.listen_task.add_done_callback(
+            lambda _: self.admission.release(self._ip)
+        )
+        self._schedule_timeout()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._buffer
+
+    def buffer_updated(self, nbytes: int) -> None:
+        if self._closing is not None:
+            return
+        self._last_read = self._loop.time()
+        if not self.entity.feed(self._buffer[:nbytes]):
+            self._drop()
+
+    def eof_received(self):
+        # Returning None lets the transport close itself
+        return None
+
+    def pause_writing(self) -> None:
+        self._writer.pause_writing()
+
+    def resume_writing(self) -> None:
+        self._writer.resume_writing()
+
+    def connection_lost(self, exc) -> None:
+        if self.entity is None:
+            # Rejected by admission control
+            return
+        self._writer.connection_lost(exc)
+        self._drop()
+
+    def _deadline(self):
+        entity = self.entity
+        if entity.awaiting_handshake and entity.handshake_timeout is not None:
+            return self._connected_at + entity.handshake_timeout
+        if entity.idle_timeout is not None:
+            return self._last_read + entity.idle_timeout
+        return None
+
+    def _schedule_timeout(self) -> None:
+        # One timer per connection, moved forward only when it fires, rather
+        # than rescheduled on every read
+        deadline = self._deadline()
+        if deadline is not None:
+            self._timeout = self._loop.call_at(deadline, self._on_timeout)
+
+    def _on_timeout(self) -> None:
+        self._timeout = None
+        deadline = self._deadline()
+        if deadline is not None and deadline > self._loop.time():
+            self._timeout = self._loop.call_at(deadline, self._on_timeout)
+            return
+        logging.info("Closing idle connection")
+        self._drop()
+
+    def _drop(self) -> None:
+        if self._closing is not None:
+            return
+        if self._timeout is not None:
+            self._timeout.cancel()
+            self._timeout = None
+        self._closing = self._loop.create_task(self.entity.disconnect())
+        self._closing.add_done_callback(self._disconnected)
+
+    def _disconnected(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Error disconnecting: %s", task.exception())
+        if not self.entity.listen_task.done():
+            self.entity.listen_task.set_result(None)
+
+
+async def create_protocol_server(
+    entity_class, admission, host: str, port: int, buffer_size: int, **kwargs
+) -> asyncio.Server:
+    """loop.create_server for entity_class, sharing one receive buffer"""
+    buffer = memoryview(bytearray(buffer_size))
+    return await asyncio.get_running_loop().create_server(
+        lambda: EntityProtocol(entity_class, admission, buffer), host, port, **kwargs
+    )
+
+
+def run(coroutine, event_loop: str = "asyncio"):
+    """asyncio.run on the event loop named by the event_loop setting"""
+    if event_loop == "asyncio":
+        return asyncio.run(coroutine)
+    if event_loop != "uvloop":
+        raise ValueError(f"Unknown event loop {event_loop}")
+    if uvloop is None:
+        coroutine.close()
+        raise RuntimeError("event_loop is uvloop but uvloop is not installed")
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(coroutine)
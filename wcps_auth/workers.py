@@ -0,0 +1,136 @@
+"""
+Multi-core mode.
+
+With workers > 1 the main process becomes the coordinator: it keeps the
+session state, serves it to the workers through a SessionStoreServer on a
+Unix socket and runs the INTERNAL listener, so game servers see every
+session. Each worker process accepts game clients on AUTH_CLIENT through
+SO_REUSEPORT (Linux) and reaches the sessions through a
+RemoteSessionManager.
+
+Workers open their own storage backend and password verifier. With the
+memory backend every worker has a separate copy of the data, so use mysql
+or sqlite when accounts change at runtime.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+
+from wcps_auth import profiling
+from wcps_auth.config import settings
+from wcps_auth.database import open_storage
+from wcps_auth.log import start_logging
+from wcps_auth.metrics import start_metrics_server
+from wcps_auth.networking import start_client_listener
+from wcps_auth.session_store import RemoteSessionManager, SessionStoreServer
+from wcps_auth.sessions import SessionManager
+from wcps_auth.transport import run as run_loop
+
+
+def default_store_path() -> str:
+    return os.path.join(tempfile.gettempdir(), f"wcps_auth-{os.getpid()}.sock")
+
+
+async def start_coordinator(config) -> tuple:
+    """
+    Serve the session store and start the client workers. Returns the
+    store and the worker processes, to be passed to restart_dead_workers
+    and stop_coordinator.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Multiple workers need SO_REUSEPORT support (Linux)")
+
+    path = config.session_store_path or default_store_path()
+    store = SessionStoreServer()
+    await store.start(path)
+
+    workers = [
+        start_worker(config, index, path) for index in range(1, config.workers + 1)
+    ]
+    logging.info("Started %d client workers", len(workers))
+    return store, workers
+
+
+def start_worker(config, index: int, store_path: str) -> multiprocessing.Process:
+    # spawn, not fork: workers must not inherit the coordinator's event loop
+    context = multiprocessing.get_context("spawn")
+    # Workers read the settings again, pass on what the command line changed
+    overrides = {
+        "network_layer": config.network_layer,
+        "event_loop": config.event_loop,
+    }
+    process = context.Process(
+        target=run_worker,
+        args=(index, store_path, overrides),
+        name=f"wcps-auth-worker-{index}",
+        daemon=True,
+    )
+    process.start()
+    return process
+
+
+def restart_dead_workers(config, store: SessionStoreServer, workers: list) -> int:
+    """
+    Start a new process in place of each worker that has exited, keeping
+    its index. Polled by the coordinator's serve loop, so a worker that
+    keeps failing is restarted at most once per poll. Returns how many
+    were restarted.
+    """
+    restarted = 0
+    for position, process in enumerate(workers):
+        if process.is_alive():
+            continue
+        index = position + 1
+        logging.error(
+            "Worker %d (pid %s) exited with code %s, restarting it",
+            index,
+            process.pid,
+            process.exitcode,
+        )
+        process.close()
+        workers[position] = start_worker(config, index, store.path)
+        restarted += 1
+    return restarted
+
+
+async def stop_coordinator(store: SessionStoreServer, workers: list) -> None:
+    for process in workers:
+        process.terminate()
+    for process in workers:
+        await asyncio.to_thread(process.join, 5)
+    await store.close()
+
+
+def run_worker(index: int, store_path: str, overrides: dict = None) -> None:
+    config = settings()
+    for name, value in (overrides or {}).items():
+        setattr(config, name, value)
+    run_loop(worker_main(index, store_path), config.event_loop)
+
+
+async def worker_main(index: int, store_path: str) -> None:
+    config = settings()
+    log_listener = start_logging(config)
+    try:
+        sessions = RemoteSessionManager(config.session_store_timeout)
+        await sessions.connect(store_path)
+        SessionManager._instance = sessions
+
+        await open_storage()
+        profiling.install(config)
+        if config.metrics_enabled:
+            # Every worker has its own counters, on the ports after the
+            # coordinator's
+            await start_metrics_server(config.metrics_host, config.metrics_port + index)
+
+        listener = asyncio.create_task(start_client_listener(reuse_port=True))
+        logging.info("Worker %d (pid %d) accepting clients", index, os.getpid())
+        await sessions.wait_closed()
+        listener.cancel()
+        logging.error("Lost the session store, worker %d exiting", index)
+    finally:
+        log_listener.stop()